@@ -1,18 +1,29 @@
 import os
+import asyncio
+import threading
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import exc
-import time
+from sqlalchemy import exc, text
 from logger import logger
-from dotenv import load_dotenv  # Add this line
+from config import Config
+from dotenv import load_dotenv
 
 # Load environment variables from .env file
-load_dotenv()  # Add this line
+load_dotenv()
 
 Base = declarative_base()
-db = SQLAlchemy(model_class=Base)
+# Objects handed back to the handlers outlive their session, so keep their
+# loaded state after commit instead of expiring it
+db = SQLAlchemy(model_class=Base, session_options={"expire_on_commit": False})
 app = Flask(__name__)
+
+# Importing this module must stay cheap: nothing here touches the database
+# until configure_app() or init_database() is called
+_configure_lock = threading.Lock()
+_configured = False
+_database_ready = False
+
 def get_database_url():
     """Get and validate database URL"""
     database_url = os.environ.get('DATABASE_URL')
@@ -25,47 +36,94 @@ def get_database_url():
 
     return database_url
 
-# Configure database with retry mechanism
-max_retries = 5
-retry_delay = 5  # seconds
-
-for attempt in range(max_retries):
-    try:
-        # Configure database
-        app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
-        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-            "pool_recycle": 300,
-            "pool_pre_ping": True,
-            "pool_timeout": 20,
-            "pool_size": 30,
-            "max_overflow": 10
-        }
-
-        # Initialize SQLAlchemy
-        db.init_app(app)
-
-        # Test the connection
-        with app.app_context():
-            db.engine.connect()
-            logger.info("Database connection established successfully")
-            break  # Connection successful, exit retry loop
+def configure_app():
+    """Register the database with the Flask app on first use.
+
+    Idempotent and thread-safe. This only builds the engine; it does not
+    open a connection.
+    """
+    global _configured
+    if _configured:
+        return app
+
+    with _configure_lock:
+        if not _configured:
+            app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
+            app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+                "pool_recycle": 300,
+                "pool_pre_ping": True,
+                "pool_timeout": 20,
+                "pool_size": Config.DB_POOL_SIZE,
+                "max_overflow": Config.DB_MAX_OVERFLOW
+            }
+            db.init_app(app)
+            # Needs the app context only to look the engine up; still no connection
+            import metrics
+            with app.app_context():
+                metrics.instrument_engine(db.engine)
+            _configured = True
+    return app
+
+# Revision that matches the schema db.create_all() used to build
+INITIAL_REVISION = '0001'
+
+def _alembic_config():
+    from alembic.config import Config as AlembicConfig
+    return AlembicConfig(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini')
+    )
+
+def upgrade_database():
+    """Apply pending Alembic migrations, skipping the work when already at head"""
+    from alembic import command
+    from alembic.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import inspect
 
-    except (exc.OperationalError, exc.DatabaseError) as e:
-        if attempt < max_retries - 1:
+    configure_app()
+    alembic_cfg = _alembic_config()
+    heads = set(ScriptDirectory.from_config(alembic_cfg).get_heads())
+
+    with app.app_context(), db.engine.begin() as connection:
+        if set(MigrationContext.configure(connection).get_current_heads()) == heads:
+            logger.info("Database schema is up to date")
+            return
+
+        alembic_cfg.attributes['connection'] = connection
+        tables = inspect(connection).get_table_names()
+        if 'users' in tables and 'alembic_version' not in tables:
+            # Database was built by db.create_all() before migrations existed
+            logger.info("Stamping existing schema at initial revision")
+            command.stamp(alembic_cfg, INITIAL_REVISION)
+        command.upgrade(alembic_cfg, 'head')
+        logger.info("Database migrations applied successfully")
+
+def _check_connection():
+    with app.app_context(), db.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+async def init_database():
+    """Connect with async backoff and verify the schema, once per process"""
+    global _database_ready
+    if _database_ready:
+        return
+
+    configure_app()
+    delay = Config.DB_CONNECT_RETRY_DELAY
+    for attempt in range(Config.DB_CONNECT_RETRIES):
+        try:
+            await asyncio.to_thread(_check_connection)
+            logger.info("Database connection established successfully")
+            break
+        except (exc.OperationalError, exc.DatabaseError) as e:
+            if attempt == Config.DB_CONNECT_RETRIES - 1:
+                logger.error("Failed to connect to database after maximum retries")
+                raise
             logger.warning(f"Database connection attempt {attempt + 1} failed: {str(e)}")
-            time.sleep(retry_delay)
-        else:
-            logger.error("Failed to connect to database after maximum retries")
-            raise
-
-# Create database tables within app context
-with app.app_context():
-    try:
-        # Import models after db initialization to avoid circular imports
-        from models import User, EscrowTransaction, Dispute
-        db.create_all()
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {str(e)}")
-        raise
\ No newline at end of file
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    if Config.AUTO_MIGRATE:
+        await asyncio.to_thread(upgrade_database)
+    _database_ready = True
@@ -0,0 +1,70 @@
+"""Moves closed deals out of the live tables.
+
+Completed and expired deals created more than ARCHIVE_AFTER_DAYS ago are
+copied to escrow_transactions_archive, their disputes to disputes_archive,
+and deleted from the live tables, ARCHIVE_BATCH_SIZE deals per
+transaction so no batch holds its locks for long. Deals with an open
+dispute stay live. Ids are kept, and the repository reads the live table
+first and the archive only on a miss, so handlers see no difference.
+"""
+import asyncio
+
+import metrics
+import repository
+from config import Config
+from logger import logger
+
+# Let other queries in between batches of a long run
+BATCH_PAUSE = 0.1
+
+deals_archived = metrics.registry.counter(
+    'deals_archived_total', 'Closed deals moved to the archive tables'
+)
+
+
+class Archiver:
+    """Runs the archive job every interval seconds"""
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+    def start(self):
+        if self.interval <= 0:
+            logger.info("Deal archiving is disabled")
+            return
+        self._task = asyncio.create_task(self._run(), name='archive')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error archiving deals: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """Archive every closed deal past the horizon; return how many moved"""
+        total = 0
+        while True:
+            moved = await repository.archive_closed_deals(self.batch_size)
+            total += moved
+            deals_archived.inc(moved)
+            if moved < self.batch_size:
+                break
+            await asyncio.sleep(BATCH_PAUSE)
+        if total:
+            logger.info("Archived %s closed deals", total)
+        return total
+
+
+archiver = Archiver(Config.ARCHIVE_INTERVAL, Config.ARCHIVE_BATCH_SIZE)
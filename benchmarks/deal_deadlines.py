@@ -0,0 +1,191 @@
+"""Deal scheduler cost against table size.
+
+For each size, fills escrow_transactions with that many deals (mostly
+closed, the rest awaiting payment with a due time in the future) plus a
+fixed number of due deals, half due for a reminder and half past their
+deadline. Then runs one scheduler pass and the next-wake-up lookup and
+reports their time and SQL statements, with the query plan of the due
+lookup. Both should stay flat as the table grows: the scheduler only
+touches due rows, through the due_at index.
+
+Afterwards every due deal must have been reminded or expired exactly once
+and nothing else may have changed.
+
+    python benchmarks/deal_deadlines.py
+    python benchmarks/deal_deadlines.py --sizes 10000 1000000 --due 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_deal_deadlines.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000],
+                        help='deals in the table besides the due ones')
+    parser.add_argument('--due', type=int, default=500, help='due deals per size')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'deal_deadlines_bot.log'))
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+import deadlines  # noqa: E402
+import repository  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from config import Config  # noqa: E402
+from models import EscrowTransaction, User  # noqa: E402
+
+CHUNK = 10_000
+
+
+def reset():
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+    with app.app_context():
+        buyer = User(telegram_id='40000', username='slow_payer', language='en')
+        seller = User(telegram_id='40001', username='waiting_seller', language='en')
+        db.session.add_all([buyer, seller])
+        db.session.commit()
+        return buyer.id, seller.id
+
+
+def seed(size, due, parties, rng):
+    """Insert size idle deals and due deals; return the ids of the due ones"""
+    buyer_id, seller_id = parties
+    now = datetime.utcnow()
+    base = dict(buyer_id=buyer_id, seller_id=seller_id, amount=10, fee_amount=0.5,
+                description='deadline', fee_paid=False, chat_id='-1000')
+
+    def idle():
+        created = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+        if rng.random() < 0.9:
+            return dict(base, status='completed', created_at=created, due_at=None, expires_at=None)
+        # Far enough ahead not to fall due while a large table is being seeded
+        expires = now + timedelta(seconds=rng.randint(3600, max(Config.PAYMENT_TIMEOUT, 7200)))
+        return dict(base, status='awaiting_payment', created_at=created, due_at=expires, expires_at=expires)
+
+    with app.app_context():
+        for start in range(0, size, CHUNK):
+            db.session.execute(insert(EscrowTransaction), [idle() for _ in range(start, min(start + CHUNK, size))])
+        rows = []
+        for i in range(due):
+            past = now - timedelta(seconds=rng.randint(1, 3600))
+            if i % 2:
+                # Reminder due, deadline still ahead
+                rows.append(dict(base, status='awaiting_payment', created_at=past, due_at=past,
+                                 expires_at=now + timedelta(hours=1)))
+            else:
+                rows.append(dict(base, status='awaiting_payment', created_at=past, due_at=past, expires_at=past))
+        db.session.execute(insert(EscrowTransaction), rows)
+        db.session.commit()
+        due_ids = db.session.scalars(
+            select(EscrowTransaction.id).where(EscrowTransaction.due_at <= now)
+        ).all()
+        return set(due_ids)
+
+
+def due_plan():
+    stmt = (
+        select(EscrowTransaction.id)
+        .where(EscrowTransaction.due_at <= datetime.utcnow())
+        .order_by(EscrowTransaction.due_at)
+        .limit(Config.DUE_BATCH_SIZE)
+    )
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            return []
+        compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+        return [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}'))]
+
+
+def snapshot():
+    with app.app_context():
+        return {
+            tx_id: (status, due_at)
+            for tx_id, status, due_at in db.session.execute(
+                select(EscrowTransaction.id, EscrowTransaction.status, EscrowTransaction.due_at)
+            )
+        }
+
+
+async def run_pass(scheduler):
+    started = time.perf_counter()
+    await scheduler.run_due()
+    processed = time.perf_counter() - started
+    started = time.perf_counter()
+    await repository.next_due_at()
+    return processed, time.perf_counter() - started
+
+
+def check(before, after, due_ids):
+    problems = []
+    for tx_id, (status, due_at) in after.items():
+        old_status, old_due = before[tx_id]
+        if tx_id not in due_ids:
+            if (status, due_at) != (old_status, old_due):
+                problems.append(f'deal {tx_id}: not due but changed to {status}')
+        elif status == 'expired':
+            if due_at is not None:
+                problems.append(f'deal {tx_id}: expired but still due at {due_at}')
+        elif status != 'awaiting_payment' or due_at is None or due_at <= old_due:
+            problems.append(f'deal {tx_id}: due but {status}, due at {due_at}')
+    return problems
+
+
+def main():
+    configure_app()
+    rng = random.Random(args.seed)
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    print(f"{'deals':>10}{'due':>6}{'reminded':>10}{'expired':>9}{'pass ms':>10}{'next ms':>9}{'stmts':>7}")
+    problems = []
+    for size in args.sizes:
+        due_ids = seed(size, args.due, reset(), rng)
+        before = snapshot()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+        statements = 0
+        scheduler = deadlines.DeadlineScheduler(Config.DUE_BATCH_SIZE, Config.DUE_MAX_SLEEP)
+        processed, lookup = asyncio.run(run_pass(scheduler))
+        used = statements
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+        print(f'{size:>10}{len(due_ids):>6}{scheduler.reminded:>10}{scheduler.expired:>9}'
+              f'{processed * 1000:>10.1f}{lookup * 1000:>9.2f}{used:>7}')
+        problems += check(before, snapshot(), due_ids)
+        if scheduler.reminded + scheduler.expired != len(due_ids):
+            problems.append(f'{size}: {len(due_ids)} due, handled {scheduler.reminded + scheduler.expired}')
+
+    for line in due_plan():
+        print(f'    {line}')
+    for problem in problems[:20]:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: every due deal handled once, nothing else touched')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Memory and throughput of the streaming export against export size.
+
+Seeds --rows deals spread over --days, then runs `python export.py
+transactions` in a child process for the newest 1%, 10% and all of them
+as CSV, and all of them as JSON Lines, counting the lines it writes and
+reading the child's peak RSS from wait4(). Peak memory should not grow
+with the number of rows exported.
+
+    python benchmarks/export_stream.py
+    python benchmarks/export_stream.py --rows 200000
+    python benchmarks/export_stream.py --url postgresql://localhost/escrow_bench
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_export.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--rows', type=int, default=5_000_000, help='deals to seed')
+    parser.add_argument('--days', type=int, default=730, help='age of the oldest deal')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'export_stream_bot.log'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from models import EscrowTransaction, User  # noqa: E402
+
+CHUNK = 10_000
+USER_ID_BASE = 6_000_000
+# Peak RSS of the full export may exceed the smallest one's by this much
+RSS_SLACK_MB = 32
+
+
+def reset():
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+
+def seed(rows, rng):
+    """Insert rows deals, one every step; return the first created_at and step"""
+    users = max(rows // 50, 10)
+    now = datetime.utcnow()
+    first = now - timedelta(days=args.days)
+    step = (now - first) / rows
+    chains = ['BEP20', 'ERC20', 'TRC20', None]
+
+    def deal(i):
+        status = rng.choice(['awaiting_payment', 'payment_confirmed', 'completed', 'completed', 'expired'])
+        return {
+            'buyer_id': rng.randint(1, users), 'seller_id': rng.randint(1, users),
+            'amount': rng.randint(5, 5000), 'description': f'seeded deal {i}, "quoted"', 'status': status,
+            'blockchain': rng.choice(chains), 'fee_amount': 0.5, 'fee_paid': status == 'completed',
+            'chat_id': str(-100_000 - rng.randint(1, 500)), 'created_at': first + step * i,
+        }
+
+    with app.app_context():
+        for offset in range(0, users, CHUNK):
+            db.session.execute(insert(User), [
+                {'telegram_id': str(USER_ID_BASE + i), 'username': f'ex_{i}', 'language': 'en'}
+                for i in range(offset + 1, min(offset + CHUNK, users) + 1)
+            ])
+        for offset in range(0, rows, CHUNK):
+            db.session.execute(insert(EscrowTransaction), [
+                deal(i) for i in range(offset, min(offset + CHUNK, rows))
+            ])
+            db.session.commit()
+    return first, step
+
+
+def export(fmt, date_from):
+    """Run the CLI export; return (lines, seconds, peak RSS in MB)"""
+    command = [sys.executable, os.path.join(ROOT, 'export.py'), 'transactions', '--format', fmt,
+               '--from', date_from.isoformat()]
+    started = time.perf_counter()
+    child = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=tempfile.gettempdir())
+    lines = 0
+    while chunk := child.stdout.read(1 << 20):
+        lines += chunk.count(b'\n')
+    child.stdout.close()
+    _, status, usage = os.wait4(child.pid, 0)
+    child.returncode = os.waitstatus_to_exitcode(status)
+    if child.returncode:
+        raise SystemExit(f'export.py exited with {child.returncode}')
+    # ru_maxrss is in kilobytes on Linux
+    return lines, time.perf_counter() - started, usage.ru_maxrss / 1024
+
+
+def main():
+    configure_app()
+    reset()
+    started = time.perf_counter()
+    first, step = seed(args.rows, random.Random(args.seed))
+    print(f'Seeded {args.rows} deals in {time.perf_counter() - started:.0f}s')
+
+    runs = [('csv', 0.01), ('csv', 0.1), ('csv', 1.0), ('jsonl', 1.0)]
+    print(f"{'format':>7}{'share':>7}{'rows':>10}{'seconds':>9}{'rows/s':>10}{'peak MB':>9}")
+    problems = []
+    peaks = []
+    for fmt, share in runs:
+        skip = args.rows - int(args.rows * share)
+        lines, seconds, peak = export(fmt, first + step * skip)
+        rows = lines - 1 if fmt == 'csv' else lines
+        peaks.append(peak)
+        print(f'{fmt:>7}{share:>7.0%}{rows:>10}{seconds:>9.1f}{rows / seconds:>10.0f}{peak:>9.1f}')
+        if rows != args.rows - skip:
+            problems.append(f'{fmt} {share:.0%}: exported {rows} rows, expected {args.rows - skip}')
+
+    if max(peaks) > peaks[0] + RSS_SLACK_MB:
+        problems.append(f'peak RSS grew from {peaks[0]:.1f} MB to {max(peaks):.1f} MB')
+    for problem in problems:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: every row exported, memory flat')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
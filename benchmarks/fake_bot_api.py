@@ -0,0 +1,133 @@
+"""In-process stand-in for the Telegram Bot API, for benchmarks.
+
+Plugs into python-telegram-bot through an httpx mock transport, so no
+network is involved. Every call is recorded in FakeBotAPI.calls and can be
+slowed down by a fixed latency to mimic the round trip to Telegram.
+"""
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+from telegram.request import HTTPXRequest
+
+BOT_TOKEN = '123456:fake-benchmark-token'
+BOT_USER = {
+    'id': 123456,
+    'is_bot': True,
+    'first_name': 'Escrow',
+    'username': 'Legit_escrow_bot',
+}
+
+
+class FakeBotAPI:
+    """Answers Bot API methods with canned results and records every call"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.updates = asyncio.Queue()
+        self._message_ids = itertools.count(1)
+        self.transport = httpx.MockTransport(self._handle)
+
+    def request(self, **kwargs):
+        """Return a PTB request object that talks to this fake"""
+        return HTTPXRequest(httpx_kwargs={'transport': self.transport}, **kwargs)
+
+    def count(self, method):
+        return sum(1 for name, _ in self.calls if name == method)
+
+    async def _handle(self, request):
+        method = request.url.path.rsplit('/', 1)[-1]
+        params = {}
+        for key, value in parse_qsl(request.content.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append((method, params))
+
+        handler = getattr(self, f'_{method}', None)
+        result = await handler(params) if handler else True
+        return httpx.Response(200, json={'ok': True, 'result': result})
+
+    async def _getMe(self, params):
+        return BOT_USER
+
+    async def _getUpdates(self, params):
+        # Long poll: wait for the first update, then drain what is queued
+        try:
+            first = await asyncio.wait_for(self.updates.get(), params.get('timeout') or 0.1)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        while not self.updates.empty() and len(batch) < int(params.get('limit', 100)):
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    def _message(self, params):
+        chat_id = int(params['chat_id'])
+        return {
+            'message_id': params.get('message_id') or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group' if chat_id < 0 else 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    async def _sendMessage(self, params):
+        return self._message(params)
+
+    async def _editMessageText(self, params):
+        return self._message(params)
+
+
+def _user(user_id, username):
+    return {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username}
+
+
+def _chat(chat_id):
+    if chat_id < 0:
+        return {'id': chat_id, 'type': 'group', 'title': f'Group {chat_id}'}
+    return {'id': chat_id, 'type': 'private'}
+
+
+def message_update(update_id, chat_id, user_id, username, text):
+    """Build a raw message update; a leading /command gets its entity"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': _chat(chat_id),
+        'from': _user(user_id, username),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [
+            {'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}
+        ]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(update_id, chat_id, user_id, username, data, message_id=1):
+    """Build a raw callback_query update for an inline button press"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'chat_instance': str(chat_id),
+            'from': _user(user_id, username),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': _chat(chat_id),
+                'from': BOT_USER,
+                'text': '...',
+            },
+        },
+    }
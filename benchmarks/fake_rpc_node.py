@@ -0,0 +1,80 @@
+"""In-process stand-in for an EVM JSON-RPC node, for benchmarks.
+
+Serves eth_blockNumber and eth_getLogs (single calls and batches) over an
+httpx mock transport, from a chain of blocks held in memory. Token
+transfers are added with transfer() and blocks with mine(). Every HTTP
+request and every call is counted.
+"""
+import json
+
+import httpx
+
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+
+def address_topic(address):
+    return '0x' + address.lower().removeprefix('0x').rjust(64, '0')
+
+
+class FakeNode:
+    """One chain: a head block number and the Transfer logs in each block"""
+
+    def __init__(self, head=1_000_000):
+        self.head = head
+        self.logs = []
+        self.http_requests = 0
+        self.calls = 0
+        self._tx_count = 0
+        self.transport = httpx.MockTransport(self._handle)
+
+    def mine(self, blocks=1):
+        self.head += blocks
+
+    def transfer(self, token, sender, recipient, value, block=None):
+        """Record an ERC-20 Transfer log in block (default: the next block)"""
+        self._tx_count += 1
+        block = self.head + 1 if block is None else block
+        self.logs.append({
+            'address': token.lower(),
+            'topics': [TRANSFER_TOPIC, address_topic(sender), address_topic(recipient)],
+            'data': hex(value),
+            'blockNumber': hex(block),
+            'transactionHash': '0x%064x' % self._tx_count,
+            'logIndex': '0x0',
+            'removed': False,
+        })
+
+    def _handle(self, request):
+        self.http_requests += 1
+        payload = json.loads(request.content)
+        if isinstance(payload, list):
+            body = [self._answer(call) for call in payload]
+        else:
+            body = self._answer(payload)
+        return httpx.Response(200, json=body)
+
+    def _answer(self, call):
+        self.calls += 1
+        method = getattr(self, '_' + call['method'], None)
+        if method is None:
+            return {'jsonrpc': '2.0', 'id': call['id'],
+                    'error': {'code': -32601, 'message': 'Method not found'}}
+        return {'jsonrpc': '2.0', 'id': call['id'], 'result': method(*call['params'])}
+
+    def _eth_blockNumber(self):
+        return hex(self.head)
+
+    def _eth_getLogs(self, query):
+        first, last = int(query['fromBlock'], 16), int(query['toBlock'], 16)
+        address = query.get('address', '').lower()
+        topics = query.get('topics') or []
+        matches = []
+        for log in self.logs:
+            if not first <= int(log['blockNumber'], 16) <= last:
+                continue
+            if address and log['address'] != address:
+                continue
+            if any(topic is not None and topic != log['topics'][i] for i, topic in enumerate(topics)):
+                continue
+            matches.append(log)
+        return matches
@@ -0,0 +1,251 @@
+"""Hot-path query times with every deal live, then with closed deals archived.
+
+Seeds --rows deals spread over --days (almost all old ones closed, a few
+stuck; recent ones in every state) with a dispute on some, and times the
+handlers' lookups through the repository: a deal by id, recent and old,
+the first /status page of a group and of a user, a deep /status page and
+the payment watcher's awaiting-payment query. Then runs the archive job
+batch by batch, reporting the slowest batch, and times the same lookups
+again against the small live table with the archive behind it.
+
+Afterwards no deal or dispute may be lost, every dispute must sit next to
+its deal, and the sampled /status pages must be the same as before.
+
+    python benchmarks/hot_cold.py
+    python benchmarks/hot_cold.py --rows 1000000 --batch 5000
+    python benchmarks/hot_cold.py --url postgresql://localhost/escrow_bench
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_hot_cold.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='deals to seed')
+    parser.add_argument('--days', type=int, default=730, help='age of the oldest deal')
+    parser.add_argument('--batch', type=int, default=None,
+                        help='deals per archive transaction (default ARCHIVE_BATCH_SIZE)')
+    parser.add_argument('--repeat', type=int, default=200, help='runs per lookup')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'hot_cold_bot.log'))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+import repository  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from config import Config  # noqa: E402
+from models import (  # noqa: E402
+    ArchivedDispute, ArchivedEscrowTransaction, Dispute, EscrowTransaction, User
+)
+
+CHUNK = 10_000
+# One deal in this many has a dispute, and one dispute in five is still open
+DISPUTE_EVERY = 1000
+USER_ID_BASE = 5_000_000
+
+
+def reset():
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+
+def seed(rows, rng):
+    users = max(rows // 50, 10)
+    chats = max(rows // 1000, 1)
+    now = datetime.utcnow()
+    first = now - timedelta(days=args.days)
+    step = (now - first) / rows
+    horizon = now - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+
+    def deal(i):
+        created = first + step * i
+        if created < horizon:
+            status = rng.choices(['completed', 'expired', 'payment_confirmed'], [97, 2, 1])[0]
+        else:
+            status = rng.choice(['awaiting_payment', 'payment_confirmed', 'completed', 'expired'])
+        due = created + timedelta(days=1) if status == 'awaiting_payment' else None
+        return {
+            'buyer_id': rng.randint(1, users), 'seller_id': rng.randint(1, users),
+            'amount': rng.randint(5, 5000), 'description': 'seeded deal', 'status': status,
+            'fee_amount': 0.5, 'fee_paid': status == 'completed',
+            'chat_id': str(-100_000 - rng.randint(1, chats)), 'created_at': created,
+            'due_at': due, 'expires_at': due,
+        }
+
+    with app.app_context():
+        for offset in range(0, users, CHUNK):
+            db.session.execute(insert(User), [
+                {'telegram_id': str(USER_ID_BASE + i), 'username': f'hc_{i}', 'language': 'en'}
+                for i in range(offset + 1, min(offset + CHUNK, users) + 1)
+            ])
+        for offset in range(0, rows, CHUNK):
+            db.session.execute(insert(EscrowTransaction), [
+                deal(i) for i in range(offset, min(offset + CHUNK, rows))
+            ])
+            db.session.commit()
+        db.session.execute(insert(Dispute), [
+            {'transaction_id': tx_id, 'created_by_id': rng.randint(1, users), 'reason': 'seeded',
+             'status': 'open' if rng.random() < 0.2 else 'resolved', 'created_at': now}
+            for tx_id in range(1, rows + 1, DISPUTE_EVERY)
+        ])
+        db.session.commit()
+    return users, chats
+
+
+def scopes(users, chats, rng, count=50):
+    """Sample /status scopes: (chat_id, telegram_id) pairs"""
+    picked = [(str(-100_000 - rng.randint(1, chats)), None) for _ in range(count // 2)]
+    picked += [(None, str(USER_ID_BASE + rng.randint(1, users))) for _ in range(count - len(picked))]
+    return picked
+
+
+async def walk(chat_id, telegram_id, pages=3):
+    """Ids on the first few /status pages of a scope"""
+    ids, cursor = [], None
+    for _ in range(pages):
+        deals, has_more = await repository.status_page(chat_id=chat_id, telegram_id=telegram_id, cursor=cursor)
+        ids.append([tx.id for tx in deals])
+        if not has_more:
+            break
+        cursor = (deals[-1].created_at, deals[-1].id)
+    return ids
+
+
+def lookups(users, chats, rows, rng):
+    recent = rows - rows * Config.ARCHIVE_AFTER_DAYS // args.days
+    deep_cursor = (datetime.utcnow() - timedelta(days=args.days // 2), rows)
+
+    def chat():
+        return str(-100_000 - rng.randint(1, chats))
+
+    def user():
+        return str(USER_ID_BASE + rng.randint(1, users))
+
+    return {
+        'deal by id, recent': lambda: repository.get_transaction(rng.randint(recent, rows)),
+        'deal by id, old': lambda: repository.get_transaction(rng.randint(1, recent)),
+        'group /status': lambda: repository.status_page(chat_id=chat()),
+        'user /status': lambda: repository.status_page(telegram_id=user()),
+        'group /status, deep': lambda: repository.status_page(chat_id=chat(), cursor=deep_cursor),
+        'awaiting payment': repository.awaiting_payment_deals,
+    }
+
+
+async def measure(label, users, chats, rows):
+    print(f'\n=== {label} ===')
+    rng = random.Random(args.seed)
+    for name, lookup in lookups(users, chats, rows, rng).items():
+        repeat = args.repeat if name != 'awaiting payment' else max(args.repeat // 20, 3)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await lookup()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'{name:<22} median {statistics.median(timings):8.3f} ms   '
+              f'p95 {timings[int(len(timings) * 0.95) - 1]:8.3f} ms')
+
+
+async def archive_all(batch):
+    durations = []
+    while True:
+        started = time.perf_counter()
+        moved = await repository.archive_closed_deals(batch)
+        durations.append(time.perf_counter() - started)
+        if moved < batch:
+            return durations
+
+
+def counts():
+    with app.app_context():
+        count = db.session.scalar
+        return {
+            'live deals': count(select(func.count(EscrowTransaction.id))),
+            'archived deals': count(select(func.count(ArchivedEscrowTransaction.id))),
+            'live disputes': count(select(func.count(Dispute.id))),
+            'archived disputes': count(select(func.count(ArchivedDispute.id))),
+            'archived with open dispute': count(
+                select(func.count(ArchivedDispute.id)).where(ArchivedDispute.status == 'open')
+            ),
+            'archived disputes without deal': count(
+                select(func.count(ArchivedDispute.id))
+                .outerjoin(ArchivedEscrowTransaction)
+                .where(ArchivedEscrowTransaction.id.is_(None))
+            ),
+            'live disputes without deal': count(
+                select(func.count(Dispute.id)).outerjoin(EscrowTransaction)
+                .where(EscrowTransaction.id.is_(None))
+            ),
+        }
+
+
+async def run(users, chats):
+    sampled = scopes(users, chats, random.Random(args.seed))
+    await measure(f'{args.rows} deals, all live', users, chats, args.rows)
+    pages_before = [await walk(*scope) for scope in sampled]
+
+    batch = args.batch or Config.ARCHIVE_BATCH_SIZE
+    started = time.perf_counter()
+    durations = await archive_all(batch)
+    elapsed = time.perf_counter() - started
+    found = counts()
+    print(f"\nArchived {found['archived deals']} deals in {len(durations)} batches of {batch} "
+          f"in {elapsed:.1f}s; batch median {statistics.median(durations) * 1000:.0f} ms, "
+          f"slowest {max(durations) * 1000:.0f} ms")
+
+    await measure(f"{found['live deals']} live, {found['archived deals']} archived",
+                  users, chats, args.rows)
+    pages_after = [await walk(*scope) for scope in sampled]
+
+    problems = []
+    if found['live deals'] + found['archived deals'] != args.rows:
+        problems.append(f"{found['live deals'] + found['archived deals']} deals left of {args.rows}")
+    disputes = len(range(1, args.rows + 1, DISPUTE_EVERY))
+    if found['live disputes'] + found['archived disputes'] != disputes:
+        problems.append(f"{found['live disputes'] + found['archived disputes']} disputes left of {disputes}")
+    for key in ('archived with open dispute', 'archived disputes without deal', 'live disputes without deal'):
+        if found[key]:
+            problems.append(f'{found[key]} {key}')
+    for scope, before, after in zip(sampled, pages_before, pages_after):
+        if before != after:
+            problems.append(f'/status of {scope} changed: {before} -> {after}')
+    return problems
+
+
+def main():
+    configure_app()
+    reset()
+    started = time.perf_counter()
+    users, chats = seed(args.rows, random.Random(args.seed))
+    print(f'Seeded {args.rows} deals, {users} users, {chats} chats in {time.perf_counter() - started:.0f}s')
+
+    problems = asyncio.run(run(users, chats))
+    for problem in problems[:20]:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: nothing lost, disputes with their deals, /status pages unchanged')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
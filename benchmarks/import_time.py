@@ -0,0 +1,66 @@
+"""Cold import cost of the bot's modules, measured with python -X importtime.
+
+Each module is imported in a fresh interpreter several times; the median
+total is compared with the budget in import_time_budget.json and the slowest
+imports are listed. Exits non-zero when a module goes over budget, so it can
+run in CI to catch cold-start regressions (for example a module that starts
+connecting to the database at import time again).
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --top 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_time_budget.json')
+
+
+def import_once(module):
+    """Return {module: (self_us, cumulative_us)} for one cold import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budgets = json.load(f)
+
+    failed = False
+    for module, budget_ms in budgets.items():
+        runs = [import_once(module) for _ in range(args.repeat)]
+        total_ms = statistics.median(run[module][1] for run in runs) / 1000
+        verdict = 'ok' if total_ms <= budget_ms else 'OVER BUDGET'
+        failed = failed or total_ms > budget_ms
+        print(f'{module:<12} {total_ms:8.1f} ms  (budget {budget_ms} ms)  {verdict}')
+
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)
+        for name, (self_us, cumulative_us) in slowest[:args.top]:
+            print(f'    {self_us / 1000:7.1f} ms self  {cumulative_us / 1000:8.1f} ms total  {name}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""End-to-end load test of the bot's handlers against a fake Bot API.
+
+Seeds a database with users, then drives synthetic updates through the
+real TelegramBot application in four phases: /new in the groups, a signed
+network-selection press per new deal, /ok from each buyer, and /status in
+groups and private chats. At most --concurrency updates are in flight at
+once; latency is measured from putting an update on the queue to the
+moment every handler group has finished with it (replies themselves go
+out through the outbound queue and are not included).
+
+Reports throughput, p50/p95/p99 latency and SQL statements per update for
+each command, and compares them with load_test_baseline.json: the run
+fails when throughput drops or p95 latency grows by more than --tolerance,
+or when a command issues more statements per update than the baseline.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --deals 5000 --concurrency 64
+    python benchmarks/load_test.py --url postgresql://localhost/escrow_bench
+    python benchmarks/load_test.py --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_test_baseline.json')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI, callback_update, message_update  # noqa: E402
+
+# A regression in statements per update is never noise, but averages of
+# cached lookups can wobble by a fraction of a statement
+STATEMENT_SLACK = 0.25
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_load_test.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--deals', type=int, default=1000, help='/new commands to send')
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=32, help='updates in flight at once')
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed relative loss in throughput or growth in latency')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write this run as the new baseline instead of comparing')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the bot at the benchmark database before any of its modules is imported"""
+    os.environ['DATABASE_URL'] = args.url
+    os.environ['BOT_TOKEN'] = BOT_TOKEN
+    os.environ['MAX_CONCURRENT_UPDATES'] = str(args.concurrency)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'load_test_bot.log'))
+
+
+# The bot's modules read the environment when imported, so the functions
+# below import them only once main() has called configure_environment()
+
+USER_ID_BASE = 20_000
+
+
+def username(index):
+    return f'load{index}'
+
+
+def seed(users):
+    from app import app, configure_app, db, upgrade_database
+    from models import User
+
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+    with app.app_context():
+        db.session.add_all(
+            User(telegram_id=str(USER_ID_BASE + i), username=username(i), language='en')
+            for i in range(users)
+        )
+        db.session.commit()
+
+
+class Driver:
+    """Feeds updates to the application, at most `concurrency` in flight"""
+
+    def __init__(self, application, concurrency):
+        from app import app, db
+
+        self.application = application
+        self.concurrency = concurrency
+        self.statements = 0
+        self._started = {}
+        self._latencies = []
+        self._slots = None
+        self._done = None
+
+        # Last group of all, so it sees each update after every handler
+        application.add_handler(TypeHandler(Update, self._finished), group=99)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count_statement)
+
+    def _count_statement(self, *args):
+        self.statements += 1
+
+    async def _finished(self, update, context):
+        self._latencies.append(time.perf_counter() - self._started.pop(update.update_id))
+        self._slots.release()
+        if not self._started and self._done is not None:
+            self._done.set()
+
+    async def run(self, raw_updates):
+        """Return (elapsed seconds, latencies, statements) for one phase"""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._latencies = []
+        self._done = None
+        statements = self.statements
+        started = time.perf_counter()
+        for raw in raw_updates:
+            await self._slots.acquire()
+            update = Update.de_json(raw, self.application.bot)
+            self._started[update.update_id] = time.perf_counter()
+            self.application.update_queue.put_nowait(update)
+        if self._started:
+            self._done = asyncio.Event()
+            await asyncio.wait_for(self._done.wait(), 300)
+        return time.perf_counter() - started, self._latencies, self.statements - statements
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(elapsed, latencies, statements):
+    latencies = sorted(latencies)
+    return {
+        'updates': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'statements_per_update': round(statements / len(latencies), 2),
+    }
+
+
+def new_deal_updates(args, rng, next_id):
+    raws = []
+    for _ in range(args.deals):
+        buyer, seller = rng.sample(range(args.users), 2)
+        chat_id = -1000 - rng.randrange(args.groups)
+        raws.append(message_update(
+            next(next_id), chat_id, USER_ID_BASE + buyer, username(buyer),
+            f'/new @{username(seller)} {rng.randint(5, 500)} load test item'
+        ))
+    return raws
+
+
+def created_deals():
+    from app import app, db
+    from models import EscrowTransaction
+
+    with app.app_context():
+        rows = db.session.query(EscrowTransaction).options(
+            joinedload(EscrowTransaction.buyer)
+        ).order_by(EscrowTransaction.id).all()
+        return [(tx.id, int(tx.chat_id), int(tx.buyer.telegram_id), tx.buyer.username) for tx in rows]
+
+
+def chain_updates(deals, rng, next_id):
+    import callback_data
+
+    return [
+        callback_update(
+            next(next_id), chat_id, buyer, name,
+            callback_data.encode(callback_data.ACTION_CHAIN, rng.choice(callback_data.CHAINS), tx_id, buyer)
+        )
+        for tx_id, chat_id, buyer, name in deals
+    ]
+
+
+def release_updates(deals, next_id):
+    return [
+        message_update(next(next_id), buyer, buyer, name, f'/ok {tx_id}')
+        for tx_id, chat_id, buyer, name in deals
+    ]
+
+
+def status_updates(deals, rng, next_id):
+    raws = []
+    for tx_id, chat_id, buyer, name in deals:
+        # Half from the group the deal lives in, half from the buyer's private chat
+        chat = chat_id if rng.random() < 0.5 else buyer
+        raws.append(message_update(next(next_id), chat, buyer, name, '/status'))
+    return raws
+
+
+async def run(args):
+    import outbound
+    from app import app, db
+    from bot import TelegramBot
+    from models import EscrowTransaction
+    from outbound import TokenBucket
+
+    rng = random.Random(args.seed)
+    update_ids = iter(range(1, 10 ** 9))
+
+    api = FakeBotAPI(latency=args.api_latency)
+    bot = TelegramBot(request=api.request(), get_updates_request=api.request())
+    application = bot.application
+    driver = Driver(application, args.concurrency)
+    await application.initialize()
+    await application.start()
+
+    # Lift the outbound limits; this measures the bot, not Telegram's quotas
+    scheduler = outbound.scheduler
+    scheduler.global_bucket = TokenBucket(100_000, 100_000)
+    scheduler.chat_rate = scheduler.group_rate = 6_000_000
+    scheduler.start(application.bot)
+
+    results = {}
+    try:
+        results['/new'] = summarize(*await driver.run(new_deal_updates(args, rng, update_ids)))
+        deals = await asyncio.to_thread(created_deals)
+        results['chain button'] = summarize(*await driver.run(chain_updates(deals, rng, update_ids)))
+        results['/ok'] = summarize(*await driver.run(release_updates(deals, update_ids)))
+        results['/status'] = summarize(*await driver.run(status_updates(deals, rng, update_ids)))
+    finally:
+        await scheduler.stop()
+        await application.stop()
+        await application.shutdown()
+
+    problems = []
+    if len(deals) != args.deals:
+        problems.append(f'{args.deals} /new commands created {len(deals)} deals')
+    with app.app_context():
+        completed = db.session.query(EscrowTransaction).filter_by(status='completed').count()
+    if completed != len(deals):
+        problems.append(f'{completed} of {len(deals)} deals completed')
+    return results, problems
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions against the baseline"""
+    regressions = []
+    for command, base in baseline['commands'].items():
+        current = results.get(command)
+        if current is None:
+            regressions.append(f'{command}: missing from this run')
+            continue
+        if current['throughput'] < base['throughput'] / (1 + tolerance):
+            regressions.append(f"{command}: throughput {current['throughput']}/s, baseline {base['throughput']}/s")
+        # p99 is reported but too noisy over a thousand updates to gate on
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{command}: p95 {current['p95_ms']} ms, baseline {base['p95_ms']} ms")
+        if current['statements_per_update'] > base['statements_per_update'] + STATEMENT_SLACK:
+            regressions.append(
+                f"{command}: {current['statements_per_update']} statements per update, "
+                f"baseline {base['statements_per_update']}"
+            )
+    return regressions
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    seed(args.users)
+    results, problems = asyncio.run(run(args))
+
+    print(f"{'command':<14}{'updates':>8}{'upd/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'stmts/upd':>11}")
+    for command, r in results.items():
+        print(f"{command:<14}{r['updates']:>8}{r['throughput']:>9.0f}{r['p50_ms']:>9.2f}"
+              f"{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['statements_per_update']:>11.2f}")
+
+    for problem in problems:
+        print(f'  {problem}')
+    if problems:
+        print('FAILED: the run did not do what it was asked to')
+        sys.exit(1)
+
+    settings = {
+        'deals': args.deals, 'users': args.users, 'groups': args.groups,
+        'concurrency': args.concurrency, 'api_latency': args.api_latency,
+        'database': args.url.split(':', 1)[0],
+    }
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'commands': results}, f, indent=4)
+            f.write('\n')
+        print(f'baseline written to {os.path.relpath(args.baseline)}')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print(f"note: baseline was recorded with {baseline['settings']}")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'  {regression}')
+    print('FAILED: regressed against the baseline' if regressions else 'ok: within the baseline')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Time a log call costs the calling thread (the event loop), before and after.
+
+"direct" is the old setup: a RotatingFileHandler and a StreamHandler
+formatting and writing on the caller's thread. "queued" is logger.py's
+pipeline: the caller only enqueues, and a listener thread formats JSON and
+writes. Both write to a temporary directory, with console output sent to
+/dev/null.
+
+    python benchmarks/logging_latency.py
+    python benchmarks/logging_latency.py --count 50000
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing logger installs the bot's own pipeline too; keep its file out of the way
+os.environ['LOG_FILE'] = os.path.join(tempfile.gettempdir(), 'logging_latency_bot.log')
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def direct_handlers(directory, devnull):
+    file_handler = RotatingFileHandler(
+        os.path.join(directory, 'direct.log'), maxBytes=1024 * 1024, backupCount=5
+    )
+    console = logging.StreamHandler(devnull)
+    for handler in (file_handler, console):
+        handler.setFormatter(logging.Formatter(FORMAT))
+    return [file_handler, console], None
+
+
+def queued_handlers(directory, devnull):
+    import queue
+    from logging.handlers import QueueListener
+
+    import logger as pipeline
+
+    file_handler = RotatingFileHandler(
+        os.path.join(directory, 'queued.log'), maxBytes=1024 * 1024, backupCount=5
+    )
+    file_handler.namer = lambda name: name + '.gz'
+    file_handler.rotator = pipeline._gzip_rotator
+    file_handler.setFormatter(pipeline.JsonFormatter())
+    console = logging.StreamHandler(devnull)
+    console.setFormatter(logging.Formatter(FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = pipeline.LazyQueueHandler(log_queue)
+    queue_handler.addFilter(pipeline.SamplingFilter(10))
+    listener = QueueListener(log_queue, file_handler, console)
+    listener.start()
+    return [queue_handler], listener
+
+
+def run(name, factory, count, directory, devnull):
+    log = logging.getLogger(f'bench.{name}')
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handlers, listener = factory(directory, devnull)
+    for handler in handlers:
+        log.addHandler(handler)
+
+    cases = {
+        'info with args': lambda i: log.info("Created deal %s in chat %s", i, -100123),
+        'sampled info': lambda i: log.info("Received /new from %s", i, extra={'sample': 'new'}),
+        'error with traceback': lambda i: log.error("Update %s caused error", i, exc_info=error),
+        'debug (filtered)': lambda i: log.debug("/new arguments: %s", ['@seller', '100', 'x']),
+    }
+    try:
+        raise ValueError("benchmark")
+    except ValueError as e:
+        error = e
+
+    results = {}
+    for case, call in cases.items():
+        samples = []
+        for i in range(count):
+            started = time.perf_counter_ns()
+            call(i)
+            samples.append(time.perf_counter_ns() - started)
+        samples.sort()
+        results[case] = (statistics.median(samples) / 1000, samples[int(len(samples) * 0.99)] / 1000)
+
+    drain_started = time.perf_counter()
+    if listener is not None:
+        listener.stop()
+    drain = time.perf_counter() - drain_started
+    for handler in handlers:
+        log.removeHandler(handler)
+        handler.close()
+    return results, drain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help='log calls per case')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        for name, factory in (('direct', direct_handlers), ('queued', queued_handlers)):
+            results, drain = run(name, factory, args.count, directory, devnull)
+            print(f'{name}:')
+            for case, (p50, p99) in results.items():
+                print(f'    {case:<22} p50 {p50:7.2f} us   p99 {p99:8.2f} us')
+            if name == 'queued':
+                print(f'    listener drained the backlog in {drain * 1000:.0f} ms (off the caller thread)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Payment watcher against fake JSON-RPC nodes, one per chain.
+
+Seeds deals awaiting payment spread over every chain, then runs poll
+cycles: each cycle pays a share of the deals on chain (plus transfers to
+other addresses and transfers to our wallet that match no deal), mines
+blocks and lets every scanner catch up. Afterwards each paid deal must be
+confirmed exactly once, unpaid deals must still await payment and each
+chain's cursor must sit at its confirmed head. Reports the RPC traffic
+next to what polling each open deal once per cycle would have cost.
+
+    python benchmarks/payment_watcher.py
+    python benchmarks/payment_watcher.py --deals 10000 --cycles 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_rpc_node import FakeNode  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_payment_watcher.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--deals', type=int, default=2000)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--unpaid', type=float, default=0.1, help='share of deals never paid')
+    parser.add_argument('--blocks', type=int, default=300, help='blocks mined per cycle')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+# The stray transfers are logged as unmatched warnings on purpose
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'payment_watcher_bot.log'))
+CHAINS = ('BEP20', 'ERC20', 'OPTIMISM', 'ARBITRUM')
+for name in CHAINS:
+    os.environ[f'{name}_RPC_URL'] = f'http://{name.lower()}.rpc.invalid/'
+
+from sqlalchemy import event  # noqa: E402
+
+import payments  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from config import Config  # noqa: E402
+from models import ChainCursor, EscrowTransaction, User  # noqa: E402
+
+PAYER = '0x000000000000000000000000000000000000beef'
+
+
+def seed(deals):
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+    with app.app_context():
+        buyer = User(telegram_id='30000', username='payer', language='en')
+        seller = User(telegram_id='30001', username='payee', language='en')
+        db.session.add_all([buyer, seller])
+        db.session.flush()
+        rows = [
+            EscrowTransaction(
+                buyer_id=buyer.id, seller_id=seller.id,
+                # Distinct totals per chain, so the expected match is unambiguous
+                amount=Decimal(10) + Decimal(i) / 100, fee_amount=Decimal('0.50'),
+                description='payment', fee_paid=False, chat_id='-1000',
+                blockchain=CHAINS[i % len(CHAINS)]
+            )
+            for i in range(deals)
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [(tx.id, tx.blockchain, tx.amount + tx.fee_amount) for tx in rows]
+
+
+async def run(deals, nodes, rng):
+    watcher = payments.PaymentWatcher(
+        Config.PAYMENT_CHAINS, Config.NETWORK_WALLETS,
+        transports={chain: node.transport for chain, node in nodes.items()}
+    )
+    # First scan of each chain only sets its cursor at the head
+    await asyncio.gather(*(scanner.scan() for scanner in watcher.scanners))
+
+    to_pay = [deal for deal in deals if rng.random() >= args.unpaid]
+    rng.shuffle(to_pay)
+    batches = [to_pay[i::args.cycles] for i in range(args.cycles)]
+    unpaid = {tx_id for tx_id, _, _ in deals} - {tx_id for tx_id, _, _ in to_pay}
+
+    naive_polls = 0
+    open_deals = len(deals)
+    started = time.perf_counter()
+    for batch in batches:
+        for tx_id, chain, total in batch:
+            settings = Config.PAYMENT_CHAINS[chain]
+            node = nodes[chain]
+            block = node.head + rng.randint(1, args.blocks)
+            value = payments.to_units(total, settings['decimals'])
+            node.transfer(settings['token'], PAYER, Config.NETWORK_WALLETS[chain], value, block)
+            # Noise: the same token to someone else, and a stray amount to us
+            node.transfer(settings['token'], PAYER, PAYER, value, block)
+            if rng.random() < 0.1:
+                node.transfer(settings['token'], PAYER, Config.NETWORK_WALLETS[chain], 1, block)
+        for node in nodes.values():
+            node.mine(args.blocks)
+
+        naive_polls += open_deals
+        await asyncio.gather(*(_catch_up(scanner) for scanner in watcher.scanners))
+        open_deals -= len(batch)
+
+    # Let the last transfers reach their confirmation depth
+    for chain, node in nodes.items():
+        node.mine(Config.PAYMENT_CHAINS[chain]['confirmations'])
+    await asyncio.gather(*(_catch_up(scanner) for scanner in watcher.scanners))
+    elapsed = time.perf_counter() - started
+
+    for scanner in watcher.scanners:
+        await scanner.client.close()
+    return to_pay, unpaid, naive_polls, elapsed
+
+
+async def _catch_up(scanner):
+    while await scanner.scan():
+        pass
+
+
+def check(to_pay, unpaid, nodes):
+    problems = []
+    with app.app_context():
+        rows = {tx.id: tx for tx in db.session.query(EscrowTransaction)}
+        cursors = {c.chain: c.block_number for c in db.session.query(ChainCursor)}
+    for tx_id, _, _ in to_pay:
+        tx = rows[tx_id]
+        if tx.status != 'payment_confirmed' or tx.payment_confirmed_at is None:
+            problems.append(f'deal {tx_id}: paid but {tx.status}')
+    for tx_id in unpaid:
+        if rows[tx_id].status != 'awaiting_payment':
+            problems.append(f'deal {tx_id}: never paid but {rows[tx_id].status}')
+    for chain, node in nodes.items():
+        expected = node.head - Config.PAYMENT_CHAINS[chain]['confirmations']
+        if cursors.get(chain) != expected:
+            problems.append(f'{chain}: cursor {cursors.get(chain)}, head {expected}')
+    return problems
+
+
+def main():
+    rng = random.Random(args.seed)
+    deals = seed(args.deals)
+    nodes = {chain: FakeNode() for chain in CHAINS}
+
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    to_pay, unpaid, naive_polls, elapsed = asyncio.run(run(deals, nodes, rng))
+
+    http_requests = sum(node.http_requests for node in nodes.values())
+    calls = sum(node.calls for node in nodes.values())
+    print(f'{len(deals)} deals on {len(nodes)} chains, {len(to_pay)} paid over {args.cycles} cycles '
+          f'in {elapsed:.2f}s')
+    print(f'  watcher: {http_requests} HTTP requests, {calls} JSON-RPC calls, {statements} SQL statements')
+    print(f'  polling each open deal once per cycle: {naive_polls} requests')
+
+    problems = check(to_pay, unpaid, nodes)
+    for problem in problems[:20]:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: every payment confirmed once, cursors at head')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Per-call cost of the hot reads: inline ORM queries against prebuilt statements.
+
+Times each hot lookup written the old way, an ORM query built on every
+call and loading User and EscrowTransaction objects with joinedload, and
+through the repository's statements, built once and returning tuples:
+a user by username, a deal by id with both parties, and the first
+/status page of a group and of a user. Both run in the calling thread on
+a small SQLite database, with the session cleared after each call as a
+fresh repository session would be, so what differs is the Python work
+around the query rather than the query itself. Each pair must return
+the same deals.
+
+    python benchmarks/query_overhead.py
+    python benchmarks/query_overhead.py --number 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_query_overhead.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--number', type=int, default=2000, help='calls per timing run')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--deals', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'query_overhead_bot.log'))
+
+from sqlalchemy import func, insert, or_, select  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+import repository  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from models import EscrowTransaction, User  # noqa: E402
+
+USER_ID_BASE = 40_000
+CHAT_ID_BASE = -3000
+CHATS = 20
+PAGE = 6
+
+
+def seed(rng):
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'telegram_id': str(USER_ID_BASE + i), 'username': f'query{i}', 'language': 'en'}
+            for i in range(args.users)
+        ])
+        db.session.execute(insert(EscrowTransaction), [
+            {
+                'buyer_id': buyer + 1, 'seller_id': seller + 1, 'amount': rng.randint(5, 500),
+                'description': 'seeded deal', 'fee_amount': 0.5, 'status': 'awaiting_payment',
+                'chat_id': str(CHAT_ID_BASE - rng.randrange(CHATS)),
+            }
+            for buyer, seller in (rng.sample(range(args.users), 2) for _ in range(args.deals))
+        ])
+        db.session.commit()
+
+
+# The queries as handlers used to build them, on every call
+
+def inline_user_by_username(name):
+    return User.query.filter(func.lower(User.username) == name.lower()).first()
+
+
+def inline_deal_by_id(tx_id):
+    return db.session.get(
+        EscrowTransaction, tx_id,
+        options=(joinedload(EscrowTransaction.buyer), joinedload(EscrowTransaction.seller))
+    )
+
+
+def inline_status(chat_id, telegram_id):
+    query = EscrowTransaction.query.options(
+        joinedload(EscrowTransaction.buyer), joinedload(EscrowTransaction.seller)
+    )
+    if chat_id is not None:
+        query = query.filter(EscrowTransaction.chat_id == chat_id)
+    else:
+        user_id = select(User.id).where(User.telegram_id == telegram_id).scalar_subquery()
+        query = query.filter(or_(EscrowTransaction.buyer_id == user_id, EscrowTransaction.seller_id == user_id))
+    return query.order_by(EscrowTransaction.created_at.desc(), EscrowTransaction.id.desc()).limit(PAGE).all()
+
+
+def prebuilt_status(chat_id, telegram_id):
+    return repository._status_rows(EscrowTransaction, chat_id, telegram_id, None, 'older', PAGE)
+
+
+def measure(fn, number):
+    def call():
+        fn()
+        # A repository call starts from an empty session
+        db.session.expunge_all()
+    best = min(timeit.repeat(call, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def same_deals(inline, prebuilt):
+    return [(tx.id, tx.buyer.username, tx.seller.username) for tx in inline] == \
+        [(tx.id, tx.buyer.username, tx.seller.username) for tx in prebuilt]
+
+
+def main():
+    rng = random.Random(args.seed)
+    configure_app()
+    seed(rng)
+
+    name = f'QUERY{rng.randrange(args.users)}'
+    tx_id = rng.randint(1, args.deals)
+    chat_id = str(CHAT_ID_BASE - rng.randrange(CHATS))
+    telegram_id = str(USER_ID_BASE + rng.randrange(args.users))
+    cases = [
+        ('user by username', lambda: inline_user_by_username(name),
+         lambda: repository._get_user_by_username(name)),
+        ('deal by id + parties', lambda: inline_deal_by_id(tx_id), lambda: repository._get_transaction(tx_id)),
+        ('group /status page', lambda: inline_status(chat_id, None), lambda: prebuilt_status(chat_id, None)),
+        ('user /status page', lambda: inline_status(None, telegram_id),
+         lambda: prebuilt_status(None, telegram_id)),
+    ]
+
+    problems = []
+    print(f"{'lookup':<24}{'inline':>12}{'prebuilt':>12}{'saved':>8}")
+    with app.app_context():
+        for label, inline, prebuilt in cases:
+            a, b = inline(), prebuilt()
+            if label.endswith('page'):
+                same = same_deals(a, b)
+            elif label.startswith('deal'):
+                same = same_deals([a], [b])
+            else:
+                same = a.id == b.id
+            if not same:
+                problems.append(f'{label}: inline and prebuilt results differ')
+            db.session.expunge_all()
+            old, new = measure(inline, args.number), measure(prebuilt, args.number)
+            print(f'{label:<24}{old:10.1f}us{new:10.1f}us{1 - new / old:>8.0%}')
+
+    for problem in problems:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: same results')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
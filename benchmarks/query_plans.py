@@ -0,0 +1,142 @@
+"""Query plans and timings for the hot queries, before and after the 0002 indexes.
+
+Seeds a database at the initial schema revision, runs the /status, per-user
+and seller lookup queries, then upgrades to head and runs them again.
+
+    python benchmarks/query_plans.py --rows 1000000
+    python benchmarks/query_plans.py --url postgresql://localhost/escrow_bench
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///bench_query_plans.db',
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--rows', type=int, default=500_000, help='escrow transactions to seed')
+    parser.add_argument('--repeat', type=int, default=50, help='runs per query')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+
+from alembic import command  # noqa: E402
+from alembic.config import Config as AlembicConfig  # noqa: E402
+from sqlalchemy import MetaData, create_engine, func, select  # noqa: E402
+
+from models import User, EscrowTransaction  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATUSES = ['awaiting_payment', 'completed', 'completed', 'completed', 'cancelled']
+CHUNK = 10_000
+
+
+def migrate(engine, revision):
+    alembic_cfg = AlembicConfig(os.path.join(ROOT, 'alembic.ini'))
+    with engine.begin() as connection:
+        alembic_cfg.attributes['connection'] = connection
+        if revision == 'base':
+            command.downgrade(alembic_cfg, 'base')
+        else:
+            command.upgrade(alembic_cfg, revision)
+
+
+def seed(engine, rows, rng):
+    users = max(rows // 50, 10)
+    chats = max(rows // 1000, 1)
+    start = datetime(2024, 1, 1)
+
+    with engine.begin() as conn:
+        for offset in range(0, users, CHUNK):
+            conn.execute(User.__table__.insert(), [
+                {'telegram_id': str(1_000_000 + i), 'username': f'User_{i}',
+                 'language': 'en', 'created_at': start}
+                for i in range(offset, min(offset + CHUNK, users))
+            ])
+
+        for offset in range(0, rows, CHUNK):
+            conn.execute(EscrowTransaction.__table__.insert(), [
+                {'buyer_id': rng.randint(1, users), 'seller_id': rng.randint(1, users),
+                 'amount': rng.randint(5, 5000), 'description': 'seeded deal',
+                 'status': rng.choice(STATUSES), 'fee_amount': 0.5, 'fee_paid': False,
+                 'chat_id': str(-100_000 - rng.randint(1, chats)),
+                 'created_at': start + timedelta(seconds=i * 37)}
+                for i in range(offset, min(offset + CHUNK, rows))
+            ])
+    return users, chats
+
+
+def hot_queries(tables, users, chats, rng):
+    # Built on the reflected tables, so they only use columns the current
+    # revision has; the models may already be ahead of revision 0001
+    tx = tables['escrow_transactions']
+    user = tables['users']
+    user_id = rng.randint(1, users)
+    return {
+        'group /status': select(tx).where(tx.c.chat_id == str(-100_000 - rng.randint(1, chats)))
+        .order_by(tx.c.created_at.desc()).limit(5),
+        'deals as buyer': select(tx).where(tx.c.buyer_id == user_id).order_by(tx.c.created_at.desc()),
+        'deals as seller': select(tx).where(tx.c.seller_id == user_id).order_by(tx.c.created_at.desc()),
+        'seller by username': select(user).where(
+            func.lower(user.c.username) == f'user_{rng.randint(0, users - 1)}'
+        ),
+    }
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql(f'EXPLAIN ANALYZE {sql}').fetchall()
+    return [row[0] for row in rows]
+
+
+def measure(engine, label, users, chats, repeat, seed_value):
+    print(f'\n=== {label} ===')
+    with engine.connect() as conn:
+        metadata = MetaData()
+        metadata.reflect(bind=conn, only=['users', 'escrow_transactions'])
+        queries = hot_queries(metadata.tables, users, chats, random.Random(seed_value))
+        for name, stmt in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(stmt).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f'{name:<20} median {statistics.median(timings):9.3f} ms   '
+                  f'max {max(timings):9.3f} ms')
+            for line in explain(conn, stmt):
+                print(f'    {line}')
+
+
+def main():
+    engine = create_engine(args.url)
+    rng = random.Random(args.seed)
+
+    migrate(engine, 'base')
+    migrate(engine, '0001')
+    started = time.perf_counter()
+    users, chats = seed(engine, args.rows, rng)
+    print(f'Seeded {args.rows} deals, {users} users, {chats} chats '
+          f'in {time.perf_counter() - started:.1f}s')
+
+    measure(engine, 'before (revision 0001)', users, chats, args.repeat, args.seed)
+    started = time.perf_counter()
+    migrate(engine, 'head')
+    print(f'\nUpgraded to head in {time.perf_counter() - started:.1f}s')
+    measure(engine, 'after (head)', users, chats, args.repeat, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Stress test for concurrent updates racing on the same deals.
+
+Seeds deals, then pushes many duplicate /ok commands (from the buyer's
+private chat) and network-selection button presses (from the group) for
+each deal onto the bot's update queue at once, so they run concurrently
+through the real handlers against a fake Bot API. Afterwards every deal
+must be completed exactly once, announce its completion in the group
+exactly once, and every button press must either pick the network or be
+turned away because the deal was already completed.
+
+    python benchmarks/race_stress.py --deals 200 --duplicates 5
+    python benchmarks/race_stress.py --url postgresql://localhost/escrow_bench
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI, callback_update, message_update  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_race_stress.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--deals', type=int, default=100)
+    parser.add_argument('--duplicates', type=int, default=5,
+                        help='/ok commands and button presses sent per deal')
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ['BOT_TOKEN'] = BOT_TOKEN
+
+from telegram import Update  # noqa: E402
+
+import callback_data  # noqa: E402
+import outbound  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from bot import TelegramBot  # noqa: E402
+from models import EscrowTransaction, User  # noqa: E402
+from outbound import TokenBucket  # noqa: E402
+
+COMPLETE = re.compile(r'Deal #(\d+) Complete!')
+READY = re.compile(r'Deal #(\d+) is ready!')
+
+
+def seed(deals, groups):
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+    with app.app_context():
+        users = [
+            User(telegram_id=str(10_000 + i), username=f'racer{i}', language='en')
+            for i in range(deals * 2)
+        ]
+        db.session.add_all(users)
+        db.session.flush()
+        transactions = [
+            EscrowTransaction(
+                buyer_id=users[2 * i].id, seller_id=users[2 * i + 1].id,
+                amount=100, fee_amount=0.5, description='race', fee_paid=False,
+                chat_id=str(-1000 - i % groups)
+            )
+            for i in range(deals)
+        ]
+        db.session.add_all(transactions)
+        db.session.commit()
+        return [(tx.id, int(tx.chat_id), 10_000 + 2 * i) for i, tx in enumerate(transactions)]
+
+
+def build_updates(deals, duplicates, rng):
+    updates = []
+    for tx_id, chat_id, buyer in deals:
+        for _ in range(duplicates):
+            updates.append(('message', buyer, f'/ok {tx_id}'))
+            updates.append(('callback', chat_id, buyer,
+                            callback_data.encode(callback_data.ACTION_CHAIN, 'BEP20', tx_id, buyer)))
+    rng.shuffle(updates)
+
+    raw = []
+    for update_id, update in enumerate(updates, 1):
+        if update[0] == 'message':
+            _, buyer, text = update
+            raw.append(message_update(update_id, buyer, buyer, f'racer{buyer - 10_000}', text))
+        else:
+            _, chat_id, buyer, data = update
+            raw.append(callback_update(update_id, chat_id, buyer, f'racer{buyer - 10_000}', data))
+    return raw
+
+
+def private_replies(api):
+    return sum(1 for method, params in api.calls
+               if method == 'sendMessage' and int(params['chat_id']) > 0)
+
+
+async def run(raw_updates, api):
+    bot = TelegramBot(request=api.request(), get_updates_request=api.request())
+    application = bot.application
+    await application.initialize()
+    await application.start()
+
+    # Lift the outbound limits; this measures correctness, not Telegram's quotas
+    scheduler = outbound.scheduler
+    scheduler.global_bucket = TokenBucket(100_000, 100_000)
+    scheduler.chat_rate = scheduler.group_rate = 6_000_000
+    scheduler.start(application.bot)
+
+    started = time.perf_counter()
+    for raw in raw_updates:
+        application.update_queue.put_nowait(Update.de_json(raw, application.bot))
+
+    # Every button press is answered once and every /ok gets one private reply
+    callbacks = sum(1 for raw in raw_updates if 'callback_query' in raw)
+    replies = len(raw_updates) - callbacks
+    deadline = time.monotonic() + 300
+    while (api.count('answerCallbackQuery') < callbacks or private_replies(api) < replies) \
+            and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    await scheduler.stop()
+    await application.stop()
+    await application.shutdown()
+    return elapsed
+
+
+def check(deals, duplicates, api):
+    completions = Counter()
+    ready = Counter()
+    turned_away = 0
+    for method, params in api.calls:
+        text = params.get('text', '')
+        if method == 'sendMessage':
+            completions.update(int(tx_id) for tx_id in COMPLETE.findall(text))
+        elif method == 'editMessageText':
+            ready.update(int(tx_id) for tx_id in READY.findall(text))
+        elif method == 'answerCallbackQuery' and 'already' in text:
+            turned_away += 1
+
+    with app.app_context():
+        rows = {tx.id: tx for tx in db.session.query(EscrowTransaction)}
+
+    problems = []
+    for tx_id, _, _ in deals:
+        tx = rows[tx_id]
+        if tx.status != 'completed' or not tx.fee_paid:
+            problems.append(f'deal {tx_id}: status {tx.status}, fee_paid {tx.fee_paid}')
+        if completions[tx_id] != 1:
+            problems.append(f'deal {tx_id}: {completions[tx_id]} completion notifications')
+        if bool(tx.blockchain) != bool(ready[tx_id]):
+            problems.append(f'deal {tx_id}: network {tx.blockchain} after {ready[tx_id]} selections')
+
+    presses = len(deals) * duplicates
+    if sum(ready.values()) + turned_away != presses:
+        problems.append(f'{presses} button presses, but {sum(ready.values())} selections '
+                        f'and {turned_away} rejections')
+    return problems
+
+
+def main():
+    rng = random.Random(args.seed)
+    deals = seed(args.deals, args.groups)
+    raw_updates = build_updates(deals, args.duplicates, rng)
+
+    api = FakeBotAPI(latency=args.api_latency)
+    elapsed = asyncio.run(run(raw_updates, api))
+    print(f'{len(raw_updates)} racing updates for {len(deals)} deals in {elapsed:.2f}s '
+          f'({len(raw_updates) / elapsed:.0f} updates/s)')
+
+    problems = check(deals, args.duplicates, api)
+    for problem in problems[:20]:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: every deal completed and announced exactly once')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Per-render cost of the message catalog against inline f-strings.
+
+Times the hot messages (deal summary with its network keyboard, payment
+instructions, a /status page) built the old way, with f-strings and a
+keyboard assembled from Config on every call, and through the compiled
+catalog in each supported language.
+
+    python benchmarks/render_messages.py
+    python benchmarks/render_messages.py --number 50000
+"""
+import argparse
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+import messages  # noqa: E402
+from config import Config  # noqa: E402
+
+TX_ID = 12345
+BUYER_ID = 987654321
+AMOUNT = Decimal('100')
+TOTAL = Decimal('100.50')
+
+
+def inline_new_deal():
+    keyboard = []
+    for chain, info in Config.BLOCKCHAIN_INFO.items():
+        speed_emoji = "⚡️" if "1s" in info['speed'] else "🚀"
+        keyboard.append([InlineKeyboardButton(
+            f"{info['icon']} {chain} • {speed_emoji} {info['speed']} • 💰 {info['gas_fee']}",
+            callback_data=f"chain_{chain}_{TX_ID}"
+        )])
+    description = 'Product & more'.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    text = (
+        f"🎉 *Great! Let's set up your deal #{TX_ID}*\n\n"
+        f"💫 *Deal Summary:*\n"
+        f"💰 Base Amount: ${AMOUNT}\n"
+        f"🔒 Service Fee: $0.50\n"
+        f"💎 Total Amount: ${TOTAL}\n"
+        f"📝 For: {description}\n"
+        f"🤝 Between: @buyer_name and @seller_name\n\n"
+        "🌟 *Next Step:*\n"
+        "Choose a payment network below. I'll help you pick:\n\n"
+        "💡 *Quick Guide:*\n"
+        "• BEP20: Lowest fees\n"
+        "• ERC20: Most secure\n"
+        "• Optimism: Fast & cheap\n"
+        "• Arbitrum: Ultra fast"
+    )
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def catalog_new_deal(lang):
+    return (
+        messages.render(
+            lang, 'new_deal', tx_id=TX_ID, amount=AMOUNT, total=TOTAL,
+            description='Product & more', buyer='buyer_name', seller='seller_name'
+        ),
+        messages.chain_keyboard(TX_ID, BUYER_ID),
+    )
+
+
+def inline_payment():
+    network = Config.BLOCKCHAIN_INFO['BEP20']
+    return (
+        f"🎉 *Perfect! Deal #{TX_ID} is ready!*\n\n"
+        f"💰 *Amount to Send:* ${TOTAL}\n"
+        f"🔗 *Network:* BEP20\n"
+        f"⚡️ *Speed:* {network['speed']}\n"
+        f"💸 *Network Fee:* {network['gas_fee']}\n\n"
+        "📤 *Send payment to:*\n"
+        f"`{Config.NETWORK_WALLETS['BEP20']}`\n\n"
+        "🎯 *What's Next:*\n"
+        f"1. Send ${TOTAL} to the address above\n"
+        f"2. Once sent, type: `/ok {TX_ID}`\n"
+        "3. I'll verify everything and help complete the deal!\n\n"
+        "💡 Need help? Just type /help"
+    )
+
+
+def catalog_payment(lang):
+    network = Config.BLOCKCHAIN_INFO['BEP20']
+    return messages.render(
+        lang, 'payment_instructions', tx_id=TX_ID, total=TOTAL, chain='BEP20',
+        speed=network['speed'], gas_fee=network['gas_fee'],
+        wallet=Config.NETWORK_WALLETS['BEP20']
+    )
+
+
+def inline_status_page():
+    parts = ["🔍 *Recent Deals*\n\n"]
+    for i in range(Config.STATUS_PAGE_SIZE):
+        parts.append(
+            f"💫 *Deal #{TX_ID + i}*\n"
+            f"💰 Amount: ${TOTAL}\n"
+            f"👤 Buyer: @buyer_name\n"
+            f"👤 Seller: @seller_name\n"
+            f"📊 Status: awaiting_payment\n"
+            "➖➖➖➖➖➖➖➖\n"
+        )
+    return ''.join(parts)
+
+
+def catalog_status_page(lang):
+    parts = [messages.text(lang, 'status_group_header')]
+    for i in range(Config.STATUS_PAGE_SIZE):
+        parts.append(messages.text(
+            lang, 'status_group_deal', tx_id=TX_ID + i, total=TOTAL,
+            buyer='buyer_name', seller='seller_name',
+            status=messages.deal_status(lang, 'awaiting_payment')
+        ))
+    return ''.join(parts)
+
+
+def measure(fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='renders per timing run')
+    args = parser.parse_args()
+
+    cases = [
+        ('deal summary + keyboard', inline_new_deal, catalog_new_deal),
+        ('payment instructions', inline_payment, catalog_payment),
+        ('/status page', inline_status_page, catalog_status_page),
+    ]
+    print(f"{'message':<26}{'inline':>10}" + ''.join(f'{lang:>10}' for lang in Config.SUPPORTED_LANGUAGES))
+    for name, inline, catalog in cases:
+        row = f'{name:<26}{measure(inline, args.number):8.2f}us'
+        for lang in Config.SUPPORTED_LANGUAGES:
+            row += f'{measure(lambda: catalog(lang), args.number):8.2f}us'
+        print(row)
+
+    timings = [
+        measure(lambda: messages.LANGUAGE_KEYBOARD, args.number),
+        measure(lambda: InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"🌐 {name}", callback_data=f"lang_{code}")]
+            for code, name in Config.SUPPORTED_LANGUAGES.items()
+        ]), args.number),
+    ]
+    print(f"{'language keyboard':<26}{timings[1]:8.2f}us  prebuilt {timings[0]:.2f}us")
+
+
+if __name__ == '__main__':
+    main()
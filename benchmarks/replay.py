@@ -0,0 +1,326 @@
+"""Replay a capture of production updates through the bot against a fake Bot API.
+
+Reads one or more capture files written with CAPTURE_FILE set (see
+capture.py; rotated .gz backups too, oldest first), wipes a local
+database and seeds it with every user the capture saw, then feeds the
+updates to the real TelegramBot application: at the captured pace
+(--speed 1), N times faster (--speed N) or as fast as possible
+(--speed 0), with at most --concurrency in flight.
+
+Updates of one chat are fed in their captured order. Signed buttons are
+signed again with the local key, and references to a deal the capture
+created (/ok, buttons) wait for the replayed /new and point at the deal it
+created here. References to older deals are left as they are and find
+nothing.
+
+Reports throughput and p50/p95/p99 latency per command, latency measured
+like load_test.py: from putting an update on the queue until every
+handler group is done with it. With a pace set, also how far the feed
+fell behind it.
+
+    python benchmarks/replay.py updates.jsonl
+    python benchmarks/replay.py updates.jsonl.2.gz updates.jsonl.1.gz updates.jsonl --speed 10
+    python benchmarks/replay.py updates.jsonl --speed 0 --url postgresql://localhost/escrow_bench
+
+A synthetic capture to try it on:
+
+    CAPTURE_FILE=/tmp/updates.jsonl python benchmarks/load_test.py --deals 200
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('captures', nargs='+', help='capture files, oldest first')
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_replay.db')}",
+                        help='database to replay against (it is wiped first)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='multiple of the captured pace; 0 for as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=64, help='updates in flight at most')
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ['BOT_TOKEN'] = BOT_TOKEN
+os.environ.pop('CAPTURE_FILE', None)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'replay_bot.log'))
+
+from sqlalchemy import insert  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+import callback_data  # noqa: E402
+import capture  # noqa: E402
+import outbound  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from bot import TelegramBot  # noqa: E402
+from models import User  # noqa: E402
+from outbound import TokenBucket  # noqa: E402
+
+_OK = re.compile(r'^(/ok(?:@\w+)?\s+)(\d+)')
+_MENTION = re.compile(r'@(\w+)')
+# Above any pseudonymous id, for users the capture only saw mentioned
+MENTIONED_ID_BASE = 10 ** 15
+
+
+class DealNotes:
+    """Stands in for capture.recorder: keeps the deal each update created"""
+
+    enabled = False
+
+    def __init__(self):
+        self.notes = {}
+
+    def note(self, update, **fields):
+        self.notes.setdefault(update.update_id, {}).update(fields)
+
+
+def load(paths):
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    # Lines are written as updates finish; sort them back into arrival order
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+def _message(update):
+    return update.get('message') or update.get('edited_message')
+
+
+def chat_of(record):
+    update = record['update']
+    message = _message(update) or (update.get('callback_query') or {}).get('message')
+    if message:
+        return message['chat']['id']
+    for kind in ('chat_member', 'my_chat_member'):
+        if kind in update:
+            return update[kind]['chat']['id']
+    return None
+
+
+def command_of(record):
+    update = record['update']
+    if 'button' in record:
+        return 'chain button'
+    message = _message(update)
+    if message:
+        text = message.get('text') or ''
+        if text.startswith('/'):
+            return text.split()[0].split('@')[0]
+        return 'message'
+    if 'callback_query' in update:
+        return f"{update['callback_query'].get('data', '').split('_')[0]} button"
+    return next((key for key in update if key != 'update_id'), 'other')
+
+
+def deal_of(record):
+    """The captured deal id an update refers to, if any"""
+    if 'button' in record:
+        return record['button'][2]
+    message = _message(record['update'])
+    match = _OK.match(message.get('text') or '') if message else None
+    return int(match.group(2)) if match else None
+
+
+def seed(records):
+    users = {}
+    mentioned = set()
+    for record in records:
+        update = record['update']
+        for part in (_message(update), update.get('callback_query')):
+            user = (part or {}).get('from')
+            if user and not user.get('is_bot'):
+                users[user['id']] = user.get('username')
+        message = _message(update)
+        if message and message.get('text'):
+            mentioned.update(name.lower() for name in _MENTION.findall(message['text']))
+    # Sellers the capture only saw mentioned were known to the bot too
+    known = {name.lower() for name in users.values() if name}
+    for index, name in enumerate(sorted(mentioned - known)):
+        users[MENTIONED_ID_BASE + index] = name
+
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+    with app.app_context():
+        if users:
+            db.session.execute(insert(User), [
+                {'telegram_id': str(user_id), 'username': username, 'language': 'en'}
+                for user_id, username in users.items()
+            ])
+        db.session.commit()
+    return len(users)
+
+
+class Replayer:
+    """Feeds captured updates to the application, per chat in order"""
+
+    def __init__(self, application, notes, concurrency, speed):
+        self.application = application
+        self.notes = notes
+        self.speed = speed
+        self.deals = {}
+        self.latencies = defaultdict(list)
+        self.lag = 0.0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._created = {}
+        self._in_flight = {}
+        self._update_ids = iter(range(1, 10 ** 9))
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # Last group of all, so it sees each update after every handler
+        application.add_handler(TypeHandler(Update, self._finished), group=99)
+
+    async def _finished(self, update, context):
+        started, command, captured_deal = self._in_flight.pop(update.update_id)
+        self.latencies[command].append(time.perf_counter() - started)
+        deal = self.notes.notes.pop(update.update_id, {}).get('deal')
+        if captured_deal is not None:
+            if deal is not None:
+                self.deals[captured_deal] = deal
+            self._created.pop(captured_deal).set()
+        self._slots.release()
+        if not self._in_flight:
+            self._idle.set()
+
+    def _rewrite(self, record):
+        update = json.loads(json.dumps(record['update']))
+        update['update_id'] = next(self._update_ids)
+        if 'button' in record:
+            action, chain, deal, telegram_id = record['button']
+            update['callback_query']['data'] = callback_data.encode(
+                action, chain, self.deals.get(deal, deal), telegram_id
+            )
+        else:
+            message = _message(update)
+            if message and message.get('text'):
+                message['text'] = _OK.sub(
+                    lambda match: match.group(1) + str(self.deals.get(int(match.group(2)), match.group(2))),
+                    message['text']
+                )
+        return update
+
+    async def _feed(self, record):
+        deal = deal_of(record)
+        if deal in self._created:
+            # The replayed /new that creates it has not finished yet
+            await self._created[deal].wait()
+        raw = self._rewrite(record)
+        await self._slots.acquire()
+        update = Update.de_json(raw, self.application.bot)
+        self._in_flight[update.update_id] = (time.perf_counter(), command_of(record), record.get('deal'))
+        self._idle.clear()
+        self.application.update_queue.put_nowait(update)
+
+    async def _chat_worker(self, queue):
+        while (record := await queue.get()) is not None:
+            await self._feed(record)
+
+    async def run(self, records):
+        """Return the elapsed seconds"""
+        for record in records:
+            if 'deal' in record:
+                self._created[record['deal']] = asyncio.Event()
+
+        queues = {}
+        workers = []
+        started = time.perf_counter()
+        first = records[0]['t']
+        for record in records:
+            if self.speed:
+                delay = started + (record['t'] - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.lag = max(self.lag, -delay)
+            chat = chat_of(record)
+            if chat not in queues:
+                queues[chat] = asyncio.Queue()
+                workers.append(asyncio.create_task(self._chat_worker(queues[chat])))
+            queues[chat].put_nowait(record)
+
+        for queue in queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        await asyncio.wait_for(self._idle.wait(), 300)
+        return time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def run(records):
+    notes = capture.recorder = DealNotes()
+    api = FakeBotAPI(latency=args.api_latency)
+    bot = TelegramBot(request=api.request(), get_updates_request=api.request())
+    application = bot.application
+    replayer = Replayer(application, notes, args.concurrency, args.speed)
+    await application.initialize()
+    await application.start()
+
+    # Lift the outbound limits; this measures the bot, not Telegram's quotas
+    scheduler = outbound.scheduler
+    scheduler.global_bucket = TokenBucket(100_000, 100_000)
+    scheduler.chat_rate = scheduler.group_rate = 6_000_000
+    scheduler.start(application.bot)
+    try:
+        elapsed = await replayer.run(records)
+    finally:
+        await scheduler.stop()
+        await application.stop()
+        await application.shutdown()
+    return replayer, elapsed
+
+
+def main():
+    records = load(args.captures)
+    if not records:
+        sys.exit('no updates in the capture')
+    users = seed(records)
+    captured = records[-1]['t'] - records[0]['t']
+    pace = f'{args.speed:g}x' if args.speed else 'as fast as possible'
+    print(f'Replaying {len(records)} updates from {users} users, captured over {captured:.1f}s, {pace}')
+
+    replayer, elapsed = asyncio.run(run(records))
+    print(f"{'command':<18}{'updates':>8}{'upd/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for command, latencies in sorted(replayer.latencies.items(), key=lambda item: -len(item[1])):
+        latencies.sort()
+        print(f'{command:<18}{len(latencies):>8}{len(latencies) / elapsed:>9.1f}'
+              f'{percentile(latencies, 0.50) * 1000:>9.2f}{percentile(latencies, 0.95) * 1000:>9.2f}'
+              f'{percentile(latencies, 0.99) * 1000:>9.2f}')
+    replayed = sum(len(latencies) for latencies in replayer.latencies.values())
+    created = sum(1 for record in records if 'deal' in record)
+    print(f'{replayed} updates in {elapsed:.1f}s ({replayed / elapsed:.0f}/s); '
+          f'{len(replayer.deals)} of {created} captured deals created again')
+    if args.speed:
+        print(f'feed fell behind the captured pace by up to {replayer.lag * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Throughput of multi-process mode (sharding.py) against the number of workers.
+
+Seeds users and deals, then for each --workers count starts a real
+Ingress with that many worker processes, each running the TelegramBot
+application against its own fake Bot API, and pushes a read-heavy mix of
+updates through the ingress's long poll: /status in groups and private
+chats, /profile and /help. Reports throughput, the speedup over the first
+worker count and how the updates were spread between workers.
+
+The run fails when a worker processes more or fewer updates than the
+ring sent it, or sees a chat's updates out of order. Speedup needs as
+many free cores as workers (plus one for the ingress); on fewer it only
+shows the cost of the extra hop.
+
+    python benchmarks/shard_scaling.py
+    python benchmarks/shard_scaling.py --updates 20000 --workers 1 2 4 8
+    python benchmarks/shard_scaling.py --url postgresql://localhost/escrow_bench
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI, message_update  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f"sqlite:///{os.path.join(ROOT, 'bench_shard_scaling.db')}",
+                        help='database to seed (it is wiped first)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=5000, help='updates per run')
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--deals', type=int, default=2000, help='deals to seed')
+    parser.add_argument('--api-latency', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+# Worker processes import this module again and see the same argv
+args = parse_args()
+os.environ['DATABASE_URL'] = args.url
+os.environ['BOT_TOKEN'] = BOT_TOKEN
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# setdefault: workers inherit their own per-worker LOG_FILE
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'shard_scaling_bot.log'))
+
+from sqlalchemy import insert  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+import outbound  # noqa: E402
+import sharding  # noqa: E402
+from app import app, configure_app, db, upgrade_database  # noqa: E402
+from bot import TelegramBot  # noqa: E402
+from models import EscrowTransaction, User  # noqa: E402
+from outbound import TokenBucket  # noqa: E402
+
+USER_ID_BASE = 30_000
+GROUP_ID_BASE = -2000
+# Seconds to wait for all workers to finish a run
+RUN_TIMEOUT = 600
+
+
+def username(index):
+    return f'shard{index}'
+
+
+def seed(rng):
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'telegram_id': str(USER_ID_BASE + i), 'username': username(i), 'language': 'en'}
+            for i in range(args.users)
+        ])
+        db.session.execute(insert(EscrowTransaction), [
+            {
+                'buyer_id': buyer + 1, 'seller_id': seller + 1, 'amount': rng.randint(5, 500),
+                'description': 'seeded deal', 'fee_amount': 0.5,
+                'status': rng.choice(['awaiting_payment', 'payment_confirmed', 'completed']),
+                'chat_id': str(GROUP_ID_BASE - rng.randrange(args.groups)),
+            }
+            for buyer, seller in (rng.sample(range(args.users), 2) for _ in range(args.deals))
+        ])
+        db.session.commit()
+
+
+def workload(rng):
+    raws = []
+    for update_id in range(1, args.updates + 1):
+        user = rng.randrange(args.users)
+        user_id, name = USER_ID_BASE + user, username(user)
+        roll = rng.random()
+        if roll < 0.4:
+            raws.append(message_update(update_id, GROUP_ID_BASE - rng.randrange(args.groups), user_id, name, '/status'))
+        elif roll < 0.7:
+            raws.append(message_update(update_id, user_id, user_id, name, '/status'))
+        elif roll < 0.9:
+            raws.append(message_update(update_id, user_id, user_id, name, '/profile'))
+        else:
+            raws.append(message_update(update_id, user_id, user_id, name, '/help'))
+    return raws
+
+
+class UpdateCounter:
+    """Counts a worker's processed updates and checks each chat's order"""
+
+    def __init__(self, index, expected, results):
+        self.index = index
+        self.expected = expected
+        self.results = results
+        self.count = 0
+        self.out_of_order = 0
+        self._last = {}
+
+    async def finished(self, update, context):
+        chat = update.effective_chat.id
+        if update.update_id < self._last.get(chat, 0):
+            self.out_of_order += 1
+        self._last[chat] = update.update_id
+        self.count += 1
+        if self.count == self.expected:
+            self.results.put(('done', self.index))
+
+
+def bench_worker(index, sock, results, expected, api_latency):
+    """Worker process: the real worker loop with a fake Bot API and a counter"""
+    counter = UpdateCounter(index, expected[index], results)
+
+    class CountingBot(TelegramBot):
+        async def start(self, **kwargs):
+            started = await super().start(**kwargs)
+            results.put(('ready', index))
+            return started
+
+    def make_bot():
+        api = FakeBotAPI(latency=api_latency)
+        bot = CountingBot(request=api.request(), get_updates_request=api.request())
+        # Last group of all, so it sees each update after every handler
+        bot.application.add_handler(TypeHandler(Update, counter.finished), group=99)
+        # Lift the outbound limits; this measures the bot, not Telegram's quotas
+        scheduler = outbound.scheduler
+        scheduler.global_bucket = TokenBucket(100_000, 100_000)
+        scheduler.chat_rate = scheduler.group_rate = 6_000_000
+        return bot
+
+    sharding.worker_main(index, sock, bot_factory=make_bot)
+    results.put(('exit', index, counter.count, counter.out_of_order))
+
+
+async def _wait_for(results, kind, workers):
+    deadline = time.monotonic() + RUN_TIMEOUT
+    messages = {}
+    while len(messages) < workers:
+        try:
+            message = await asyncio.to_thread(results.get, True, max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise SystemExit(f'timed out waiting for {kind} from {workers - len(messages)} workers')
+        if message[0] == kind:
+            messages[message[1]] = message
+        elif message[0] == 'exit':
+            raise SystemExit(f'worker {message[1]} exited early')
+    return messages
+
+
+async def run(workers, raws):
+    """Return (elapsed seconds, updates expected per worker, exit reports)"""
+    ring = sharding.HashRing(range(workers))
+    expected = [0] * workers
+    for raw in raws:
+        expected[ring.node(sharding.routing_key(Update.de_json(raw, None)))] += 1
+
+    results = multiprocessing.get_context('spawn').Queue()
+    api = FakeBotAPI(latency=args.api_latency)
+    ingress = sharding.Ingress(
+        workers, target=bench_worker, args=(results, expected, args.api_latency),
+        request=api.request(), get_updates_request=api.request()
+    )
+    try:
+        await ingress.start()
+        await _wait_for(results, 'ready', workers)
+        started = time.perf_counter()
+        for raw in raws:
+            api.updates.put_nowait(raw)
+        await _wait_for(results, 'done', sum(1 for count in expected if count))
+        elapsed = time.perf_counter() - started
+    finally:
+        await ingress.stop()
+    exits = await _wait_for(results, 'exit', workers)
+    return elapsed, expected, exits
+
+
+def main():
+    rng = random.Random(args.seed)
+    seed(rng)
+    raws = workload(rng)
+    print(f'{len(raws)} updates over {args.users} users and {args.groups} groups, '
+          f'{os.cpu_count()} CPUs')
+    print(f"{'workers':>7}{'seconds':>9}{'upd/s':>9}{'speedup':>9}  updates per worker")
+
+    problems = []
+    first = None
+    for workers in args.workers:
+        elapsed, expected, exits = asyncio.run(run(workers, raws))
+        throughput = len(raws) / elapsed
+        first = first or throughput
+        print(f'{workers:>7}{elapsed:>9.1f}{throughput:>9.0f}{throughput / first:>8.2f}x  '
+              f"{' '.join(str(count) for count in expected)}")
+        for index, (_, _, count, out_of_order) in sorted(exits.items()):
+            if count != expected[index]:
+                problems.append(f'{workers} workers: worker {index} processed {count} of {expected[index]}')
+            if out_of_order:
+                problems.append(f'{workers} workers: worker {index} saw {out_of_order} updates out of order')
+        if workers > 1 and max(expected) > 2 * len(raws) / workers:
+            print(f'  note: uneven spread, busiest worker got {max(expected)} of {len(raws)}')
+
+    for problem in problems:
+        print(f'  {problem}')
+    print('FAILED' if problems else 'ok: every update processed once, in order per chat')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Ingestion latency of webhook mode versus long polling.
+
+Feeds the same updates to a bare Application once through the updater's
+webhook server (HTTP POSTs carrying the secret-token header) and once
+through long polling against a fake Bot API, and reports the time from
+hand-off to the moment a handler sees each update.
+
+    python benchmarks/webhook_latency.py --count 2000 --api-latency 0.05
+    python benchmarks/webhook_latency.py --updates recorded_updates.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI, message_update  # noqa: E402
+
+SECRET = 'benchmark-secret'
+
+
+def load_updates(args):
+    if args.updates:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = [
+            message_update(i, -1000 - i % 50, 10_000 + i % 500, f'user{i % 500}', '/help')
+            for i in range(1, args.count + 1)
+        ]
+    # Renumber so both runs see fresh, increasing update ids
+    for update_id, update in enumerate(updates, 1):
+        update['update_id'] = update_id
+    return updates
+
+
+async def run(mode, updates, args):
+    api = FakeBotAPI(latency=args.api_latency)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(api.request())
+        .get_updates_request(api.request())
+        .build()
+    )
+
+    sent = {}
+    latencies = []
+    done = asyncio.Event()
+
+    async def record(update, context):
+        latencies.append(time.perf_counter() - sent[update.update_id])
+        if len(latencies) == len(updates):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, record))
+    await application.initialize()
+    await application.start()
+
+    started = time.perf_counter()
+    if mode == 'webhook':
+        await application.updater.start_webhook(
+            listen='127.0.0.1', port=args.port, url_path='hook',
+            webhook_url=f'http://127.0.0.1:{args.port}/hook', secret_token=SECRET
+        )
+        url = f'http://127.0.0.1:{args.port}/hook'
+        async with httpx.AsyncClient() as client:
+            rejected = await client.post(url, json=updates[0],
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+            print(f'  request with a wrong secret token -> HTTP {rejected.status_code}')
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def post(update):
+                async with semaphore:
+                    sent[update['update_id']] = time.perf_counter()
+                    await client.post(url, json=update,
+                                      headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(update) for update in updates))
+    else:
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+        started = time.perf_counter()
+        for update in updates:
+            sent[update['update_id']] = time.perf_counter()
+            api.updates.put_nowait(update)
+            if args.interval:
+                await asyncio.sleep(args.interval)
+
+    await asyncio.wait_for(done.wait(), timeout=120)
+    elapsed = time.perf_counter() - started
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    return elapsed, latencies
+
+
+def report(mode, elapsed, latencies):
+    ms = sorted(latency * 1000 for latency in latencies)
+    quantiles = statistics.quantiles(ms, n=100)
+    print(f'{mode:<8} {len(ms) / elapsed:9.0f} updates/s   '
+          f'p50 {quantiles[49]:8.2f} ms   p95 {quantiles[94]:8.2f} ms   '
+          f'p99 {quantiles[98]:8.2f} ms')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', help='JSONL file of raw updates to replay')
+    parser.add_argument('--count', type=int, default=1000, help='synthetic updates to send')
+    parser.add_argument('--api-latency', type=float, default=0.05,
+                        help='seconds added to every fake Bot API call (polling round trip)')
+    parser.add_argument('--interval', type=float, default=0.001,
+                        help='seconds between updates in polling mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel webhook POSTs')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    updates = load_updates(args)
+    for mode in ('webhook', 'polling'):
+        print(f'{mode}:')
+        elapsed, latencies = await run(mode, [dict(u) for u in updates], args)
+        report(mode, elapsed, latencies)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
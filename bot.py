@@ -4,24 +4,92 @@ from telegram.ext import (
     CommandHandler, 
     MessageHandler, 
     CallbackQueryHandler, 
+    ChatMemberHandler,
+    TypeHandler,
     filters
 )
 from config import Config
 from handlers import (
     start_command, help_command, create_escrow_command, blockchain_callback,
-    language_callback, status_command, release_command
+    language_callback, status_command, status_page_callback, release_command,
+    profile_command, track_chat_member, track_group_activity
 )
 from logger import logger
+from urllib.parse import urlparse
 import asyncio
+import secrets
+import archive
+import callback_data
+import capture
+import deadlines
+import health
+import metrics
+import outbound
+import payments
+import repository
+import reputation
+import user_writes
+from update_processor import KeyedUpdateProcessor
+
+ALLOWED_UPDATES = [
+    "message",
+    "edited_message",
+    "callback_query",
+    "chat_member"
+]
+
+async def start_receiving(updater):
+    """Start the updater on the webhook when WEBHOOK_URL is set, polling otherwise.
+
+    The webhook server runs on the caller's event loop, rejects requests
+    without our secret token header and puts accepted updates straight onto
+    the updater's queue. Pending updates are kept, so nothing queued during
+    a restart is lost.
+    """
+    if not Config.WEBHOOK_URL:
+        # Start polling with explicit update types
+        await updater.start_polling(drop_pending_updates=True, allowed_updates=ALLOWED_UPDATES)
+        logger.info("Polling started.")
+        return
+
+    secret_token = Config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    await updater.start_webhook(
+        listen=Config.WEBHOOK_LISTEN,
+        port=Config.WEBHOOK_PORT,
+        url_path=urlparse(Config.WEBHOOK_URL).path.lstrip('/'),
+        webhook_url=Config.WEBHOOK_URL,
+        secret_token=secret_token,
+        allowed_updates=ALLOWED_UPDATES
+    )
+    logger.info(f"Webhook server listening on {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}")
 
 class TelegramBot:
-    def __init__(self):
-        """Initialize the bot"""
+    def __init__(self, request=None, get_updates_request=None):
+        """Initialize the bot
+
+        request and get_updates_request optionally replace the HTTP clients
+        used for Bot API calls, e.g. to run against a fake API. By default
+        both record Bot API latency in metrics.
+        """
         if not Config.TOKEN:
             raise ValueError("Bot token not found in environment variables")
 
         try:
-            self.application = Application.builder().token(Config.TOKEN).build()
+            builder = (
+                Application.builder()
+                .token(Config.TOKEN)
+                .concurrent_updates(KeyedUpdateProcessor(Config.MAX_CONCURRENT_UPDATES))
+            )
+            # Same pool sizes PTB would pick for its own clients
+            builder = builder.request(
+                request if request is not None
+                else metrics.InstrumentedRequest(connection_pool_size=256)
+            )
+            builder = builder.get_updates_request(
+                get_updates_request if get_updates_request is not None
+                else metrics.InstrumentedRequest(connection_pool_size=1)
+            )
+            self.application = builder.build()
             self._setup_handlers()
             self._running = False  # Private running state
             logger.info("Bot initialized successfully")
@@ -39,10 +107,36 @@ class TelegramBot:
             self.application.add_handler(CommandHandler("new", create_escrow_command))
             self.application.add_handler(CommandHandler("status", status_command))
             self.application.add_handler(CommandHandler("ok", release_command))
+            self.application.add_handler(CommandHandler("profile", profile_command))
 
             # Callback handlers for interactive buttons
             self.application.add_handler(CallbackQueryHandler(language_callback, pattern="^lang_"))
-            self.application.add_handler(CallbackQueryHandler(blockchain_callback, pattern="^chain_"))
+            self.application.add_handler(
+                CallbackQueryHandler(blockchain_callback, pattern=f"{callback_data.PATTERN}|^chain_")
+            )
+            self.application.add_handler(CallbackQueryHandler(status_page_callback, pattern="^status_"))
+
+            # Username directory, in a later group so it never delays commands
+            self.application.add_handler(
+                ChatMemberHandler(track_chat_member, ChatMemberHandler.CHAT_MEMBER), group=1
+            )
+            self.application.add_handler(
+                MessageHandler(filters.ChatType.GROUPS, track_group_activity), group=1
+            )
+
+            # Time every handler registered above
+            for group in self.application.handlers.values():
+                for handler in group:
+                    handler.callback = metrics.instrument_handler(handler.callback)
+
+            # Runs after every other group, so it marks updates as processed
+            self.application.add_handler(TypeHandler(Update, self._record_update), group=2)
+
+            # Optional capture of every update, for replaying traffic locally
+            if capture.recorder.enabled:
+                self.application.add_handler(TypeHandler(Update, capture.recorder.begin), group=-1)
+                self.application.add_handler(TypeHandler(Update, capture.recorder.finish), group=3)
+                capture.recorder.start()
 
             # Add error handler
             self.application.add_error_handler(self._error_handler)
@@ -52,18 +146,32 @@ class TelegramBot:
             logger.error(f"Error setting up handlers: {str(e)}")
             raise
 
+    async def _record_update(self, update, context):
+        """Tell the health monitor an update went through"""
+        health.monitor.update_processed()
+
     async def _error_handler(self, update, context):
         """Handle errors in the bot"""
-        logger.error(f"Update {update} caused error {context.error}")
+        # Log the id, not the whole update: repr of an Update is large and
+        # is only worth building if someone reads it
+        update_id = getattr(update, 'update_id', None)
+        metrics.update_errors.inc()
+        logger.error("Update %s caused error", update_id, exc_info=context.error)
 
     @property
     def is_running(self):
         """Check if the bot is running"""
         return self._running
 
-    async def start(self):
+    async def start(self, receive_updates=True, run_jobs=True):
+
+        """Start the bot with retry mechanism
 
-        """Start the bot with retry mechanism"""
+        A sharded worker (see sharding.py) passes receive_updates=False, as
+        its updates come from the ingress process, and only one worker
+        runs the jobs that must not run twice (payment watcher, deadlines,
+        archive, reputation rebuild).
+        """
         max_retries = 3
         retry_delay = 5
 
@@ -76,17 +184,17 @@ class TelegramBot:
                 await self.application.start()
                 logger.info("Application started.")
 
-            # Start polling with explicit update types
-                await self.application.updater.start_polling(
-                    drop_pending_updates=True,
-                    allowed_updates=[
-                        "message",
-                        "edited_message",
-                        "callback_query",
-                        "chat_member"
-                    ]
-                )
-                logger.info("Polling started.")
+                if receive_updates:
+                    await start_receiving(self.application.updater)
+
+                outbound.scheduler.start(self.application.bot)
+                health.monitor.start()
+                user_writes.flusher.start()
+                if run_jobs:
+                    payments.watcher.start()
+                    deadlines.scheduler.start()
+                    archive.archiver.start()
+                    reputation.rebuilder.start()
 
                 self._running = True
                 logger.info("Bot started successfully")
@@ -108,12 +216,24 @@ class TelegramBot:
             logger.info("Stopping bot...")
             self._running = False
 
-            # Stop in reverse order: first updater, then application
-            if hasattr(self.application, 'updater') and self.application.updater:
+            # Stop taking updates and stop the jobs first
+            if self.application.updater and self.application.updater.running:
                 await self.application.updater.stop()
 
+            await payments.watcher.stop()
+            await deadlines.scheduler.stop()
+            await archive.archiver.stop()
+            await reputation.rebuilder.stop()
+
+            # Still processes the queued updates and waits for running
+            # handlers; what they write, send or capture is flushed after
             await self.application.stop()
+            await user_writes.flusher.stop()
+            await outbound.scheduler.stop()
+            await health.monitor.stop()
+            capture.recorder.stop()
             await self.application.shutdown()
+            repository.shutdown()
             logger.info("Bot stopped successfully")
         except Exception as e:
             logger.error(f"Error stopping bot: {str(e)}")
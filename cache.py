@@ -0,0 +1,74 @@
+"""Small in-process caches used by the handlers"""
+import time
+from collections import OrderedDict
+
+import metrics
+
+# Caches created with a name, reported in bot_cache_lookups_total
+_named = {}
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used key.
+
+    With a ttl (seconds), entries also expire that long after they were
+    set; with a name, its hits and misses are exported. Not thread-safe:
+    it is meant to be used from the bot's event loop only.
+    """
+
+    def __init__(self, maxsize, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        if name is not None:
+            _named[name] = self
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used"""
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a value, evicting the oldest entry when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Drop a key and return its value"""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+metrics.registry.counter_callback(
+    'bot_cache_lookups_total', 'Lookups in the named in-process caches, by result',
+    lambda: {
+        (name, result): count
+        for name, cache in _named.items()
+        for result, count in (('hit', cache.hits), ('miss', cache.misses))
+    },
+    ['cache', 'result']
+)
@@ -0,0 +1,190 @@
+"""Capture of incoming updates, for replaying production traffic locally.
+
+With CAPTURE_FILE set, every update the bot processes is appended to that
+file as one compact JSON line:
+
+    {"t": <unix time processing started>, "update": {...Bot API update...},
+     "button": [action, chain, deal id, telegram id], "deal": <deal id>}
+
+"button" replaces the data of a signed inline button, which only this
+bot's key can verify, so a replay can sign it again with its own; "deal"
+is the id of the deal the update created, so a replay can point later
+references at its own deal. benchmarks/replay.py feeds a capture back
+through the handlers.
+
+Like the log, lines are only queued on the event loop; a listener thread
+turns them into JSON and writes them to a file that rotates at
+CAPTURE_MAX_BYTES, keeping CAPTURE_BACKUP_COUNT gzipped backups. Unless
+CAPTURE_ANONYMIZE is false, user and chat ids, usernames (also when
+mentioned in a message) and names are replaced with pseudonyms keyed by
+CAPTURE_SALT, stable across the capture, and the text of the bot's own
+messages is dropped.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import time
+from logging.handlers import QueueListener
+
+import callback_data
+from config import Config
+from logger import logger, rotating_file_handler
+
+CHAT_TYPES = frozenset({'private', 'group', 'supergroup', 'channel'})
+# Service flags PTB writes out on every message; false unless present
+_MESSAGE_FLAGS = (
+    'channel_chat_created', 'delete_chat_photo', 'group_chat_created', 'supergroup_chat_created'
+)
+_MENTION = re.compile(r'@(\w+)')
+
+
+class Anonymizer:
+    """Replaces identifiers in raw updates with keyed pseudonyms"""
+
+    def __init__(self, salt):
+        self._key = hashlib.sha256(salt.encode()).digest()
+
+    def _digest(self, value):
+        return hashlib.blake2b(str(value).encode(), key=self._key, digest_size=8).digest()
+
+    def user_id(self, value):
+        # Keeps the sign, so group chat ids stay negative, and private chat
+        # ids stay equal to their user's id
+        pseudonym = int.from_bytes(self._digest(abs(value))[:6], 'big') or 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def username(self, name):
+        # Same length, so message entity offsets stay valid
+        return ('u' + self._digest(name.lower()).hex() * 4)[:len(name)]
+
+    def text(self, text):
+        return _MENTION.sub(lambda match: '@' + self.username(match.group(1)), text)
+
+    def update(self, value):
+        """Return a copy of a raw update (or any part of one) with pseudonyms"""
+        if isinstance(value, list):
+            return [self.update(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        value = {key: self.update(item) for key, item in value.items()}
+        if 'is_bot' in value or value.get('type') in CHAT_TYPES:
+            # A user or a chat
+            value['id'] = self.user_id(value['id'])
+            if value.get('username'):
+                value['username'] = self.username(value['username'])
+            if 'first_name' in value:
+                value['first_name'] = value.get('username') or 'User'
+            value.pop('last_name', None)
+            if 'title' in value:
+                value['title'] = 'Group'
+        if 'text' in value and 'message_id' in value:
+            if value.get('from', {}).get('is_bot'):
+                # The bot's own deal summaries name both parties
+                value['text'] = '...'
+                value.pop('entities', None)
+            else:
+                value['text'] = self.text(value['text'])
+        return value
+
+
+def _drop_flags(message):
+    if message:
+        for flag in _MESSAGE_FLAGS:
+            if message.get(flag) is False:
+                del message[flag]
+
+
+class CaptureFormatter(logging.Formatter):
+    """Turns a queued update into its capture line, on the listener thread"""
+
+    def __init__(self, anonymizer):
+        super().__init__()
+        self.anonymizer = anonymizer
+
+    def format(self, record):
+        raw = record.update.to_dict()
+        for kind in ('message', 'edited_message'):
+            _drop_flags(raw.get(kind))
+        query = raw.get('callback_query')
+        if query:
+            _drop_flags(query.get('message'))
+        entry = {'t': round(record.started, 3)}
+        button = callback_data.decode(query.get('data')) if query else None
+        if button is not None:
+            entry['button'] = list(button)
+            query['data'] = ''
+        if self.anonymizer is not None:
+            raw = self.anonymizer.update(raw)
+            if button is not None:
+                entry['button'][3] = self.anonymizer.user_id(button.telegram_id)
+        entry['update'] = raw
+        entry.update(record.notes)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class UpdateRecorder:
+    """Appends every processed update to a rotating capture file"""
+
+    def __init__(self, path, max_bytes, backup_count, anonymize=True, salt=None):
+        self.path = path
+        self.enabled = bool(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.anonymize = anonymize
+        self.salt = salt
+        self._started = {}
+        self._notes = {}
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+
+    def start(self):
+        """Start the writer thread; idempotent"""
+        if not self.enabled or self._listener is not None:
+            return
+        anonymizer = None
+        if self.anonymize:
+            if not self.salt:
+                logger.warning("CAPTURE_SALT is not set; pseudonyms will change on restart")
+            anonymizer = Anonymizer(self.salt or os.urandom(16).hex())
+        handler = rotating_file_handler(self.path, self.max_bytes, self.backup_count)
+        handler.setFormatter(CaptureFormatter(anonymizer))
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        atexit.register(self.stop)
+        logger.info(f"Capturing updates to {self.path}")
+
+    def stop(self):
+        """Write out what is queued and stop the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def note(self, update, **fields):
+        """Add fields, e.g. the deal an update created, to its capture line"""
+        if self.enabled:
+            self._notes.setdefault(update.update_id, {}).update(fields)
+
+    async def begin(self, update, context):
+        """Handler run before all others: remember when processing started"""
+        self._started[update.update_id] = time.time()
+
+    async def finish(self, update, context):
+        """Handler run after all others: queue the update for writing"""
+        started = self._started.pop(update.update_id, None)
+        notes = self._notes.pop(update.update_id, {})
+        if started is None or self._listener is None:
+            return
+        self._queue.put_nowait(logging.makeLogRecord({'update': update, 'started': started, 'notes': notes}))
+
+
+recorder = UpdateRecorder(
+    Config.CAPTURE_FILE, Config.CAPTURE_MAX_BYTES, Config.CAPTURE_BACKUP_COUNT,
+    Config.CAPTURE_ANONYMIZE, Config.CAPTURE_SALT
+)
@@ -56,6 +56,59 @@ class Config:
         }
     }
 
+    # On-chain payment watcher. A chain is watched when its RPC URL is set
+    # (BEP20_RPC_URL, ...): transfers of its USDT token to the chain's
+    # NETWORK_WALLETS address, `confirmations` blocks deep, are matched to
+    # deals awaiting payment on that chain by exact total.
+    PAYMENT_CHAINS = {
+        'BEP20': {
+            'rpc_url': os.environ.get("BEP20_RPC_URL"),
+            'token': '0x55d398326f99059fF775485246999027B3197955',
+            'decimals': 18,
+            'confirmations': 15,
+        },
+        'ERC20': {
+            'rpc_url': os.environ.get("ERC20_RPC_URL"),
+            'token': '0xdAC17F958D2ee523a2206206994597C13D831ec7',
+            'decimals': 6,
+            'confirmations': 12,
+        },
+        'OPTIMISM': {
+            'rpc_url': os.environ.get("OPTIMISM_RPC_URL"),
+            'token': '0x94b008aA00579c1307B0EF2c499aD98a8ce58e58',
+            'decimals': 6,
+            'confirmations': 10,
+        },
+        'ARBITRUM': {
+            'rpc_url': os.environ.get("ARBITRUM_RPC_URL"),
+            'token': '0xFd086bC7CD5C481DCC9C85ebE478A1C0b69FCbb9',
+            'decimals': 6,
+            'confirmations': 10,
+        }
+    }
+    PAYMENT_POLL_INTERVAL = int(os.environ.get("PAYMENT_POLL_INTERVAL", 15))  # seconds
+    PAYMENT_BLOCK_RANGE = int(os.environ.get("PAYMENT_BLOCK_RANGE", 2000))  # blocks per eth_getLogs
+    PAYMENT_BATCH_SIZE = int(os.environ.get("PAYMENT_BATCH_SIZE", 10))  # eth_getLogs per JSON-RPC batch
+
+    # Deals still awaiting payment get one reminder in their group after
+    # PAYMENT_REMINDER_AFTER seconds (0 disables it) and expire after
+    # PAYMENT_TIMEOUT. Due deals are handled DUE_BATCH_SIZE at a time; the
+    # scheduler sleeps until the next due time, but at most DUE_MAX_SLEEP
+    # so deals created by other processes are not missed for long.
+    PAYMENT_TIMEOUT = int(os.environ.get("PAYMENT_TIMEOUT", 24 * 3600))  # seconds
+    PAYMENT_REMINDER_AFTER = int(os.environ.get("PAYMENT_REMINDER_AFTER", 3600))  # seconds
+    DUE_BATCH_SIZE = 200
+    DUE_MAX_SLEEP = 300  # seconds
+
+    # Completed and expired deals created more than ARCHIVE_AFTER_DAYS ago
+    # move to the archive tables every ARCHIVE_INTERVAL seconds (0 disables
+    # it), ARCHIVE_BATCH_SIZE deals per transaction. /status assumes the
+    # archive only holds deals older than ARCHIVE_AFTER_DAYS, so lowering it
+    # is safe but raising it can misorder old pages until they age past it.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 30))
+    ARCHIVE_INTERVAL = int(os.environ.get("ARCHIVE_INTERVAL", 3600))  # seconds
+    ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 1000))
+
     # Supported languages with flags
     SUPPORTED_LANGUAGES = {
         'en': 'English 🇬🇧',
@@ -65,6 +118,116 @@ class Config:
     }
 
 
+    # Database startup: connection attempts (exponential backoff starting at
+    # DB_CONNECT_RETRY_DELAY seconds) and whether to apply pending migrations
+    DB_CONNECT_RETRIES = int(os.environ.get("DB_CONNECT_RETRIES", 5))
+    DB_CONNECT_RETRY_DELAY = float(os.environ.get("DB_CONNECT_RETRY_DELAY", 1))
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "true").lower() == "true"
+
+    # Database access: size of the thread pool that runs queries off the
+    # event loop, and of the connection pool behind it
+    DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 10))
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 30))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+
+    # /status pagination: deals per page, how many rendered pages stay
+    # cached, and for how long. A deal change
+    # drops the pages at once only in the process that made it; with
+    # WORKERS > 1 other workers' pages can be up to the TTL out of date.
+    STATUS_PAGE_SIZE = 5
+    STATUS_CACHE_SIZE = 2048
+    STATUS_CACHE_TTL = int(os.environ.get("STATUS_CACHE_TTL", 30))  # seconds
+
+    # Sender identity cache (telegram_id -> user id, username, language)
+    IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", 10000))
+    IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 600))  # seconds
+    # Username and language changes of users already known are written in
+    # one batch every USER_WRITE_INTERVAL seconds (see user_writes.py)
+    USER_WRITE_INTERVAL = float(os.environ.get("USER_WRITE_INTERVAL", 5))  # seconds
+
+    # Reputation counters (user_stats): cached per user for /new and
+    # /profile, and rebuilt from the deal history every
+    # USER_STATS_REBUILD_INTERVAL seconds (0 disables it),
+    # USER_STATS_REBUILD_BATCH users per transaction
+    USER_STATS_CACHE_SIZE = int(os.environ.get("USER_STATS_CACHE_SIZE", 10000))
+    USER_STATS_CACHE_TTL = int(os.environ.get("USER_STATS_CACHE_TTL", 300))  # seconds
+    USER_STATS_REBUILD_INTERVAL = int(os.environ.get("USER_STATS_REBUILD_INTERVAL", 24 * 3600))  # seconds
+    USER_STATS_REBUILD_BATCH = 5000
+
+    # Update delivery: webhook mode when WEBHOOK_URL (the public URL Telegram
+    # posts to) is set, long polling otherwise. The webhook server listens on
+    # WEBHOOK_LISTEN:WEBHOOK_PORT at the path of WEBHOOK_URL.
+    WEBHOOK_URL = os.environ.get("WEBHOOK_URL") or None
+    WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")  # random per start if unset
+
+    # Key that signs inline button callback data; derived from the bot token
+    # if unset. Changing it invalidates every button already sent.
+    CALLBACK_SECRET = os.environ.get("CALLBACK_SECRET")
+
+    # Outbound message limits (Telegram: ~1/s per chat, 20/min per group, 30/s overall)
+    OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", 30))  # messages per second
+    OUTBOUND_CHAT_RATE = 1      # messages per second, private chats
+    OUTBOUND_GROUP_RATE = 20    # messages per minute, groups
+    OUTBOUND_WORKERS = 4
+
+    # Updates handled at once; updates for the same chat or deal still run in order
+    MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", 32))
+
+    # Multi-process mode (sharding.py): with WORKERS > 1 an ingress process
+    # receives updates and hands each chat's to one of WORKERS bot
+    # processes. DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_EXECUTOR_WORKERS and
+    # OUTBOUND_GLOBAL_RATE are then totals, split evenly between workers.
+    # Worker i serves /health on HEALTH_PORT + i and logs to bot.<i>.log.
+    WORKERS = int(os.environ.get("WORKERS", 1))
+
+    # Logging: root level plus per-logger overrides ("name=LEVEL,..."), a
+    # JSON-lines file rotated by size, or by time when LOG_ROTATE_WHEN is set
+    # (e.g. "midnight"), gzipped on rotation; INFO events tagged with a sample
+    # key are kept one in LOG_SAMPLE_EVERY
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.environ.get(
+        "LOG_LEVELS", "httpx=WARNING,httpcore=WARNING,telegram=INFO,apscheduler=WARNING"
+    )
+    LOG_FILE = os.environ.get("LOG_FILE", "bot.log")
+    LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN") or None
+    LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+    LOG_COMPRESS = os.environ.get("LOG_COMPRESS", "true").lower() == "true"
+    LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", 10))
+
+    # Health server (/health, /metrics). PORT is honoured for hosts that
+    # assign one. /health turns degraded when event-loop lag passes
+    # HEALTH_LAG_DEGRADED seconds or no update arrived for
+    # HEALTH_UPDATE_MAX_AGE seconds (0 disables), and unhealthy past
+    # HEALTH_LAG_UNHEALTHY or when the database check fails.
+    HEALTH_HOST = os.environ.get("HEALTH_HOST", "0.0.0.0")
+    HEALTH_PORT = int(os.environ.get("HEALTH_PORT") or os.environ.get("PORT") or 8282)
+    HEALTH_LAG_INTERVAL = 0.5  # seconds between loop lag samples
+    HEALTH_LAG_DEGRADED = float(os.environ.get("HEALTH_LAG_DEGRADED", 0.25))
+    HEALTH_LAG_UNHEALTHY = float(os.environ.get("HEALTH_LAG_UNHEALTHY", 5))
+    HEALTH_UPDATE_MAX_AGE = int(os.environ.get("HEALTH_UPDATE_MAX_AGE", 0))
+    HEALTH_DB_INTERVAL = int(os.environ.get("HEALTH_DB_INTERVAL", 15))  # seconds
+    HEALTH_DB_TIMEOUT = int(os.environ.get("HEALTH_DB_TIMEOUT", 5))  # seconds
+
+    # Data export (export.py). /export/<kind>.<format> on the health server
+    # is off unless EXPORT_TOKEN is set, and callers must send it as a
+    # Bearer token. Rows are fetched EXPORT_CHUNK_SIZE at a time.
+    EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+
+    # Update capture (capture.py), for replaying production traffic with
+    # benchmarks/replay.py. Off unless CAPTURE_FILE is set. The file rotates
+    # at CAPTURE_MAX_BYTES, keeping CAPTURE_BACKUP_COUNT gzipped backups.
+    # Ids, usernames and names are pseudonymized with CAPTURE_SALT unless
+    # CAPTURE_ANONYMIZE is false.
+    CAPTURE_FILE = os.environ.get("CAPTURE_FILE") or None
+    CAPTURE_MAX_BYTES = int(os.environ.get("CAPTURE_MAX_BYTES", 50 * 1024 * 1024))
+    CAPTURE_BACKUP_COUNT = int(os.environ.get("CAPTURE_BACKUP_COUNT", 10))
+    CAPTURE_ANONYMIZE = os.environ.get("CAPTURE_ANONYMIZE", "true").lower() == "true"
+    CAPTURE_SALT = os.environ.get("CAPTURE_SALT")
+
     # Flask settings
     FLASK_HOST = "0.0.0.0"
     FLASK_PORT = 8000
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Payment reminders and expiry for deals nobody pays.
+
+Every deal awaiting payment carries a due_at (indexed) and an expires_at.
+A single task sleeps until the earliest due_at, then takes the due deals
+in batches through the index: deals before their deadline get a reminder
+in their group and wait again until expires_at, the rest become 'expired'.
+Each batch is two bulk UPDATEs in one commit, and the next wake-up time
+is one MIN(due_at) lookup, so the cost follows the number of due deals,
+not the size of the table. All state is in the database: after a restart
+overdue deals are simply handled on the first pass.
+"""
+import asyncio
+from datetime import datetime
+
+import messages
+import outbound
+import repository
+from config import Config
+from logger import logger
+
+# Wait this long after a failed pass before trying again
+RETRY_DELAY = 60
+
+
+class DeadlineScheduler:
+    """Wakes at the nearest due time and handles the due deals"""
+
+    def __init__(self, batch_size, max_sleep):
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.next_due = None
+        self.reminded = 0
+        self.expired = 0
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name='deadlines')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule(self, due_at):
+        """Wake up earlier if a deal became due before the planned wake-up"""
+        if due_at is not None and self._wakeup is not None and (
+                self.next_due is None or due_at < self.next_due):
+            self.next_due = due_at
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_due()
+                self.next_due = await repository.next_due_at()
+                delay = self._delay(self.next_due)
+            except Exception as e:
+                logger.error(f"Error processing due deals: {str(e)}")
+                delay = RETRY_DELAY
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _delay(self, due_at):
+        if due_at is None:
+            return self.max_sleep
+        seconds = (due_at - datetime.utcnow()).total_seconds()
+        return min(max(seconds, 0.0), self.max_sleep)
+
+    async def run_due(self):
+        """Handle every deal due now, a batch per commit"""
+        while True:
+            reminded, expired, handled = await repository.process_due_deals(
+                datetime.utcnow(), self.batch_size
+            )
+            if reminded or expired:
+                logger.info("Sent %s payment reminders, expired %s deals", len(reminded), len(expired))
+                self.reminded += len(reminded)
+                self.expired += len(expired)
+                _announce(reminded, expired)
+            if handled < self.batch_size:
+                return
+
+
+def _announce(reminded, expired):
+    # Late import: handlers imports this module
+    from handlers import invalidate_status_pages
+
+    for tx in reminded:
+        if tx.chat_id:
+            hours = max(round((tx.expires_at - datetime.utcnow()).total_seconds() / 3600), 1)
+            text, parse_mode = messages.render(
+                tx.buyer.language, 'payment_reminder_group',
+                tx_id=tx.id, total=tx.amount + tx.fee_amount,
+                buyer=tx.buyer.username, hours=hours
+            )
+            outbound.send(tx.chat_id, text, coalesce=True, parse_mode=parse_mode)
+    for tx in expired:
+        invalidate_status_pages(tx.chat_id, tx.buyer.telegram_id, tx.seller.telegram_id)
+        if tx.chat_id:
+            text, parse_mode = messages.render(tx.buyer.language, 'deal_expired_group', tx_id=tx.id)
+            outbound.send(tx.chat_id, text, coalesce=True, parse_mode=parse_mode)
+
+
+scheduler = DeadlineScheduler(Config.DUE_BATCH_SIZE, Config.DUE_MAX_SLEEP)
@@ -0,0 +1,221 @@
+"""Streaming export of deals, disputes and users as CSV or JSON Lines.
+
+For ops and accounting, instead of ad-hoc SQL against production. Rows
+are read through a server-side cursor, EXPORT_CHUNK_SIZE at a time, and
+each chunk is encoded and handed on before the next is fetched, so memory
+stays flat however many rows match. Deals and disputes come from the live
+tables and from the archive, oldest ids first; archived_at is empty for
+live ones.
+
+Served on the health server as /export/<kind>.<format> when EXPORT_TOKEN
+is set, and from the command line:
+
+    python export.py transactions --from 2026-01-01 --to 2026-02-01 -o january.csv
+    python export.py disputes --format jsonl --status open
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import null, select
+from sqlalchemy.orm import aliased
+
+import metrics
+from app import app, configure_app, db
+from config import Config
+from logger import logger
+from models import (
+    ArchivedDispute, ArchivedEscrowTransaction, Dispute, EscrowTransaction, User
+)
+
+KINDS = ('transactions', 'disputes', 'users')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# Filters each kind accepts besides the created_at range
+FILTERS = {
+    'transactions': ('chain', 'status', 'chat'),
+    'disputes': ('chain', 'status', 'chat'),
+    'users': (),
+}
+
+rows_exported = metrics.registry.counter(
+    'export_rows_total', 'Rows written by data exports', labelnames=('kind',)
+)
+
+
+def parse_date(value):
+    """Parse an ISO date or datetime filter value"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"invalid date: {value}")
+
+
+def _created_between(stmt, column, date_from, date_to):
+    # From is inclusive, to exclusive, so consecutive ranges never overlap
+    if date_from is not None:
+        stmt = stmt.where(column >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(column < date_to)
+    return stmt
+
+
+def _deal_filters(stmt, deal, chain, chat):
+    if chain is not None:
+        stmt = stmt.where(deal.blockchain == chain)
+    if chat is not None:
+        stmt = stmt.where(deal.chat_id == chat)
+    return stmt
+
+
+def _transactions(date_from, date_to, chain=None, status=None, chat=None):
+    statements = []
+    for deal in (ArchivedEscrowTransaction, EscrowTransaction):
+        buyer, seller = aliased(User), aliased(User)
+        archived_at = deal.archived_at if deal is ArchivedEscrowTransaction else null()
+        stmt = (
+            select(
+                deal.id, deal.status, deal.amount, deal.fee_amount, deal.fee_paid, deal.blockchain,
+                deal.chat_id, deal.buyer_id, buyer.username.label('buyer_username'), deal.seller_id,
+                seller.username.label('seller_username'), deal.buyer_wallet, deal.seller_wallet,
+                deal.description, deal.created_at, deal.payment_confirmed_at,
+                deal.account_provided_at, deal.account_verified_at, deal.completed_at,
+                archived_at.label('archived_at')
+            )
+            .join(buyer, buyer.id == deal.buyer_id)
+            .join(seller, seller.id == deal.seller_id)
+            .order_by(deal.id)
+        )
+        stmt = _created_between(stmt, deal.created_at, date_from, date_to)
+        stmt = _deal_filters(stmt, deal, chain, chat)
+        if status is not None:
+            stmt = stmt.where(deal.status == status)
+        statements.append(stmt)
+    return statements
+
+
+def _disputes(date_from, date_to, chain=None, status=None, chat=None):
+    statements = []
+    for dispute, deal in ((ArchivedDispute, ArchivedEscrowTransaction), (Dispute, EscrowTransaction)):
+        archived_at = deal.archived_at if deal is ArchivedEscrowTransaction else null()
+        stmt = (
+            select(
+                dispute.id, dispute.transaction_id, deal.blockchain, deal.chat_id,
+                dispute.created_by_id, dispute.status, dispute.reason, dispute.created_at,
+                dispute.resolved_at, dispute.resolution_notes, archived_at.label('archived_at')
+            )
+            .join(deal, deal.id == dispute.transaction_id)
+            .order_by(dispute.id)
+        )
+        stmt = _created_between(stmt, dispute.created_at, date_from, date_to)
+        stmt = _deal_filters(stmt, deal, chain, chat)
+        if status is not None:
+            stmt = stmt.where(dispute.status == status)
+        statements.append(stmt)
+    return statements
+
+
+def _users(date_from, date_to):
+    stmt = select(User.id, User.telegram_id, User.username, User.language, User.created_at).order_by(User.id)
+    return [_created_between(stmt, User.created_at, date_from, date_to)]
+
+
+BUILDERS = {'transactions': _transactions, 'disputes': _disputes, 'users': _users}
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _encode(fmt, columns, rows):
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        csv.writer(buffer).writerows([_value(v) for v in row] for row in rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False))
+            buffer.write('\n')
+    return buffer.getvalue().encode('utf-8')
+
+
+def _chunks(kind, fmt, statements):
+    columns = list(statements[0].selected_columns.keys())
+    if fmt == 'csv':
+        yield _encode(fmt, columns, [columns])
+
+    started = time.monotonic()
+    total = 0
+    configure_app()
+    with app.app_context(), db.engine.connect() as connection:
+        # Server-side cursor where the driver has one; SQLite steps its
+        # cursor lazily anyway
+        connection = connection.execution_options(stream_results=True, yield_per=Config.EXPORT_CHUNK_SIZE)
+        for stmt in statements:
+            for rows in connection.execute(stmt).partitions():
+                total += len(rows)
+                rows_exported.labels(kind).inc(len(rows))
+                yield _encode(fmt, columns, rows)
+    logger.info("Exported %s %s as %s in %.1fs", total, kind, fmt, time.monotonic() - started)
+
+
+def stream(kind, fmt, date_from=None, date_to=None, **filters):
+    """Return an iterator of encoded chunks of the export
+
+    Bad arguments raise ValueError here, before anything is read.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown export: {kind}")
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"unknown format: {fmt}")
+    filters = {name: value for name, value in filters.items() if value is not None}
+    unsupported = sorted(set(filters) - set(FILTERS[kind]))
+    if unsupported:
+        raise ValueError(f"{kind} cannot be filtered by {', '.join(unsupported)}")
+    statements = BUILDERS[kind](date_from, date_to, **filters)
+    return _chunks(kind, fmt, statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export deals, disputes or users as CSV or JSON Lines')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+    parser.add_argument('--from', dest='date_from', type=parse_date, help='created at or after (ISO date)')
+    parser.add_argument('--to', dest='date_to', type=parse_date, help='created before (ISO date)')
+    parser.add_argument('--chain', help='deal blockchain, e.g. BEP20')
+    parser.add_argument('--status', help='deal or dispute status')
+    parser.add_argument('--chat', help='group chat id the deal was made in')
+    parser.add_argument('-o', '--output', help='file to write (default stdout)')
+    args = parser.parse_args()
+
+    try:
+        chunks = stream(
+            args.kind, args.format, args.date_from, args.date_to,
+            chain=args.chain, status=args.status, chat=args.chat
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+
+if __name__ == '__main__':
+    main()
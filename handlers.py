@@ -1,475 +1,581 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from logger import logger
-from app import db, app
-from models import User, EscrowTransaction
 from config import Config
+from cache import LRUCache
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
+import itertools
+import callback_data
+import capture
+import deadlines
+import messages
+import outbound
+import repository
+
+
+def _reply(update, text, **kwargs):
+    """Queue a reply to the update's message on the outbound scheduler"""
+    message = update.effective_message
+    if message.chat.type != 'private':
+        kwargs.setdefault('reply_to_message_id', message.message_id)
+        kwargs.setdefault('allow_sending_without_reply', True)
+    outbound.send(message.chat_id, text, **kwargs)
+
+
+def _reply_message(update, lang, key, reply_markup=None, **values):
+    """Reply with a catalog message rendered in lang"""
+    text, parse_mode = messages.render(lang, key, **values)
+    _reply(update, text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def _language(user):
+    """The user's stored language, normally straight from the identity cache"""
+    identity = await repository.get_user_identity(user.id, user.username)
+    return messages.language(identity.language)
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /start command"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
         user = update.effective_user
         chat_type = update.effective_chat.type
 
-        with app.app_context():
-            # For group chats, show simplified message
-            if chat_type in ['group', 'supergroup']:
-                welcome_message = (
-                    "👋 *Hi! I'm your AI Escrow Assistant!*\n\n"
-                    "I'm here to help make deals safe and easy. Here's what I can do:\n\n"
-                    "🤝 `/new` - Start a new deal\n"
-                    "🔍 `/status` - Check your deals\n"
-                    "✅ `/ok` - Confirm everything's good\n"
-                    "❓ `/help` - Get my help\n\n"
-                    "💡 *Example:* Type `/new @seller 100 Product`\n"
-                    "I'll guide you through the whole process!\n\n"
-                    "🔒 *Fixed Fee:* $0.50 per transaction for secure escrow service"
-                )
-                await update.message.reply_text(welcome_message, parse_mode='Markdown')
-                return
+        # Creates the user on first contact
+        lang = await _language(user)
 
-            # For private chats, create or get user
-            db_user = User.query.filter_by(telegram_id=str(user.id)).first()
-            if not db_user:
-                db_user = User(telegram_id=str(user.id), username=user.username)
-                db.session.add(db_user)
-                db.session.commit()
-                logger.info(f"Created new user record for {user.id}")
-
-            # Create language selection keyboard
-            keyboard = []
-            for code, name in Config.SUPPORTED_LANGUAGES.items():
-                keyboard.append([InlineKeyboardButton(f"🌐 {name}", callback_data=f"lang_{code}")])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            welcome_message = (
-                f"👋 *Hello {user.first_name}!*\n\n"
-                "I'm your AI Escrow Assistant, and I'm here to help make your deals safe and easy!\n\n"
-                "🛡️ *How I Help You:*\n"
-                "1️⃣ Create secure deals\n"
-                "2️⃣ Handle payments safely\n"
-                "3️⃣ Guide both parties\n"
-                "4️⃣ Verify transactions\n\n"
-                "💰 *Service Fee:*\n"
-                "• Fixed $0.50 per transaction\n"
-                "• Automatically deducted\n"
-                "• Ensures secure escrow service\n\n"
-                "🌍 *First, let's set your preferred language:*"
-            )
+        # For group chats, show simplified message
+        if chat_type in ['group', 'supergroup']:
+            _reply_message(update, lang, 'start_group')
+            return
 
-            await update.message.reply_text(welcome_message, reply_markup=reply_markup, parse_mode='Markdown')
+        _reply_message(
+            update, lang, 'start_private',
+            reply_markup=messages.LANGUAGE_KEYBOARD,
+            first_name=user.first_name
+        )
 
     except Exception as e:
         logger.error(f"Error in start command: {str(e)}")
-        await update.message.reply_text("Oops! Something went wrong. Let's try again with /start")
+        _reply_message(update, lang, 'start_error')
 
 async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle language selection callback"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
         query = update.callback_query
         lang_code = query.data.replace("lang_", "")
         user = update.effective_user
 
-        with app.app_context():
-            # Update user language preference
-            db_user = User.query.filter_by(telegram_id=str(user.id)).first()
-            if not db_user:
-                db_user = User(telegram_id=str(user.id), username=user.username)
-                db.session.add(db_user)
-
-            db_user.language = lang_code
-            db.session.commit()
-
-            welcome_message = (
-                f"🎉 *Perfect! I'll speak {Config.SUPPORTED_LANGUAGES[lang_code]} with you!*\n\n"
-                f"Hey {user.first_name}, I'm ready to help you make safe deals!\n\n"
-                "💫 *Quick Start:*\n"
-                "1. Add me to your group chat\n"
-                "2. Start a deal with `/new`\n"
-                "3. I'll guide you step by step!\n\n"
-                "Need help? Just type /help anytime! 😊"
-            )
+        if lang_code not in Config.SUPPORTED_LANGUAGES:
+            await query.answer(messages.text(lang, 'error_answer'))
+            return
 
-            await query.message.edit_text(
-                welcome_message,
-                parse_mode='Markdown'
-            )
-            await query.answer(f"Language set to {Config.SUPPORTED_LANGUAGES[lang_code]}! 🌟")
+        # Update user language preference
+        await repository.set_user_language(user.id, user.username, lang_code)
+        lang = lang_code
+
+        text, parse_mode = messages.render(
+            lang, 'language_set',
+            language=Config.SUPPORTED_LANGUAGES[lang_code],
+            first_name=user.first_name
+        )
+        await query.message.edit_text(text, parse_mode=parse_mode)
+        await query.answer(messages.text(
+            lang, 'language_set_answer', language=Config.SUPPORTED_LANGUAGES[lang_code]
+        ))
 
     except Exception as e:
         logger.error(f"Error in language selection: {str(e)}")
         if 'query' in locals():
-            await query.answer("Oops! Something went wrong. Let's try again! 😅")
+            await query.answer(messages.text(lang, 'error_answer'))
 
 async def create_escrow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /new command for creating escrow"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
-        logger.info("Received /new command for creating escrow.")
-        
-        with app.app_context():
-            user = update.effective_user
-            chat = update.effective_chat
-            
-            logger.info(f"User: {user.username}, Chat Type: {chat.type}")
-
-            # Only allow in groups
-            if chat.type not in ['group', 'supergroup']:
-                await update.message.reply_text(
-                    "🤔 Let's do this in a group chat where both buyer and seller are present!\n"
-                    "Add me to your group and try again. 👥"
-                )
-                return
-
-            # Check command format
-            args = context.args
-            logger.info(f"Command arguments: {args}")
-
-            # Ensure that there are at least 3 arguments: seller, amount, and description
-            if len(args) < 3:
-                await update.message.reply_text(
-                    "👋 *Let me help you create a deal!*\n\n"
-                    "Here's how to do it:\n"
-                    "Type `/new @seller amount description`\n\n"
-                    "*For example:*\n"
-                    "`/new @john 100 Product`\n\n"
-                    "💰 *Note:* A fixed fee of $0.50 will be added to the transaction amount.\n"
-                    "I'll help guide you through the rest! 🤝",
-                    parse_mode='Markdown'
-                )
-                return
-
-            # Parse command
-            seller_username = args[0].replace('@', '')
-            try:
-                amount = Decimal(args[1])
-                if amount <= 0:
-                    raise ValueError
-                total_amount = amount + Decimal('0.50')
-            except ValueError:
-                await update.message.reply_text(
-                    "🤔 The amount doesn't look right.\n"
-                    "Please use a positive number, like:\n"
-                    "`/new @seller 100 Product`",
-                    parse_mode='Markdown'
-                )
-                return
+        user = update.effective_user
+        chat = update.effective_chat
 
-            description = ' '.join(args[2:])
-            description = description.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-
-
-            # Get or create users
-            buyer = User.query.filter_by(telegram_id=str(user.id)).first()
-            if not buyer:
-                buyer = User(telegram_id=str(user.id), username=user.username)
-                db.session.add(buyer)
-                try:
-                    db.session.commit()
-                    logger.info("New buyer created and committed to the database.")
-                except Exception as e:
-                    logger.error(f"Error committing buyer to the database: {str(e)}")
-                    await update.message.reply_text(
-                        "Sorry, there was an issue saving your data. Please try again."
-                    )
-                    return
-
-            seller = User.query.filter_by(username=seller_username).first()
-            if not seller:
-                await update.message.reply_text(
-                    f"👋 I see that @{seller_username} hasn't met me yet!\n\n"
-                    "🤝 Ask them to:\n"
-                    "1. Start a chat with me (@Legit_escrow_bot)\n"
-                    "2. Send me a /start message\n"
-                    "3. Then we can create the deal!"
-                )
-                return
+        logger.info(
+            "Received /new from %s in %s chat", user.id, chat.type,
+            extra={'sample': 'new_command'}
+        )
 
-            # Create transaction
-            transaction = EscrowTransaction(
+        # Get or create the buyer; this also gives us their language
+        try:
+            buyer = await repository.get_user_identity(user.id, user.username)
+            lang = messages.language(buyer.language)
+        except Exception as e:
+            logger.error(f"Error committing buyer to the database: {str(e)}")
+            _reply_message(update, lang, 'new_user_error')
+            return
+
+        # Only allow in groups
+        if chat.type not in ['group', 'supergroup']:
+            _reply_message(update, lang, 'new_group_only')
+            return
+
+        # Check command format
+        args = context.args
+        logger.debug("/new arguments: %s", args)
+
+        # Ensure that there are at least 3 arguments: seller, amount, and description
+        if len(args) < 3:
+            _reply_message(update, lang, 'new_usage')
+            return
+
+        # Parse command
+        seller_username = args[0].replace('@', '')
+        try:
+            amount = Decimal(args[1])
+            if amount <= 0:
+                raise ValueError
+            total_amount = amount + Decimal('0.50')
+        except (ValueError, ArithmeticError):
+            _reply_message(update, lang, 'new_bad_amount')
+            return
+
+        # Stored as typed; the catalog escapes it when rendering
+        description = ' '.join(args[2:])
+
+        seller = await repository.get_user_by_username(seller_username)
+        if not seller:
+            _reply_message(update, lang, 'new_seller_unknown', seller=seller_username)
+            return
+        reputation = _seller_reputation(lang, await repository.get_user_stats(seller.id))
+
+        # Create transaction
+        try:
+            transaction = await repository.create_transaction(
                 buyer_id=buyer.id,
                 seller_id=seller.id,
                 amount=amount,
                 description=description,
                 chat_id=str(chat.id),
-                fee_amount=Decimal('0.50'),
-                fee_paid=False
-            )
-
-            db.session.add(transaction)
-            try:
-                db.session.commit()
-                logger.info("Transaction created and committed to the database.")
-            except Exception as e:
-                logger.error(f"Error committing transaction to the database: {str(e)}")
-                await update.message.reply_text(
-                    "Sorry, there was an issue processing your transaction. Please try again."
-                )
-                return
-
-            # Create blockchain selection keyboard
-            keyboard = []
-            for chain, info in Config.BLOCKCHAIN_INFO.items():
-                speed_emoji = "⚡️" if "1s" in info['speed'] else "🚀"
-                button = [InlineKeyboardButton(
-                    f"{info['icon']} {chain} • {speed_emoji} {info['speed']} • 💰 {info['gas_fee']}",
-                    callback_data=f"chain_{chain}_{transaction.id}"
-                )]
-                keyboard.append(button)
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await update.message.reply_text(
-                f"🎉 *Great! Let's set up your deal #{transaction.id}*\n\n"
-                f"💫 *Deal Summary:*\n"
-                f"💰 Base Amount: ${amount}\n"
-                f"🔒 Service Fee: $0.50\n"
-                f"💎 Total Amount: ${total_amount}\n"
-                f"📝 For: {description}\n"
-                f"🤝 Between: @{buyer.username} and @{seller_username}\n\n"
-                "🌟 *Next Step:*\n"
-                "Choose a payment network below. I'll help you pick:\n\n"
-                "💡 *Quick Guide:*\n"
-                "• BEP20: Lowest fees\n"
-                "• ERC20: Most secure\n"
-                "• Optimism: Fast & cheap\n"
-                "• Arbitrum: Ultra fast",
-                reply_markup=reply_markup,
-                parse_mode='HTML'
+                fee_amount=Decimal('0.50')
             )
+            logger.info("Created deal %s in chat %s", transaction.id, chat.id)
+            capture.recorder.note(update, deal=transaction.id)
+            deadlines.scheduler.schedule(transaction.due_at)
+            invalidate_status_pages(transaction.chat_id, buyer.telegram_id, seller.telegram_id)
+        except Exception as e:
+            logger.error(f"Error committing transaction to the database: {str(e)}")
+            _reply_message(update, lang, 'new_create_error')
+            return
+
+        _reply_message(
+            update, lang, 'new_deal',
+            reply_markup=messages.chain_keyboard(transaction.id, buyer.telegram_id),
+            tx_id=transaction.id,
+            amount=amount,
+            total=total_amount,
+            description=description,
+            buyer=buyer.username,
+            seller=seller_username,
+            reputation=reputation
+        )
 
     except Exception as e:
         logger.error(f"Error creating escrow: {str(e)}")
-        await update.message.reply_text(
-            "Oops! Something didn't work right. 😅\n"
-            "Let's try that again! Need help? Type /help"
-        )
+        _reply_message(update, lang, 'new_error')
+
+
+def _seller_reputation(lang, stats):
+    """One line on the seller's track record for the deal summary"""
+    if not stats.seller_deals and not stats.disputes_lost:
+        return messages.text(lang, 'seller_reputation_new')
+    return messages.text(
+        lang, 'seller_reputation',
+        deals=stats.seller_deals,
+        volume=f"{stats.seller_volume:.2f}",
+        disputes_lost=stats.disputes_lost
+    )
 
 
 async def blockchain_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle blockchain selection"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
-        with app.app_context():
-            query = update.callback_query
-            user = update.effective_user
-
-            # Get transaction info
-            chain = query.data.split('_')[1]
-            tx_id = int(query.data.split('_')[2])
-
-            transaction = EscrowTransaction.query.get(tx_id)
-            if not transaction:
-                await query.answer("I couldn't find that deal! Let's start a new one.")
+        query = update.callback_query
+        user = update.effective_user
+        # Telegram's language for the rejections, which must not query
+        lang = messages.language((user.language_code or '')[:2])
+
+        button = callback_data.decode(query.data)
+        if button is not None and button.action == callback_data.ACTION_CHAIN:
+            # Signed for the buyer when the deal was created, so no lookup
+            chain, tx_id, buyer_telegram_id = button.chain, button.tx_id, str(button.telegram_id)
+        elif query.data.startswith('chain_'):
+            # Unsigned chain_{CHAIN}_{deal id} buttons sent before signing
+            _, chain, tx_id = query.data.split('_')
+            tx_id = int(tx_id)
+            if chain not in Config.BLOCKCHAIN_INFO:
+                await query.answer(messages.text(lang, 'button_invalid_answer'))
                 return
-
-            if str(user.id) != transaction.buyer.telegram_id:
-                await query.answer("Only the buyer can select the payment network! 👀")
+            transaction = await repository.get_transaction(tx_id)
+            if not transaction:
+                await query.answer(messages.text(lang, 'deal_not_found_answer'))
                 return
+            buyer_telegram_id = transaction.buyer.telegram_id
+        else:
+            await query.answer(messages.text(lang, 'button_invalid_answer'))
+            return
+
+        if str(user.id) != buyer_telegram_id:
+            await query.answer(messages.text(lang, 'buyer_only_network_answer'))
+            return
+        lang = await _language(user)
+
+        # Update transaction
+        transaction, updated = await repository.set_transaction_blockchain(tx_id, chain)
+        if not transaction:
+            await query.answer(messages.text(lang, 'deal_not_found_answer'))
+            return
+        if not updated:
+            await query.answer(messages.text(lang, 'network_closed_answer'))
+            return
+        invalidate_status_pages(
+            transaction.chat_id, transaction.buyer.telegram_id, transaction.seller.telegram_id
+        )
 
-            # Update transaction
-            transaction.blockchain = chain
-            db.session.commit()
-
-            # Get wallet address
-            wallet = Config.NETWORK_WALLETS[chain]
-            network = Config.BLOCKCHAIN_INFO[chain]
-
-            payment_message = (
-                f"🎉 *Perfect! Deal #{tx_id} is ready!*\n\n"
-                f"💰 *Amount to Send:* ${transaction.amount + transaction.fee_amount}\n"
-                f"🔗 *Network:* {chain}\n"
-                f"⚡️ *Speed:* {network['speed']}\n"
-                f"💸 *Network Fee:* {network['gas_fee']}\n\n"
-                "📤 *Send payment to:*\n"
-                f"`{wallet}`\n\n"
-                "🎯 *What's Next:*\n"
-                f"1. Send ${transaction.amount + transaction.fee_amount} to the address above\n"
-                f"2. Once sent, type: `/ok {tx_id}`\n"
-                "3. I'll verify everything and help complete the deal!\n\n"
-                "💡 Need help? Just type /help"
-            )
-
-            await query.message.edit_text(payment_message, parse_mode='Markdown')
-            await query.answer("Great choice! Let's proceed with payment! 🚀")
-
-            # Notify group
-            group_message = (
-                "🎉 *New Deal Started!*\n\n"
-                f"💰 Amount: ${transaction.amount + transaction.fee_amount}\n"
-                f"🤝 Buyer: @{transaction.buyer.username}\n"
-                f"🤝 Seller: @{transaction.seller.username}\n"
-                f"🔗 Network: {chain}\n\n"
-                "⏳ Waiting for payment...\n"
-                "I'll keep everyone updated on the progress! 👀"
+        # Get wallet address
+        wallet = Config.NETWORK_WALLETS[chain]
+        network = Config.BLOCKCHAIN_INFO[chain]
+        total = transaction.amount + transaction.fee_amount
+
+        text, parse_mode = messages.render(
+            lang, 'payment_instructions',
+            tx_id=tx_id,
+            total=total,
+            chain=chain,
+            speed=network['speed'],
+            gas_fee=network['gas_fee'],
+            wallet=wallet
+        )
+        await query.message.edit_text(text, parse_mode=parse_mode)
+        await query.answer(messages.text(lang, 'network_chosen_answer'))
+
+        # Notify group
+        if transaction.chat_id:
+            text, parse_mode = messages.render(
+                lang, 'deal_started_group',
+                total=total,
+                buyer=transaction.buyer.username,
+                seller=transaction.seller.username,
+                chain=chain
             )
-
-            if transaction.chat_id:
-                await context.bot.send_message(
-                    chat_id=transaction.chat_id,
-                    text=group_message,
-                    parse_mode='Markdown'
-                )
+            outbound.send(transaction.chat_id, text, coalesce=True, parse_mode=parse_mode)
 
     except Exception as e:
         logger.error(f"Error in blockchain selection: {str(e)}")
         if 'query' in locals():
-            await query.answer("Oops! Something went wrong. Let's try again! 😅")
+            await query.answer(messages.text(lang, 'error_answer'))
 
 async def release_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /ok command"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
-        with app.app_context():
-            user = update.effective_user
-            args = context.args
-
-            if not args:
-                await update.message.reply_text(
-                    "❌ *Wrong Format*\n\n"
-                    "Type like this:\n"
-                    "`/ok 123`",
-                    parse_mode='Markdown'
-                )
-                return
-
-            tx_id = int(args[0])
-            transaction = EscrowTransaction.query.get(tx_id)
-
-            if not transaction:
-                await update.message.reply_text("❌ Deal not found")
-                return
+        user = update.effective_user
+        args = context.args
+        lang = await _language(user)
+
+        if not args:
+            _reply_message(update, lang, 'ok_usage')
+            return
+
+        tx_id = int(args[0])
+        transaction = await repository.get_transaction(tx_id)
+
+        if not transaction:
+            _reply_message(update, lang, 'ok_not_found')
+            return
+
+        if str(user.id) != transaction.buyer.telegram_id:
+            _reply_message(update, lang, 'ok_buyer_only')
+            return
+
+        # Complete the deal
+        transaction, updated = await repository.complete_transaction(tx_id)
+        if transaction is None:
+            # Archived or removed since it was read above
+            _reply_message(update, lang, 'ok_not_found')
+            return
+        if not updated:
+            _reply_message(
+                update, lang, 'ok_expired' if transaction.status == 'expired' else 'ok_already_complete'
+            )
+            return
+        invalidate_status_pages(
+            transaction.chat_id, transaction.buyer.telegram_id, transaction.seller.telegram_id
+        )
 
-            if str(user.id) != transaction.buyer.telegram_id:
-                await update.message.reply_text("❌ Only the buyer can confirm")
-                return
+        # Notify group
+        if transaction.chat_id:
+            text, parse_mode = messages.render(
+                lang, 'deal_complete_group',
+                tx_id=tx_id,
+                total=transaction.amount + transaction.fee_amount,
+                buyer=transaction.buyer.username,
+                seller=transaction.seller.username
+            )
+            outbound.send(transaction.chat_id, text, coalesce=True, parse_mode=parse_mode)
 
-            # Complete the deal
-            transaction.status = 'completed'
-            transaction.completed_at = datetime.utcnow()
-            transaction.fee_paid = True
-            db.session.commit()
-
-            # Notify group
-            if transaction.chat_id:
-                await context.bot.send_message(
-                    chat_id=transaction.chat_id,
-                    text=(
-                        f"✅ *Deal #{tx_id} Complete!*\n\n"
-                        f"💰 Amount: ${transaction.amount + transaction.fee_amount}\n"
-                        f"👤 Buyer: @{transaction.buyer.username}\n"
-                        f"👤 Seller: @{transaction.seller.username}\n\n"
-                        "🎉 Everyone happy!"
-                    ),
-                    parse_mode='Markdown'
-                )
-
-            await update.message.reply_text("✅ Deal completed!")
+        _reply_message(update, lang, 'ok_done')
 
     except Exception as e:
         logger.error(f"Error releasing payment: {str(e)}")
-        await update.message.reply_text("❌ Something went wrong")
+        _reply_message(update, lang, 'error')
+
+# Rendered /status pages: (scope, generation, lang, direction, cursor) ->
+# (text, markup). A scope is ('chat', chat_id) for groups or ('user',
+# telegram_id) for private chats. Changing one of its deals here gives the
+# scope a new generation, which strands its old pages until the LRU drops
+# them; changes made by another worker show after STATUS_CACHE_TTL.
+_status_pages = LRUCache(Config.STATUS_CACHE_SIZE, ttl=Config.STATUS_CACHE_TTL, name='status_pages')
+# scope -> generation. Every generation is new, so a scope evicted from
+# here can never match its stranded pages again
+_status_generations = LRUCache(Config.STATUS_CACHE_SIZE)
+_next_generation = itertools.count()
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _encode_cursor(tx):
+    micros = (tx.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{tx.id}"
+
+
+def _decode_cursor(micros, tx_id):
+    return _EPOCH + timedelta(microseconds=int(micros)), int(tx_id)
+
+
+def invalidate_status_pages(chat_id, *telegram_ids):
+    """Forget cached /status pages of a group and of the deal's parties"""
+    if chat_id:
+        _status_generations.pop(('chat', chat_id))
+    for telegram_id in telegram_ids:
+        _status_generations.pop(('user', telegram_id))
+
+
+def _status_generation(scope):
+    generation = _status_generations.get(scope)
+    if generation is None:
+        generation = next(_next_generation)
+        _status_generations.set(scope, generation)
+    return generation
+
+
+def _render_status_page(scope, lang, deals, has_older, has_newer):
+    """Build the Markdown text and navigation keyboard for one page"""
+    kind, owner = scope
+    render = messages.text
+    parts = []
+
+    if kind == 'chat':
+        parts.append(render(lang, 'status_group_header'))
+        for tx in deals:
+            parts.append(render(
+                lang, 'status_group_deal',
+                tx_id=tx.id,
+                total=tx.amount + tx.fee_amount,
+                buyer=tx.buyer.username,
+                seller=tx.seller.username,
+                status=messages.deal_status(lang, tx.status)
+            ))
+    else:
+        buyer_deals = [tx for tx in deals if tx.buyer.telegram_id == owner]
+        seller_deals = [tx for tx in deals if tx.seller.telegram_id == owner]
+        parts.append(render(lang, 'status_user_header'))
+
+        if buyer_deals:
+            parts.append(render(lang, 'status_as_buyer'))
+            for tx in buyer_deals:
+                parts.append(render(
+                    lang, 'status_buyer_deal',
+                    tx_id=tx.id,
+                    total=tx.amount + tx.fee_amount,
+                    seller=tx.seller.username,
+                    status=messages.deal_status(lang, tx.status)
+                ))
+
+        if seller_deals:
+            parts.append(render(lang, 'status_as_seller'))
+            for tx in seller_deals:
+                parts.append(render(
+                    lang, 'status_seller_deal',
+                    tx_id=tx.id,
+                    total=tx.amount + tx.fee_amount,
+                    buyer=tx.buyer.username,
+                    status=messages.deal_status(lang, tx.status)
+                ))
+
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton(
+            render(lang, 'status_newer'), callback_data=f"status_n_{_encode_cursor(deals[0])}"
+        ))
+    if has_older:
+        buttons.append(InlineKeyboardButton(
+            render(lang, 'status_older'), callback_data=f"status_o_{_encode_cursor(deals[-1])}"
+        ))
+
+    reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+    return ''.join(parts), reply_markup
+
+
+async def _get_status_page(scope, lang, direction=None, cursor=None):
+    """Return a cached (text, markup) page, querying and rendering on a miss"""
+    key = (scope, _status_generation(scope), lang, direction, cursor)
+    page = _status_pages.get(key)
+    if page is not None:
+        return page
+
+    kind, owner = scope
+    deals, has_more = await repository.status_page(
+        chat_id=owner if kind == 'chat' else None,
+        telegram_id=owner if kind == 'user' else None,
+        cursor=cursor,
+        direction='newer' if direction == 'n' else 'older',
+        limit=Config.STATUS_PAGE_SIZE
+    )
+    if not deals:
+        return None
+
+    if direction == 'n':
+        # Paging back towards the newest deals
+        page = _render_status_page(scope, lang, deals, has_older=True, has_newer=has_more)
+    else:
+        page = _render_status_page(
+            scope, lang, deals, has_older=has_more, has_newer=cursor is not None
+        )
+
+    _status_pages.set(key, page)
+    return page
+
+
+def _status_scope(chat, user):
+    if chat.type in ['group', 'supergroup']:
+        return ('chat', str(chat.id))
+    return ('user', str(user.id))
+
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /status command"""
+    lang = messages.DEFAULT_LANGUAGE
     try:
-        with app.app_context():
-            user = update.effective_user
-            chat = update.effective_chat
+        user = update.effective_user
+        chat = update.effective_chat
+        lang = await _language(user)
+
+        page = await _get_status_page(_status_scope(chat, user), lang)
 
-            # For group chat
+        if not page:
             if chat.type in ['group', 'supergroup']:
-                transactions = EscrowTransaction.query.filter_by(
-                    chat_id=str(chat.id)
-                ).order_by(EscrowTransaction.created_at.desc()).limit(5).all()
-
-                if not transactions:
-                    await update.message.reply_text("No active deals in this group")
-                    return
-
-                status = "🔍 *Recent Deals*\n\n"
-                for tx in transactions:
-                    status += (
-                        f"💫 *Deal #{tx.id}*\n"
-                        f"💰 Amount: ${tx.amount + tx.fee_amount}\n"
-                        f"👤 Buyer: @{tx.buyer.username}\n"
-                        f"👤 Seller: @{tx.seller.username}\n"
-                        f"📊 Status: {tx.status}\n"
-                        "➖➖➖➖➖➖➖➖\n"
-                    )
-
-                await update.message.reply_text(status, parse_mode='Markdown')
-                return
+                _reply_message(update, lang, 'status_empty_group')
+            else:
+                _reply_message(update, lang, 'status_empty_private')
+            return
+
+        text, reply_markup = page
+        _reply(update, text, reply_markup=reply_markup, parse_mode='Markdown')
 
-            # For private chat
-            buyer_deals = EscrowTransaction.query.join(
-                User, EscrowTransaction.buyer_id == User.id
-            ).filter(User.telegram_id == str(user.id)).all()
+    except Exception as e:
+        logger.error(f"Error getting status: {str(e)}")
+        _reply_message(update, lang, 'error')
+
+async def status_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /status "Newer"/"Older" buttons"""
+    lang = messages.DEFAULT_LANGUAGE
+    try:
+        query = update.callback_query
+        _, direction, micros, tx_id = query.data.split('_')
+        lang = await _language(update.effective_user)
+
+        page = await _get_status_page(
+            _status_scope(update.effective_chat, update.effective_user),
+            lang,
+            direction,
+            _decode_cursor(micros, tx_id)
+        )
+
+        if not page:
+            await query.answer(messages.text(lang, 'status_no_more_answer'))
+            return
+
+        text, reply_markup = page
+        await query.message.edit_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.answer()
 
-            seller_deals = EscrowTransaction.query.join(
-                User, EscrowTransaction.seller_id == User.id
-            ).filter(User.telegram_id == str(user.id)).all()
+    except Exception as e:
+        logger.error(f"Error paging status: {str(e)}")
+        if 'query' in locals():
+            await query.answer(messages.text(lang, 'error_answer'))
 
-            if not (buyer_deals or seller_deals):
-                await update.message.reply_text(
-                    "No deals found.\n"
-                    "Create new deal with /new in group chat"
-                )
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /profile command: your own record, or /profile @user"""
+    lang = messages.DEFAULT_LANGUAGE
+    try:
+        user = update.effective_user
+        identity = await repository.get_user_identity(user.id, user.username)
+        lang = messages.language(identity.language)
+
+        if context.args:
+            username = context.args[0].replace('@', '')
+            identity = await repository.get_user_by_username(username)
+            if not identity:
+                _reply_message(update, lang, 'profile_unknown', username=username)
                 return
 
-            status = "🔍 *Your Deals*\n\n"
-
-            if buyer_deals:
-                status += "💳 *As Buyer:*\n"
-                for tx in buyer_deals:
-                    status += (
-                        f"📝 *#{tx.id}*\n"
-                        f"💰 Amount: ${tx.amount + tx.fee_amount}\n"
-                        f"👤 Seller: @{tx.seller.username}\n"
-                        f"📊 Status: {tx.status}\n"
-                        "➖➖➖➖➖➖➖➖\n"
-                    )
-
-            if seller_deals:
-                status += "\n🏦 *As Seller:*\n"
-                for tx in seller_deals:
-                    status += (
-                        f"📝 *#{tx.id}*\n"
-                        f"💰 Amount: ${tx.amount + tx.fee_amount}\n"
-                        f"👤 Buyer: @{tx.buyer.username}\n"
-                        f"📊 Status: {tx.status}\n"
-                        "➖➖➖➖➖➖➖➖\n"
-                    )
-
-            await update.message.reply_text(status, parse_mode='Markdown')
+        stats = await repository.get_user_stats(identity.id)
+        last_active = (
+            stats.last_active_at.strftime('%Y-%m-%d') if stats.last_active_at
+            else messages.text(lang, 'profile_never')
+        )
+        _reply_message(
+            update, lang, 'profile',
+            username=identity.username or identity.telegram_id,
+            seller_deals=stats.seller_deals,
+            seller_volume=f"{stats.seller_volume:.2f}",
+            buyer_deals=stats.buyer_deals,
+            buyer_volume=f"{stats.buyer_volume:.2f}",
+            disputes_open=stats.disputes_open,
+            disputes_lost=stats.disputes_lost,
+            last_active=last_active
+        )
 
     except Exception as e:
-        logger.error(f"Error getting status: {str(e)}")
-        await update.message.reply_text("❌ Something went wrong")
+        logger.error(f"Error showing profile: {str(e)}")
+        _reply_message(update, lang, 'error')
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /help command"""
-    help_message = (
-        "👋 *Hey there! Need help? I've got you covered!*\n\n"
-        "🚀 *Simple Commands:*\n"
-        "• `/new` - Start a new deal\n"
-        "• `/status` - Check your deals\n"
-        "• `/ok` - Confirm everything's good\n"
-        "• `/help` - Get my help\n\n"
-        "💰 *Service Fee:*\n"
-        "• Fixed $0.50 per transaction\n"
-        "• Automatically added to deal amount\n"
-        "• Ensures secure escrow service\n\n"
-        "💡 *Quick Example:*\n"
-        "1. Type `/new @seller 100 Product`\n"
-        "2. Choose payment network\n"
-        "3. Send payment (amount + $0.50 fee)\n"
-        "4. Type `/ok` when done\n\n"
-        "🤝 *I'll guide you through each step!*\n"
-        "Just start a deal and I'll help you both stay safe! 😊"
+    user = update.effective_user
+    # Cache only, then Telegram's language: /help must not create the user
+    lang = messages.language(
+        repository.cached_language(user.id) or (user.language_code or '')[:2]
     )
+    _reply_message(update, lang, 'help')
 
-    await update.message.reply_text(help_message, parse_mode='Markdown')
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Keep the username directory current from chat_member updates"""
+    try:
+        member = update.chat_member.new_chat_member.user
+        if not member.is_bot:
+            await repository.get_user_identity(member.id, member.username)
+    except Exception as e:
+        logger.error(f"Error tracking chat member: {str(e)}")
+
+async def track_group_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Keep the username directory current from group message traffic"""
+    try:
+        message = update.effective_message
+        for member in (message.from_user, *message.new_chat_members):
+            if member and not member.is_bot:
+                await repository.get_user_identity(member.id, member.username)
+    except Exception as e:
+        logger.error(f"Error tracking group activity: {str(e)}")
 
 # Export handlers
 __all__ = [
@@ -478,6 +584,10 @@ __all__ = [
     'create_escrow_command',
     'blockchain_callback',
     'release_command',
+    'profile_command',
     'status_command',
-    'language_callback'
+    'status_page_callback',
+    'language_callback',
+    'track_chat_member',
+    'track_group_activity'
 ]
\ No newline at end of file
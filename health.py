@@ -0,0 +1,167 @@
+"""Liveness of the bot process, as reported on /health.
+
+A task on the bot's event loop samples loop lag (how late a short sleep
+wakes up) and periodically round-trips a query through the DB executor
+and pool. A handler in the bot's last group records when the last update
+was processed. /health is served from the keep-alive server's own threads,
+so it still answers when the loop is wedged, and reports that from the age
+of the last lag sample.
+
+    ok         200  everything within limits
+    degraded   200  still serving, but slow: high lag, saturated DB pool,
+                    no updates for HEALTH_UPDATE_MAX_AGE
+    unhealthy  503  bot stopped, loop stalled, or the database check failed
+"""
+import asyncio
+import time
+from collections import deque
+
+import metrics
+import repository
+from config import Config
+from logger import logger
+
+OK = 'ok'
+DEGRADED = 'degraded'
+UNHEALTHY = 'unhealthy'
+
+STATUS_CODES = {OK: 200, DEGRADED: 200, UNHEALTHY: 503}
+
+# Worst lag is taken over this many recent samples (10s at the default interval)
+LAG_WINDOW = 20
+
+loop_lag_seconds = metrics.registry.histogram(
+    'bot_event_loop_lag_seconds', 'How late the event loop woke up a sleeping task',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class HealthMonitor:
+    """Loop lag, last update time and database state for /health"""
+
+    def __init__(self, lag_interval, db_interval, db_timeout):
+        self.lag_interval = lag_interval
+        self.db_interval = db_interval
+        self.db_timeout = db_timeout
+        self.running = False
+        self.started_at = None
+        self.last_tick = None
+        self.lags = deque(maxlen=LAG_WINDOW)
+        self.last_update = None
+        self.db_ok = None
+        self.db_latency = None
+        self.db_error = None
+        self.db_checked_at = None
+        self._tasks = []
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        self.running = True
+        self.started_at = self.last_tick = time.monotonic()
+        self._tasks = [
+            asyncio.create_task(self._sample_lag(), name='health-lag'),
+            asyncio.create_task(self._check_database(), name='health-db'),
+        ]
+
+    async def stop(self):
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def update_processed(self):
+        self.last_update = time.monotonic()
+
+    async def _sample_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self.lags.append(lag)
+            self.last_tick = now
+            loop_lag_seconds.observe(lag)
+
+    async def _check_database(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(repository.ping(), self.db_timeout)
+                self.db_ok, self.db_error = True, None
+            except Exception as e:
+                if self.db_ok is not False:
+                    logger.error(f"Database health check failed: {str(e) or type(e).__name__}")
+                self.db_ok, self.db_error = False, str(e) or type(e).__name__
+            self.db_latency = time.monotonic() - started
+            self.db_checked_at = time.monotonic()
+            await asyncio.sleep(self.db_interval)
+
+    def report(self):
+        """Return (status, details); safe to call from any thread"""
+        now = time.monotonic()
+        problems = []
+        status = OK
+
+        def worsen(level, problem):
+            nonlocal status
+            problems.append(problem)
+            if level == UNHEALTHY or status == OK:
+                status = level
+
+        if not self.running:
+            worsen(UNHEALTHY, 'bot is not running')
+
+        lag = max(self.lags, default=0.0)
+        # A wedged loop takes no samples, so count time since the last one
+        if self.running:
+            lag = max(lag, now - self.last_tick - self.lag_interval)
+            if lag >= Config.HEALTH_LAG_UNHEALTHY:
+                worsen(UNHEALTHY, 'event loop stalled')
+            elif lag >= Config.HEALTH_LAG_DEGRADED:
+                worsen(DEGRADED, 'event loop lagging')
+
+        checked_out = capacity = None
+        if self.db_ok is False:
+            worsen(UNHEALTHY, 'database check failed')
+        elif self.db_ok:
+            try:
+                checked_out, capacity = repository.pool_status()
+                if checked_out >= capacity:
+                    worsen(DEGRADED, 'database pool saturated')
+            except Exception as e:
+                logger.error(f"Error reading pool status: {str(e)}")
+
+        update_age = now - self.last_update if self.last_update is not None else None
+        if Config.HEALTH_UPDATE_MAX_AGE and self.running:
+            idle = update_age if update_age is not None else now - self.started_at
+            if idle > Config.HEALTH_UPDATE_MAX_AGE:
+                worsen(DEGRADED, 'no recent updates')
+
+        return status, {
+            'status': status,
+            'problems': problems,
+            'timestamp': time.time(),
+            'loop_lag': round(lag, 4),
+            'last_update_age': round(update_age, 1) if update_age is not None else None,
+            'database': {
+                'ok': self.db_ok,
+                'latency': round(self.db_latency, 4) if self.db_latency is not None else None,
+                'error': self.db_error,
+                'checked_age': round(now - self.db_checked_at, 1) if self.db_checked_at else None,
+                'pool_checked_out': checked_out,
+                'pool_capacity': capacity,
+            },
+        }
+
+
+monitor = HealthMonitor(
+    lag_interval=Config.HEALTH_LAG_INTERVAL,
+    db_interval=Config.HEALTH_DB_INTERVAL,
+    db_timeout=Config.HEALTH_DB_TIMEOUT
+)
+
+metrics.registry.gauge_callback(
+    'bot_last_update_age_seconds', 'Seconds since the last update was processed',
+    lambda: time.monotonic() - monitor.last_update if monitor.last_update is not None else -1
+)
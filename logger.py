@@ -1,23 +1,167 @@
+"""Logging pipeline that keeps log I/O off the bot's event loop.
+
+Loggers only put records on an in-memory queue (QueueHandler); a
+QueueListener thread formats them and does the writing: JSON lines to a
+rotating, gzip-compressed file and plain text to the console. Messages are
+formatted on that thread too, so pass arguments lazily:
+
+    logger.info("Deal %s completed", tx_id)
+
+rather than with an f-string. Frequent INFO events can be sampled by giving
+them an event name, e.g. extra={'sample': 'new_command'}: only one in
+LOG_SAMPLE_EVERY of them is kept, tagged with the rate so counts can be
+scaled back up.
+"""
+import atexit
+import gzip
+import itertools
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import shutil
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+)
+
+from config import Config
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in `every` records per sample key at INFO and below"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counters = {}
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.every <= 1 or record.levelno > logging.INFO:
+            return True
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = itertools.count()
+        if next(counter) % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() renders the message and traceback on the calling
+    thread; here the record is queued as is, with its args.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _compress_backups(handler):
+    handler.namer = lambda name: name + '.gz'
+    handler.rotator = _gzip_rotator
+
+
+def rotating_file_handler(path, max_bytes, backup_count, compress=True):
+    """File handler that rotates at max_bytes, gzipping backups if compress"""
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    if compress:
+        _compress_backups(handler)
+    return handler
+
+
+def _file_handler():
+    if Config.LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(
+            Config.LOG_FILE, when=Config.LOG_ROTATE_WHEN,
+            backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8', utc=True
+        )
+        if Config.LOG_COMPRESS:
+            _compress_backups(handler)
+    else:
+        handler = rotating_file_handler(
+            Config.LOG_FILE, Config.LOG_MAX_BYTES, Config.LOG_BACKUP_COUNT, Config.LOG_COMPRESS
+        )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _parse_levels(spec):
+    """Parse "httpx=WARNING,telegram=INFO" into {logger name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener = None
+
 
 def setup_logger():
-    # Configure logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            RotatingFileHandler(
-                'bot.log',
-                maxBytes=1024 * 1024,  # 1MB
-                backupCount=5
-            ),
-            logging.StreamHandler()
-        ]
-    )
-    
+    """Install the queue pipeline on the root logger, once per process"""
+    global _listener
+    if _listener is None:
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_EVERY))
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(Config.LOG_LEVEL.upper())
+        for name, level in _parse_levels(Config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = QueueListener(log_queue, _file_handler(), console, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
     # Get logger
     logger = logging.getLogger(__name__)
     return logger
 
+
+def get_logger(name):
+    """Return a named logger that writes through the shared pipeline"""
+    setup_logger()
+    return logging.getLogger(name)
+
+
 logger = setup_logger()
@@ -1,13 +1,15 @@
 import os
-import logging
 import asyncio
+import signal
 from dotenv import load_dotenv
 from telegram import __version__ as TG_VER
 from telegram.ext import ContextTypes
 from keep_alive import keep_alive
 from logger import logger
 from bot import TelegramBot
-from app import app, db
+from app import init_database
+from config import Config
+import sharding
 # from flask import Flask, jsonify
 
 # app = Flask(__name__)
@@ -26,15 +28,39 @@ from app import app, db
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     """Log errors caused by updates."""
-    logger.error(f"Update {update} caused error {context.error}")
+    update_id = getattr(update, 'update_id', None)
+    logger.error("Update %s caused error", update_id, exc_info=context.error)
+
+async def _wait_for_shutdown_signal():
+    """Sleep until SIGINT or SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # No signal handlers on this platform; Ctrl+C still interrupts
+            pass
+    await stop.wait()
+
+async def _run_sharded():
+    """Run the ingress and Config.WORKERS worker processes until stopped"""
+    ingress = sharding.Ingress(Config.WORKERS)
+    try:
+        await ingress.start()
+        logger.info(f"Ingress started with {Config.WORKERS} workers")
+        shutdown = asyncio.ensure_future(_wait_for_shutdown_signal())
+        closed = asyncio.ensure_future(ingress.wait_closed())
+        await asyncio.wait((shutdown, closed), return_when=asyncio.FIRST_COMPLETED)
+        for waiter in (shutdown, closed):
+            waiter.cancel()
+        if closed.done() and not closed.cancelled():
+            raise Exception("A worker exited unexpectedly")
+        logger.info("Shutdown signal received")
+    finally:
+        await ingress.stop()
 
 async def main():
     """Main function to run the bot"""
@@ -48,45 +74,37 @@ async def main():
     keep_alive_started = False
 
     try:
-        # Initialize Flask app context and ensure database is ready
-        with app.app_context():
-            # Verify database connection
+        # Connect (with backoff) and bring the schema up to date, once
+        await init_database()
+        logger.info("Database initialized successfully")
+
+        if Config.WORKERS > 1:
+            # The workers serve /health and run the bot; see sharding.py
+            await _run_sharded()
+            return
+
+        # Start keep-alive server only if not already running
+        if not keep_alive_started:
             try:
-                db.engine.connect()
-                logger.info("Database connection successful")
-            except Exception as db_error:
-                logger.error(f"Database connection failed: {str(db_error)}")
-                raise
-
-            # Make sure tables exist
-            db.create_all()
-            logger.info("Database initialized successfully")
-
-            # Start keep-alive server only if not already running
-            if not keep_alive_started:
-                try:
-                    keep_alive()
-                    keep_alive_started = True
-                    logger.info("Keep-alive server started")
-                except Exception as ka_error:
-                    logger.warning(f"Keep-alive server error (non-critical): {str(ka_error)}")
-
-            # Initialize bot
-            bot = TelegramBot()
-
-            # Start bot and wait for it to be ready
-            start_success = await bot.start()
-            if not start_success:
-                raise Exception("Bot failed to start properly")
-
-            logger.info("Bot started successfully and is now running")
-
-            # Keep the bot running with proper health checks
-            while True:
-                if not bot.is_running:
-                    logger.error("Bot stopped running unexpectedly")
-                    raise Exception("Bot stopped unexpectedly")
-                await asyncio.sleep(1)
+                keep_alive()
+                keep_alive_started = True
+                logger.info("Keep-alive server started")
+            except Exception as ka_error:
+                logger.warning(f"Keep-alive server error (non-critical): {str(ka_error)}")
+
+        # Initialize bot
+        bot = TelegramBot()
+
+        # Start bot and wait for it to be ready
+        start_success = await bot.start()
+        if not start_success:
+            raise Exception("Bot failed to start properly")
+
+        logger.info("Bot started successfully and is now running")
+
+        # Run until asked to stop; liveness is reported on /health
+        await _wait_for_shutdown_signal()
+        logger.info("Shutdown signal received")
 
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
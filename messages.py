@@ -0,0 +1,1117 @@
+"""Message catalog: every text the bot sends, in each supported language.
+
+Templates are compiled once at import: the static fields ({fee},
+{bot_username}) are filled in, the placeholders left for the handlers are
+checked to be the same in every language, and each template remembers its
+parse mode so values are escaped for it when rendered. Keyboards that never
+change are built here once as well.
+"""
+from decimal import Decimal
+from string import Formatter
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import callback_data
+from config import Config
+
+DEFAULT_LANGUAGE = 'en'
+
+# Parse mode of each message; None is plain text (also used for callback
+# answers and button labels)
+PARSE_MODES = {
+    'start_group': 'Markdown',
+    'start_private': 'Markdown',
+    'start_error': None,
+    'language_set': 'Markdown',
+    'language_set_answer': None,
+    'new_group_only': None,
+    'new_usage': 'Markdown',
+    'new_bad_amount': 'Markdown',
+    'new_user_error': None,
+    'new_seller_unknown': None,
+    'new_create_error': None,
+    'new_deal': 'HTML',
+    'new_error': None,
+    'deal_not_found_answer': None,
+    'buyer_only_network_answer': None,
+    'network_closed_answer': None,
+    'button_invalid_answer': None,
+    'payment_instructions': 'Markdown',
+    'network_chosen_answer': None,
+    'deal_started_group': 'Markdown',
+    'ok_usage': 'Markdown',
+    'ok_not_found': None,
+    'ok_buyer_only': None,
+    'ok_already_complete': None,
+    'ok_expired': None,
+    'ok_done': None,
+    'deal_complete_group': 'Markdown',
+    'payment_confirmed_group': 'Markdown',
+    'payment_reminder_group': 'Markdown',
+    'deal_expired_group': 'Markdown',
+    'status_group_header': 'Markdown',
+    'status_group_deal': 'Markdown',
+    'status_user_header': 'Markdown',
+    'status_as_buyer': 'Markdown',
+    'status_buyer_deal': 'Markdown',
+    'status_as_seller': 'Markdown',
+    'status_seller_deal': 'Markdown',
+    'status_newer': None,
+    'status_older': None,
+    'status_empty_group': None,
+    'status_empty_private': None,
+    'status_no_more_answer': None,
+    'deal_status_awaiting_payment': None,
+    'deal_status_payment_confirmed': None,
+    'deal_status_completed': None,
+    'deal_status_cancelled': None,
+    'deal_status_expired': None,
+    'seller_reputation': None,
+    'seller_reputation_new': None,
+    'profile': 'Markdown',
+    'profile_unknown': None,
+    'profile_never': None,
+    'help': 'Markdown',
+    'error': None,
+    'error_answer': None,
+}
+
+CATALOG = {
+    'en': {
+        'start_group': (
+            "👋 *Hi! I'm your AI Escrow Assistant!*\n\n"
+            "I'm here to help make deals safe and easy. Here's what I can do:\n\n"
+            "🤝 `/new` - Start a new deal\n"
+            "🔍 `/status` - Check your deals\n"
+            "✅ `/ok` - Confirm everything's good\n"
+            "❓ `/help` - Get my help\n\n"
+            "💡 *Example:* Type `/new @seller 100 Product`\n"
+            "I'll guide you through the whole process!\n\n"
+            "🔒 *Fixed Fee:* ${fee} per transaction for secure escrow service"
+        ),
+        'start_private': (
+            "👋 *Hello {first_name}!*\n\n"
+            "I'm your AI Escrow Assistant, and I'm here to help make your deals safe and easy!\n\n"
+            "🛡️ *How I Help You:*\n"
+            "1️⃣ Create secure deals\n"
+            "2️⃣ Handle payments safely\n"
+            "3️⃣ Guide both parties\n"
+            "4️⃣ Verify transactions\n\n"
+            "💰 *Service Fee:*\n"
+            "• Fixed ${fee} per transaction\n"
+            "• Automatically deducted\n"
+            "• Ensures secure escrow service\n\n"
+            "🌍 *First, let's set your preferred language:*"
+        ),
+        'start_error': "Oops! Something went wrong. Let's try again with /start",
+        'language_set': (
+            "🎉 *Perfect! I'll speak {language} with you!*\n\n"
+            "Hey {first_name}, I'm ready to help you make safe deals!\n\n"
+            "💫 *Quick Start:*\n"
+            "1. Add me to your group chat\n"
+            "2. Start a deal with `/new`\n"
+            "3. I'll guide you step by step!\n\n"
+            "Need help? Just type /help anytime! 😊"
+        ),
+        'language_set_answer': "Language set to {language}! 🌟",
+        'new_group_only': (
+            "🤔 Let's do this in a group chat where both buyer and seller are present!\n"
+            "Add me to your group and try again. 👥"
+        ),
+        'new_usage': (
+            "👋 *Let me help you create a deal!*\n\n"
+            "Here's how to do it:\n"
+            "Type `/new @seller amount description`\n\n"
+            "*For example:*\n"
+            "`/new @john 100 Product`\n\n"
+            "💰 *Note:* A fixed fee of ${fee} will be added to the transaction amount.\n"
+            "I'll help guide you through the rest! 🤝"
+        ),
+        'new_bad_amount': (
+            "🤔 The amount doesn't look right.\n"
+            "Please use a positive number, like:\n"
+            "`/new @seller 100 Product`"
+        ),
+        'new_user_error': "Sorry, there was an issue saving your data. Please try again.",
+        'new_seller_unknown': (
+            "👋 I see that @{seller} hasn't met me yet!\n\n"
+            "🤝 Ask them to:\n"
+            "1. Send any message in this group, or\n"
+            "2. Send me a /start message ({bot_username})\n"
+            "3. Then we can create the deal!"
+        ),
+        'new_create_error': "Sorry, there was an issue processing your transaction. Please try again.",
+        'new_deal': (
+            "🎉 <b>Great! Let's set up your deal #{tx_id}</b>\n\n"
+            "💫 <b>Deal Summary:</b>\n"
+            "💰 Base Amount: ${amount}\n"
+            "🔒 Service Fee: ${fee}\n"
+            "💎 Total Amount: ${total}\n"
+            "📝 For: {description}\n"
+            "🤝 Between: @{buyer} and @{seller}\n"
+            "⭐ Seller record: {reputation}\n\n"
+            "🌟 <b>Next Step:</b>\n"
+            "Choose a payment network below. I'll help you pick:\n\n"
+            "💡 <b>Quick Guide:</b>\n"
+            "• BEP20: Lowest fees\n"
+            "• ERC20: Most secure\n"
+            "• Optimism: Fast &amp; cheap\n"
+            "• Arbitrum: Ultra fast"
+        ),
+        'new_error': (
+            "Oops! Something didn't work right. 😅\n"
+            "Let's try that again! Need help? Type /help"
+        ),
+        'deal_not_found_answer': "I couldn't find that deal! Let's start a new one.",
+        'buyer_only_network_answer': "Only the buyer can select the payment network! 👀",
+        'network_closed_answer': "This deal is already past payment selection! ✅",
+        'button_invalid_answer': "This button is no longer valid. Check /status for your deals.",
+        'payment_instructions': (
+            "🎉 *Perfect! Deal #{tx_id} is ready!*\n\n"
+            "💰 *Amount to Send:* ${total}\n"
+            "🔗 *Network:* {chain}\n"
+            "⚡️ *Speed:* {speed}\n"
+            "💸 *Network Fee:* {gas_fee}\n\n"
+            "📤 *Send payment to:*\n"
+            "`{wallet}`\n\n"
+            "🎯 *What's Next:*\n"
+            "1. Send ${total} to the address above\n"
+            "2. Once sent, type: `/ok {tx_id}`\n"
+            "3. I'll verify everything and help complete the deal!\n\n"
+            "💡 Need help? Just type /help"
+        ),
+        'network_chosen_answer': "Great choice! Let's proceed with payment! 🚀",
+        'deal_started_group': (
+            "🎉 *New Deal Started!*\n\n"
+            "💰 Amount: ${total}\n"
+            "🤝 Buyer: @{buyer}\n"
+            "🤝 Seller: @{seller}\n"
+            "🔗 Network: {chain}\n\n"
+            "⏳ Waiting for payment...\n"
+            "I'll keep everyone updated on the progress! 👀"
+        ),
+        'ok_usage': (
+            "❌ *Wrong Format*\n\n"
+            "Type like this:\n"
+            "`/ok 123`"
+        ),
+        'ok_not_found': "❌ Deal not found",
+        'ok_buyer_only': "❌ Only the buyer can confirm",
+        'ok_already_complete': "✅ This deal is already complete",
+        'ok_expired': "⌛ This deal expired without payment and can no longer be completed",
+        'ok_done': "✅ Deal completed!",
+        'deal_complete_group': (
+            "✅ *Deal #{tx_id} Complete!*\n\n"
+            "💰 Amount: ${total}\n"
+            "👤 Buyer: @{buyer}\n"
+            "👤 Seller: @{seller}\n\n"
+            "🎉 Everyone happy!"
+        ),
+        'payment_confirmed_group': (
+            "💸 *Payment received for Deal #{tx_id}*\n\n"
+            "💰 Amount: ${total}\n"
+            "🔗 Network: {chain}\n\n"
+            "Seller, please deliver. Buyer, type `/ok {tx_id}` once you have received it."
+        ),
+        'payment_reminder_group': (
+            "⏰ *Deal #{tx_id} is still waiting for payment*\n\n"
+            "💰 Amount: ${total}\n"
+            "👤 Buyer: @{buyer}\n\n"
+            "Choose a network and send the payment within {hours} h, or the deal expires."
+        ),
+        'deal_expired_group': (
+            "⌛ *Deal #{tx_id} expired*\n\n"
+            "No payment arrived in time. Start a new deal with /new if you still want to trade."
+        ),
+        'status_group_header': "🔍 *Recent Deals*\n\n",
+        'status_group_deal': (
+            "💫 *Deal #{tx_id}*\n"
+            "💰 Amount: ${total}\n"
+            "👤 Buyer: @{buyer}\n"
+            "👤 Seller: @{seller}\n"
+            "📊 Status: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_user_header': "🔍 *Your Deals*\n\n",
+        'status_as_buyer': "💳 *As Buyer:*\n",
+        'status_buyer_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Amount: ${total}\n"
+            "👤 Seller: @{seller}\n"
+            "📊 Status: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_as_seller': "\n🏦 *As Seller:*\n",
+        'status_seller_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Amount: ${total}\n"
+            "👤 Buyer: @{buyer}\n"
+            "📊 Status: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_newer': "⬅️ Newer",
+        'status_older': "Older ➡️",
+        'status_empty_group': "No active deals in this group",
+        'status_empty_private': (
+            "No deals found.\n"
+            "Create new deal with /new in group chat"
+        ),
+        'status_no_more_answer': "No more deals to show",
+        'deal_status_awaiting_payment': "awaiting payment",
+        'deal_status_payment_confirmed': "payment received",
+        'deal_status_completed': "completed",
+        'deal_status_cancelled': "cancelled",
+        'deal_status_expired': "expired",
+        'seller_reputation': "{deals} deals completed, ${volume} volume, {disputes_lost} disputes lost",
+        'seller_reputation_new': "new seller, no completed deals yet",
+        'profile': (
+            "👤 *Deal record of @{username}*\n\n"
+            "🏦 As seller: {seller_deals} deals, ${seller_volume}\n"
+            "💳 As buyer: {buyer_deals} deals, ${buyer_volume}\n"
+            "⚖️ Open disputes: {disputes_open}\n"
+            "❌ Disputes lost: {disputes_lost}\n"
+            "🕒 Last active: {last_active}"
+        ),
+        'profile_unknown': "I don't know @{username} yet.",
+        'profile_never': "never",
+        'help': (
+            "👋 *Hey there! Need help? I've got you covered!*\n\n"
+            "🚀 *Simple Commands:*\n"
+            "• `/new` - Start a new deal\n"
+            "• `/status` - Check your deals\n"
+            "• `/ok` - Confirm everything's good\n"
+            "• `/profile` - See anyone's deal record\n"
+            "• `/help` - Get my help\n\n"
+            "💰 *Service Fee:*\n"
+            "• Fixed ${fee} per transaction\n"
+            "• Automatically added to deal amount\n"
+            "• Ensures secure escrow service\n\n"
+            "💡 *Quick Example:*\n"
+            "1. Type `/new @seller 100 Product`\n"
+            "2. Choose payment network\n"
+            "3. Send payment (amount + ${fee} fee)\n"
+            "4. Type `/ok` when done\n\n"
+            "🤝 *I'll guide you through each step!*\n"
+            "Just start a deal and I'll help you both stay safe! 😊"
+        ),
+        'error': "❌ Something went wrong",
+        'error_answer': "Oops! Something went wrong. Let's try again! 😅",
+    },
+    'zh': {
+        'start_group': (
+            "👋 *你好！我是你的 AI 担保助手！*\n\n"
+            "我会让交易变得安全又简单。我可以：\n\n"
+            "🤝 `/new` - 发起新交易\n"
+            "🔍 `/status` - 查看你的交易\n"
+            "✅ `/ok` - 确认一切顺利\n"
+            "❓ `/help` - 获取帮助\n\n"
+            "💡 *示例：* 输入 `/new @seller 100 Product`\n"
+            "我会全程引导你！\n\n"
+            "🔒 *固定手续费：* 每笔交易 ${fee}，保障担保服务安全"
+        ),
+        'start_private': (
+            "👋 *你好，{first_name}！*\n\n"
+            "我是你的 AI 担保助手，帮你让每笔交易安全又简单！\n\n"
+            "🛡️ *我能帮你：*\n"
+            "1️⃣ 创建安全交易\n"
+            "2️⃣ 安全处理付款\n"
+            "3️⃣ 引导买卖双方\n"
+            "4️⃣ 核实交易\n\n"
+            "💰 *服务费：*\n"
+            "• 每笔交易固定 ${fee}\n"
+            "• 自动扣除\n"
+            "• 保障担保服务安全\n\n"
+            "🌍 *首先，请选择你的语言：*"
+        ),
+        'start_error': "哎呀！出了点问题。请用 /start 再试一次",
+        'language_set': (
+            "🎉 *好的！我会用{language}和你交流！*\n\n"
+            "{first_name}，我已准备好帮你安全交易！\n\n"
+            "💫 *快速开始：*\n"
+            "1. 把我加入你的群聊\n"
+            "2. 用 `/new` 发起交易\n"
+            "3. 我会一步步引导你！\n\n"
+            "需要帮助？随时输入 /help！😊"
+        ),
+        'language_set_answer': "语言已设置为{language}！🌟",
+        'new_group_only': (
+            "🤔 请在买家和卖家都在的群聊中进行！\n"
+            "把我加入你的群聊后再试一次。👥"
+        ),
+        'new_usage': (
+            "👋 *我来帮你创建交易！*\n\n"
+            "方法如下：\n"
+            "输入 `/new @seller amount description`\n\n"
+            "*例如：*\n"
+            "`/new @john 100 Product`\n\n"
+            "💰 *注意：* 交易金额将另加 ${fee} 固定手续费。\n"
+            "接下来我会引导你完成！🤝"
+        ),
+        'new_bad_amount': (
+            "🤔 金额好像不对。\n"
+            "请使用正数，例如：\n"
+            "`/new @seller 100 Product`"
+        ),
+        'new_user_error': "抱歉，保存你的数据时出错，请重试。",
+        'new_seller_unknown': (
+            "👋 @{seller} 还没有和我打过招呼！\n\n"
+            "🤝 请让对方：\n"
+            "1. 在本群发送任意消息，或\n"
+            "2. 给我发送 /start（{bot_username}）\n"
+            "3. 然后我们就可以创建交易了！"
+        ),
+        'new_create_error': "抱歉，处理你的交易时出错，请重试。",
+        'new_deal': (
+            "🎉 <b>太好了！我们来设置交易 #{tx_id}</b>\n\n"
+            "💫 <b>交易摘要：</b>\n"
+            "💰 基础金额：${amount}\n"
+            "🔒 服务费：${fee}\n"
+            "💎 总金额：${total}\n"
+            "📝 用途：{description}\n"
+            "🤝 双方：@{buyer} 和 @{seller}\n"
+            "⭐ 卖家记录：{reputation}\n\n"
+            "🌟 <b>下一步：</b>\n"
+            "请在下方选择付款网络，参考如下：\n\n"
+            "💡 <b>快速指南：</b>\n"
+            "• BEP20：手续费最低\n"
+            "• ERC20：最安全\n"
+            "• Optimism：快速且便宜\n"
+            "• Arbitrum：极速"
+        ),
+        'new_error': (
+            "哎呀！出了点问题。😅\n"
+            "我们再试一次！需要帮助？输入 /help"
+        ),
+        'deal_not_found_answer': "找不到这笔交易！请重新发起一笔。",
+        'buyer_only_network_answer': "只有买家可以选择付款网络！👀",
+        'network_closed_answer': "这笔交易已经过了选择付款网络的阶段！✅",
+        'button_invalid_answer': "这个按钮已失效。请用 /status 查看你的交易。",
+        'payment_instructions': (
+            "🎉 *好的！交易 #{tx_id} 已就绪！*\n\n"
+            "💰 *应付金额：* ${total}\n"
+            "🔗 *网络：* {chain}\n"
+            "⚡️ *速度：* {speed}\n"
+            "💸 *网络费：* {gas_fee}\n\n"
+            "📤 *付款地址：*\n"
+            "`{wallet}`\n\n"
+            "🎯 *下一步：*\n"
+            "1. 向上方地址发送 ${total}\n"
+            "2. 发送后输入：`/ok {tx_id}`\n"
+            "3. 我会核实并帮助完成交易！\n\n"
+            "💡 需要帮助？输入 /help"
+        ),
+        'network_chosen_answer': "好选择！我们开始付款吧！🚀",
+        'deal_started_group': (
+            "🎉 *新交易已开始！*\n\n"
+            "💰 金额：${total}\n"
+            "🤝 买家：@{buyer}\n"
+            "🤝 卖家：@{seller}\n"
+            "🔗 网络：{chain}\n\n"
+            "⏳ 等待付款中...\n"
+            "我会随时向大家更新进度！👀"
+        ),
+        'ok_usage': (
+            "❌ *格式错误*\n\n"
+            "请这样输入：\n"
+            "`/ok 123`"
+        ),
+        'ok_not_found': "❌ 未找到交易",
+        'ok_buyer_only': "❌ 只有买家可以确认",
+        'ok_already_complete': "✅ 这笔交易已经完成",
+        'ok_expired': "⌛ 这笔交易因未付款已过期，无法再完成",
+        'ok_done': "✅ 交易已完成！",
+        'deal_complete_group': (
+            "✅ *交易 #{tx_id} 已完成！*\n\n"
+            "💰 金额：${total}\n"
+            "👤 买家：@{buyer}\n"
+            "👤 卖家：@{seller}\n\n"
+            "🎉 皆大欢喜！"
+        ),
+        'payment_confirmed_group': (
+            "💸 *交易 #{tx_id} 已收到付款*\n\n"
+            "💰 金额：${total}\n"
+            "🔗 网络：{chain}\n\n"
+            "请卖家交付。买家收到后请输入 `/ok {tx_id}`。"
+        ),
+        'payment_reminder_group': (
+            "⏰ *交易 #{tx_id} 仍在等待付款*\n\n"
+            "💰 金额：${total}\n"
+            "👤 买家：@{buyer}\n\n"
+            "请在 {hours} 小时内选择网络并付款，否则交易将过期。"
+        ),
+        'deal_expired_group': (
+            "⌛ *交易 #{tx_id} 已过期*\n\n"
+            "未按时收到付款。如仍想交易，请使用 /new 创建新交易。"
+        ),
+        'status_group_header': "🔍 *最近的交易*\n\n",
+        'status_group_deal': (
+            "💫 *交易 #{tx_id}*\n"
+            "💰 金额：${total}\n"
+            "👤 买家：@{buyer}\n"
+            "👤 卖家：@{seller}\n"
+            "📊 状态：{status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_user_header': "🔍 *你的交易*\n\n",
+        'status_as_buyer': "💳 *作为买家：*\n",
+        'status_buyer_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 金额：${total}\n"
+            "👤 卖家：@{seller}\n"
+            "📊 状态：{status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_as_seller': "\n🏦 *作为卖家：*\n",
+        'status_seller_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 金额：${total}\n"
+            "👤 买家：@{buyer}\n"
+            "📊 状态：{status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_newer': "⬅️ 较新",
+        'status_older': "较早 ➡️",
+        'status_empty_group': "本群没有进行中的交易",
+        'status_empty_private': (
+            "没有找到交易。\n"
+            "请在群聊中用 /new 创建新交易"
+        ),
+        'status_no_more_answer': "没有更多交易了",
+        'deal_status_awaiting_payment': "等待付款",
+        'deal_status_payment_confirmed': "已收到付款",
+        'deal_status_completed': "已完成",
+        'deal_status_cancelled': "已取消",
+        'deal_status_expired': "已过期",
+        'seller_reputation': "已完成 {deals} 笔交易，成交额 ${volume}，败诉争议 {disputes_lost} 次",
+        'seller_reputation_new': "新卖家，暂无已完成的交易",
+        'profile': (
+            "👤 *@{username} 的交易记录*\n\n"
+            "🏦 作为卖家：{seller_deals} 笔，${seller_volume}\n"
+            "💳 作为买家：{buyer_deals} 笔，${buyer_volume}\n"
+            "⚖️ 进行中的争议：{disputes_open}\n"
+            "❌ 败诉争议：{disputes_lost}\n"
+            "🕒 最近活跃：{last_active}"
+        ),
+        'profile_unknown': "我还不认识 @{username}。",
+        'profile_never': "从未",
+        'help': (
+            "👋 *你好！需要帮助？交给我吧！*\n\n"
+            "🚀 *常用命令：*\n"
+            "• `/new` - 发起新交易\n"
+            "• `/status` - 查看你的交易\n"
+            "• `/ok` - 确认一切顺利\n"
+            "• `/profile` - 查看用户的交易记录\n"
+            "• `/help` - 获取帮助\n\n"
+            "💰 *服务费：*\n"
+            "• 每笔交易固定 ${fee}\n"
+            "• 自动加到交易金额中\n"
+            "• 保障担保服务安全\n\n"
+            "💡 *快速示例：*\n"
+            "1. 输入 `/new @seller 100 Product`\n"
+            "2. 选择付款网络\n"
+            "3. 付款（金额 + ${fee} 手续费）\n"
+            "4. 完成后输入 `/ok`\n\n"
+            "🤝 *每一步我都会引导你！*\n"
+            "发起交易，我会帮你们双方保障安全！😊"
+        ),
+        'error': "❌ 出错了",
+        'error_answer': "哎呀！出了点问题。我们再试一次！😅",
+    },
+    'es': {
+        'start_group': (
+            "👋 *¡Hola! ¡Soy tu Asistente de Escrow con IA!*\n\n"
+            "Estoy aquí para que tus tratos sean seguros y fáciles. Esto es lo que puedo hacer:\n\n"
+            "🤝 `/new` - Iniciar un nuevo trato\n"
+            "🔍 `/status` - Ver tus tratos\n"
+            "✅ `/ok` - Confirmar que todo está bien\n"
+            "❓ `/help` - Obtener ayuda\n\n"
+            "💡 *Ejemplo:* Escribe `/new @seller 100 Product`\n"
+            "¡Te guiaré durante todo el proceso!\n\n"
+            "🔒 *Comisión fija:* ${fee} por transacción por un servicio de escrow seguro"
+        ),
+        'start_private': (
+            "👋 *¡Hola {first_name}!*\n\n"
+            "Soy tu Asistente de Escrow con IA, ¡y estoy aquí para que tus tratos sean seguros y fáciles!\n\n"
+            "🛡️ *Cómo te ayudo:*\n"
+            "1️⃣ Creo tratos seguros\n"
+            "2️⃣ Gestiono los pagos con seguridad\n"
+            "3️⃣ Guío a ambas partes\n"
+            "4️⃣ Verifico las transacciones\n\n"
+            "💰 *Comisión del servicio:*\n"
+            "• ${fee} fijos por transacción\n"
+            "• Se descuenta automáticamente\n"
+            "• Garantiza un servicio de escrow seguro\n\n"
+            "🌍 *Primero, elige tu idioma preferido:*"
+        ),
+        'start_error': "¡Uy! Algo salió mal. Inténtalo de nuevo con /start",
+        'language_set': (
+            "🎉 *¡Perfecto! ¡Hablaré contigo en {language}!*\n\n"
+            "¡Hola {first_name}, estoy listo para ayudarte a hacer tratos seguros!\n\n"
+            "💫 *Inicio rápido:*\n"
+            "1. Añádeme a tu grupo\n"
+            "2. Inicia un trato con `/new`\n"
+            "3. ¡Te guiaré paso a paso!\n\n"
+            "¿Necesitas ayuda? ¡Escribe /help cuando quieras! 😊"
+        ),
+        'language_set_answer': "¡Idioma cambiado a {language}! 🌟",
+        'new_group_only': (
+            "🤔 ¡Hagámoslo en un grupo donde estén el comprador y el vendedor!\n"
+            "Añádeme a tu grupo e inténtalo de nuevo. 👥"
+        ),
+        'new_usage': (
+            "👋 *¡Te ayudo a crear un trato!*\n\n"
+            "Así se hace:\n"
+            "Escribe `/new @seller amount description`\n\n"
+            "*Por ejemplo:*\n"
+            "`/new @john 100 Product`\n\n"
+            "💰 *Nota:* Se añadirá una comisión fija de ${fee} al importe.\n"
+            "¡Te guiaré con el resto! 🤝"
+        ),
+        'new_bad_amount': (
+            "🤔 El importe no parece correcto.\n"
+            "Usa un número positivo, por ejemplo:\n"
+            "`/new @seller 100 Product`"
+        ),
+        'new_user_error': "Lo siento, hubo un problema al guardar tus datos. Inténtalo de nuevo.",
+        'new_seller_unknown': (
+            "👋 ¡Veo que @{seller} todavía no me conoce!\n\n"
+            "🤝 Pídele que:\n"
+            "1. Envíe cualquier mensaje en este grupo, o\n"
+            "2. Me envíe un mensaje /start ({bot_username})\n"
+            "3. ¡Y después podremos crear el trato!"
+        ),
+        'new_create_error': "Lo siento, hubo un problema al procesar tu transacción. Inténtalo de nuevo.",
+        'new_deal': (
+            "🎉 <b>¡Genial! Preparemos tu trato #{tx_id}</b>\n\n"
+            "💫 <b>Resumen del trato:</b>\n"
+            "💰 Importe base: ${amount}\n"
+            "🔒 Comisión del servicio: ${fee}\n"
+            "💎 Importe total: ${total}\n"
+            "📝 Concepto: {description}\n"
+            "🤝 Entre: @{buyer} y @{seller}\n"
+            "⭐ Historial del vendedor: {reputation}\n\n"
+            "🌟 <b>Siguiente paso:</b>\n"
+            "Elige una red de pago abajo. Te ayudo a decidir:\n\n"
+            "💡 <b>Guía rápida:</b>\n"
+            "• BEP20: Comisiones más bajas\n"
+            "• ERC20: La más segura\n"
+            "• Optimism: Rápida y barata\n"
+            "• Arbitrum: Ultrarrápida"
+        ),
+        'new_error': (
+            "¡Uy! Algo no funcionó bien. 😅\n"
+            "¡Intentémoslo de nuevo! ¿Necesitas ayuda? Escribe /help"
+        ),
+        'deal_not_found_answer': "¡No encuentro ese trato! Empecemos uno nuevo.",
+        'buyer_only_network_answer': "¡Solo el comprador puede elegir la red de pago! 👀",
+        'network_closed_answer': "¡Este trato ya pasó la elección de red de pago! ✅",
+        'button_invalid_answer': "Este botón ya no es válido. Consulta tus tratos con /status.",
+        'payment_instructions': (
+            "🎉 *¡Perfecto! ¡El trato #{tx_id} está listo!*\n\n"
+            "💰 *Importe a enviar:* ${total}\n"
+            "🔗 *Red:* {chain}\n"
+            "⚡️ *Velocidad:* {speed}\n"
+            "💸 *Comisión de red:* {gas_fee}\n\n"
+            "📤 *Envía el pago a:*\n"
+            "`{wallet}`\n\n"
+            "🎯 *Qué sigue:*\n"
+            "1. Envía ${total} a la dirección de arriba\n"
+            "2. Cuando lo hayas enviado, escribe: `/ok {tx_id}`\n"
+            "3. ¡Lo verificaré todo y ayudaré a completar el trato!\n\n"
+            "💡 ¿Necesitas ayuda? Escribe /help"
+        ),
+        'network_chosen_answer': "¡Buena elección! ¡Sigamos con el pago! 🚀",
+        'deal_started_group': (
+            "🎉 *¡Nuevo trato iniciado!*\n\n"
+            "💰 Importe: ${total}\n"
+            "🤝 Comprador: @{buyer}\n"
+            "🤝 Vendedor: @{seller}\n"
+            "🔗 Red: {chain}\n\n"
+            "⏳ Esperando el pago...\n"
+            "¡Os mantendré a todos al tanto! 👀"
+        ),
+        'ok_usage': (
+            "❌ *Formato incorrecto*\n\n"
+            "Escríbelo así:\n"
+            "`/ok 123`"
+        ),
+        'ok_not_found': "❌ Trato no encontrado",
+        'ok_buyer_only': "❌ Solo el comprador puede confirmar",
+        'ok_already_complete': "✅ Este trato ya está completado",
+        'ok_expired': "⌛ Este trato expiró sin pago y ya no se puede completar",
+        'ok_done': "✅ ¡Trato completado!",
+        'deal_complete_group': (
+            "✅ *¡Trato #{tx_id} completado!*\n\n"
+            "💰 Importe: ${total}\n"
+            "👤 Comprador: @{buyer}\n"
+            "👤 Vendedor: @{seller}\n\n"
+            "🎉 ¡Todos contentos!"
+        ),
+        'payment_confirmed_group': (
+            "💸 *Pago recibido para el trato #{tx_id}*\n\n"
+            "💰 Importe: ${total}\n"
+            "🔗 Red: {chain}\n\n"
+            "Vendedor, realiza la entrega. Comprador, escribe `/ok {tx_id}` cuando la recibas."
+        ),
+        'payment_reminder_group': (
+            "⏰ *El trato #{tx_id} sigue esperando el pago*\n\n"
+            "💰 Importe: ${total}\n"
+            "👤 Comprador: @{buyer}\n\n"
+            "Elige una red y envía el pago en {hours} h o el trato caducará."
+        ),
+        'deal_expired_group': (
+            "⌛ *El trato #{tx_id} ha caducado*\n\n"
+            "El pago no llegó a tiempo. Crea un trato nuevo con /new si aún quieres negociar."
+        ),
+        'status_group_header': "🔍 *Tratos recientes*\n\n",
+        'status_group_deal': (
+            "💫 *Trato #{tx_id}*\n"
+            "💰 Importe: ${total}\n"
+            "👤 Comprador: @{buyer}\n"
+            "👤 Vendedor: @{seller}\n"
+            "📊 Estado: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_user_header': "🔍 *Tus tratos*\n\n",
+        'status_as_buyer': "💳 *Como comprador:*\n",
+        'status_buyer_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Importe: ${total}\n"
+            "👤 Vendedor: @{seller}\n"
+            "📊 Estado: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_as_seller': "\n🏦 *Como vendedor:*\n",
+        'status_seller_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Importe: ${total}\n"
+            "👤 Comprador: @{buyer}\n"
+            "📊 Estado: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_newer': "⬅️ Más recientes",
+        'status_older': "Anteriores ➡️",
+        'status_empty_group': "No hay tratos activos en este grupo",
+        'status_empty_private': (
+            "No se encontraron tratos.\n"
+            "Crea un trato nuevo con /new en un grupo"
+        ),
+        'status_no_more_answer': "No hay más tratos",
+        'deal_status_awaiting_payment': "esperando pago",
+        'deal_status_payment_confirmed': "pago recibido",
+        'deal_status_completed': "completado",
+        'deal_status_cancelled': "cancelado",
+        'deal_status_expired': "caducado",
+        'seller_reputation': "{deals} tratos completados, ${volume} de volumen, {disputes_lost} disputas perdidas",
+        'seller_reputation_new': "vendedor nuevo, aún sin tratos completados",
+        'profile': (
+            "👤 *Historial de @{username}*\n\n"
+            "🏦 Como vendedor: {seller_deals} tratos, ${seller_volume}\n"
+            "💳 Como comprador: {buyer_deals} tratos, ${buyer_volume}\n"
+            "⚖️ Disputas abiertas: {disputes_open}\n"
+            "❌ Disputas perdidas: {disputes_lost}\n"
+            "🕒 Última actividad: {last_active}"
+        ),
+        'profile_unknown': "Todavía no conozco a @{username}.",
+        'profile_never': "nunca",
+        'help': (
+            "👋 *¡Hola! ¿Necesitas ayuda? ¡Aquí estoy!*\n\n"
+            "🚀 *Comandos sencillos:*\n"
+            "• `/new` - Iniciar un nuevo trato\n"
+            "• `/status` - Ver tus tratos\n"
+            "• `/ok` - Confirmar que todo está bien\n"
+            "• `/profile` - Ver el historial de un usuario\n"
+            "• `/help` - Obtener ayuda\n\n"
+            "💰 *Comisión del servicio:*\n"
+            "• ${fee} fijos por transacción\n"
+            "• Se suma automáticamente al importe\n"
+            "• Garantiza un servicio de escrow seguro\n\n"
+            "💡 *Ejemplo rápido:*\n"
+            "1. Escribe `/new @seller 100 Product`\n"
+            "2. Elige la red de pago\n"
+            "3. Envía el pago (importe + ${fee} de comisión)\n"
+            "4. Escribe `/ok` cuando termines\n\n"
+            "🤝 *¡Te guiaré en cada paso!*\n"
+            "¡Inicia un trato y os ayudaré a ambos a estar seguros! 😊"
+        ),
+        'error': "❌ Algo salió mal",
+        'error_answer': "¡Uy! Algo salió mal. ¡Inténtalo de nuevo! 😅",
+    },
+    'ru': {
+        'start_group': (
+            "👋 *Привет! Я ваш ИИ-помощник по эскроу!*\n\n"
+            "Я помогаю сделать сделки безопасными и простыми. Вот что я умею:\n\n"
+            "🤝 `/new` - Начать новую сделку\n"
+            "🔍 `/status` - Посмотреть ваши сделки\n"
+            "✅ `/ok` - Подтвердить, что всё в порядке\n"
+            "❓ `/help` - Получить помощь\n\n"
+            "💡 *Пример:* Напишите `/new @seller 100 Product`\n"
+            "Я проведу вас через весь процесс!\n\n"
+            "🔒 *Фиксированная комиссия:* ${fee} за сделку за безопасный эскроу"
+        ),
+        'start_private': (
+            "👋 *Здравствуйте, {first_name}!*\n\n"
+            "Я ваш ИИ-помощник по эскроу, и я помогу сделать ваши сделки безопасными и простыми!\n\n"
+            "🛡️ *Чем я помогаю:*\n"
+            "1️⃣ Создаю безопасные сделки\n"
+            "2️⃣ Надёжно провожу платежи\n"
+            "3️⃣ Сопровождаю обе стороны\n"
+            "4️⃣ Проверяю транзакции\n\n"
+            "💰 *Комиссия сервиса:*\n"
+            "• Фиксированно ${fee} за сделку\n"
+            "• Удерживается автоматически\n"
+            "• Обеспечивает безопасный эскроу\n\n"
+            "🌍 *Для начала выберите язык:*"
+        ),
+        'start_error': "Ой! Что-то пошло не так. Попробуйте ещё раз с /start",
+        'language_set': (
+            "🎉 *Отлично! Я буду говорить с вами на языке: {language}!*\n\n"
+            "{first_name}, я готов помочь вам проводить безопасные сделки!\n\n"
+            "💫 *Быстрый старт:*\n"
+            "1. Добавьте меня в групповой чат\n"
+            "2. Начните сделку командой `/new`\n"
+            "3. Я проведу вас шаг за шагом!\n\n"
+            "Нужна помощь? Пишите /help в любое время! 😊"
+        ),
+        'language_set_answer': "Язык изменён: {language}! 🌟",
+        'new_group_only': (
+            "🤔 Давайте сделаем это в групповом чате, где есть и покупатель, и продавец!\n"
+            "Добавьте меня в группу и попробуйте снова. 👥"
+        ),
+        'new_usage': (
+            "👋 *Давайте создадим сделку!*\n\n"
+            "Вот как это сделать:\n"
+            "Напишите `/new @seller amount description`\n\n"
+            "*Например:*\n"
+            "`/new @john 100 Product`\n\n"
+            "💰 *Примечание:* К сумме сделки добавляется фиксированная комиссия ${fee}.\n"
+            "Дальше я всё подскажу! 🤝"
+        ),
+        'new_bad_amount': (
+            "🤔 Сумма выглядит неверно.\n"
+            "Укажите положительное число, например:\n"
+            "`/new @seller 100 Product`"
+        ),
+        'new_user_error': "Извините, не удалось сохранить ваши данные. Попробуйте ещё раз.",
+        'new_seller_unknown': (
+            "👋 Похоже, @{seller} ещё не знаком со мной!\n\n"
+            "🤝 Попросите его:\n"
+            "1. Написать любое сообщение в этой группе, или\n"
+            "2. Отправить мне /start ({bot_username})\n"
+            "3. После этого мы сможем создать сделку!"
+        ),
+        'new_create_error': "Извините, не удалось обработать вашу сделку. Попробуйте ещё раз.",
+        'new_deal': (
+            "🎉 <b>Отлично! Настроим вашу сделку #{tx_id}</b>\n\n"
+            "💫 <b>Сводка сделки:</b>\n"
+            "💰 Базовая сумма: ${amount}\n"
+            "🔒 Комиссия сервиса: ${fee}\n"
+            "💎 Итоговая сумма: ${total}\n"
+            "📝 За: {description}\n"
+            "🤝 Между: @{buyer} и @{seller}\n"
+            "⭐ Репутация продавца: {reputation}\n\n"
+            "🌟 <b>Следующий шаг:</b>\n"
+            "Выберите сеть для оплаты ниже. Подсказка:\n\n"
+            "💡 <b>Краткий гид:</b>\n"
+            "• BEP20: Самые низкие комиссии\n"
+            "• ERC20: Самая надёжная\n"
+            "• Optimism: Быстро и дёшево\n"
+            "• Arbitrum: Сверхбыстро"
+        ),
+        'new_error': (
+            "Ой! Что-то пошло не так. 😅\n"
+            "Давайте попробуем ещё раз! Нужна помощь? Напишите /help"
+        ),
+        'deal_not_found_answer': "Не могу найти эту сделку! Давайте начнём новую.",
+        'buyer_only_network_answer': "Выбрать сеть оплаты может только покупатель! 👀",
+        'network_closed_answer': "Для этой сделки сеть оплаты уже выбирать поздно! ✅",
+        'button_invalid_answer': "Эта кнопка больше не действует. Ваши сделки — в /status.",
+        'payment_instructions': (
+            "🎉 *Отлично! Сделка #{tx_id} готова!*\n\n"
+            "💰 *Сумма к отправке:* ${total}\n"
+            "🔗 *Сеть:* {chain}\n"
+            "⚡️ *Скорость:* {speed}\n"
+            "💸 *Комиссия сети:* {gas_fee}\n\n"
+            "📤 *Отправьте платёж на:*\n"
+            "`{wallet}`\n\n"
+            "🎯 *Что дальше:*\n"
+            "1. Отправьте ${total} на адрес выше\n"
+            "2. После отправки напишите: `/ok {tx_id}`\n"
+            "3. Я всё проверю и помогу завершить сделку!\n\n"
+            "💡 Нужна помощь? Напишите /help"
+        ),
+        'network_chosen_answer': "Отличный выбор! Переходим к оплате! 🚀",
+        'deal_started_group': (
+            "🎉 *Новая сделка начата!*\n\n"
+            "💰 Сумма: ${total}\n"
+            "🤝 Покупатель: @{buyer}\n"
+            "🤝 Продавец: @{seller}\n"
+            "🔗 Сеть: {chain}\n\n"
+            "⏳ Ожидаем оплату...\n"
+            "Я буду держать всех в курсе! 👀"
+        ),
+        'ok_usage': (
+            "❌ *Неверный формат*\n\n"
+            "Напишите так:\n"
+            "`/ok 123`"
+        ),
+        'ok_not_found': "❌ Сделка не найдена",
+        'ok_buyer_only': "❌ Подтвердить может только покупатель",
+        'ok_already_complete': "✅ Эта сделка уже завершена",
+        'ok_expired': "⌛ Срок этой сделки истёк без оплаты, её нельзя завершить",
+        'ok_done': "✅ Сделка завершена!",
+        'deal_complete_group': (
+            "✅ *Сделка #{tx_id} завершена!*\n\n"
+            "💰 Сумма: ${total}\n"
+            "👤 Покупатель: @{buyer}\n"
+            "👤 Продавец: @{seller}\n\n"
+            "🎉 Все довольны!"
+        ),
+        'payment_confirmed_group': (
+            "💸 *Оплата по сделке #{tx_id} получена*\n\n"
+            "💰 Сумма: ${total}\n"
+            "🔗 Сеть: {chain}\n\n"
+            "Продавец, передайте товар. Покупатель, напишите `/ok {tx_id}` после получения."
+        ),
+        'payment_reminder_group': (
+            "⏰ *Сделка #{tx_id} всё ещё ждёт оплаты*\n\n"
+            "💰 Сумма: ${total}\n"
+            "👤 Покупатель: @{buyer}\n\n"
+            "Выберите сеть и отправьте оплату в течение {hours} ч, иначе сделка истечёт."
+        ),
+        'deal_expired_group': (
+            "⌛ *Сделка #{tx_id} истекла*\n\n"
+            "Оплата не поступила вовремя. Создайте новую сделку через /new, если ещё хотите торговать."
+        ),
+        'status_group_header': "🔍 *Последние сделки*\n\n",
+        'status_group_deal': (
+            "💫 *Сделка #{tx_id}*\n"
+            "💰 Сумма: ${total}\n"
+            "👤 Покупатель: @{buyer}\n"
+            "👤 Продавец: @{seller}\n"
+            "📊 Статус: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_user_header': "🔍 *Ваши сделки*\n\n",
+        'status_as_buyer': "💳 *Как покупатель:*\n",
+        'status_buyer_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Сумма: ${total}\n"
+            "👤 Продавец: @{seller}\n"
+            "📊 Статус: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_as_seller': "\n🏦 *Как продавец:*\n",
+        'status_seller_deal': (
+            "📝 *#{tx_id}*\n"
+            "💰 Сумма: ${total}\n"
+            "👤 Покупатель: @{buyer}\n"
+            "📊 Статус: {status}\n"
+            "➖➖➖➖➖➖➖➖\n"
+        ),
+        'status_newer': "⬅️ Новее",
+        'status_older': "Старее ➡️",
+        'status_empty_group': "В этой группе нет активных сделок",
+        'status_empty_private': (
+            "Сделки не найдены.\n"
+            "Создайте новую сделку командой /new в групповом чате"
+        ),
+        'status_no_more_answer': "Больше сделок нет",
+        'deal_status_awaiting_payment': "ожидает оплаты",
+        'deal_status_payment_confirmed': "оплата получена",
+        'deal_status_completed': "завершена",
+        'deal_status_cancelled': "отменена",
+        'deal_status_expired': "истекла",
+        'seller_reputation': "завершено сделок: {deals}, оборот ${volume}, проиграно споров: {disputes_lost}",
+        'seller_reputation_new': "новый продавец, завершённых сделок пока нет",
+        'profile': (
+            "👤 *Репутация @{username}*\n\n"
+            "🏦 Как продавец: {seller_deals} сделок, ${seller_volume}\n"
+            "💳 Как покупатель: {buyer_deals} сделок, ${buyer_volume}\n"
+            "⚖️ Открытые споры: {disputes_open}\n"
+            "❌ Проигранные споры: {disputes_lost}\n"
+            "🕒 Последняя активность: {last_active}"
+        ),
+        'profile_unknown': "Я пока не знаю @{username}.",
+        'profile_never': "никогда",
+        'help': (
+            "👋 *Привет! Нужна помощь? Я здесь!*\n\n"
+            "🚀 *Простые команды:*\n"
+            "• `/new` - Начать новую сделку\n"
+            "• `/status` - Посмотреть ваши сделки\n"
+            "• `/ok` - Подтвердить, что всё в порядке\n"
+            "• `/profile` - Репутация пользователя\n"
+            "• `/help` - Получить помощь\n\n"
+            "💰 *Комиссия сервиса:*\n"
+            "• Фиксированно ${fee} за сделку\n"
+            "• Автоматически добавляется к сумме\n"
+            "• Обеспечивает безопасный эскроу\n\n"
+            "💡 *Быстрый пример:*\n"
+            "1. Напишите `/new @seller 100 Product`\n"
+            "2. Выберите сеть оплаты\n"
+            "3. Отправьте платёж (сумма + комиссия ${fee})\n"
+            "4. Напишите `/ok`, когда закончите\n\n"
+            "🤝 *Я помогу на каждом шаге!*\n"
+            "Начните сделку, и я помогу вам обоим остаться в безопасности! 😊"
+        ),
+        'error': "❌ Что-то пошло не так",
+        'error_answer': "Ой! Что-то пошло не так. Давайте попробуем ещё раз! 😅",
+    },
+}
+
+# (character, replacement) pairs each parse mode needs escaped in values;
+# legacy Markdown only treats _ * ` [ as markup. Chained str.replace calls
+# cost far less than a regex or translate table for short values.
+_ESCAPES = {
+    'Markdown': tuple((char, '\\' + char) for char in '_*`['),
+    'HTML': (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')),
+    None: (),
+}
+
+
+def _escape(value, replacements):
+    for char, replacement in replacements:
+        if char in value:
+            value = value.replace(char, replacement)
+    return value
+
+
+# Filled in once at compile time rather than on every render
+STATIC_FIELDS = {
+    'fee': f"{Decimal(str(Config.FEE_AMOUNT)):.2f}",
+    'bot_username': Config.BOT_USERNAME,
+}
+
+_formatter = Formatter()
+
+
+class Template:
+    """One compiled catalog message.
+
+    The source is split once into literal chunks, with the static fields
+    already filled in and escaped, and slots for the fields render() fills.
+    text is the whole message when it has no fields left.
+    """
+
+    __slots__ = ('text', 'fields', 'parse_mode', '_parts', '_slots', '_replacements')
+
+    def __init__(self, source, parse_mode):
+        replacements = _ESCAPES[parse_mode]
+        parts = []
+        slots = []
+        literal_run = []
+        for literal, field, spec, conversion in _formatter.parse(source):
+            literal_run.append(literal)
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Format specs are not supported in templates: {source!r}")
+            if field in STATIC_FIELDS:
+                literal_run.append(_escape(STATIC_FIELDS[field], replacements))
+            else:
+                parts.append(''.join(literal_run))
+                literal_run = []
+                slots.append((len(parts), field))
+                parts.append(None)
+        parts.append(''.join(literal_run))
+
+        self.parse_mode = parse_mode
+        self.fields = frozenset(field for _, field in slots)
+        self.text = parts[0] if not slots else None
+        self._parts = parts
+        self._slots = tuple(slots)
+        self._replacements = replacements
+
+    def render(self, values):
+        if not self._slots:
+            return self.text
+        parts = self._parts.copy()
+        replacements = self._replacements
+        for index, field in self._slots:
+            value = values[field]
+            # Numbers never contain markup characters
+            parts[index] = _escape(value, replacements) if isinstance(value, str) else str(value)
+        return ''.join(parts)
+
+
+def _compile():
+    """Compile every template, checking each language matches English"""
+    missing = set(Config.SUPPORTED_LANGUAGES) - set(CATALOG)
+    if missing:
+        raise ValueError(f"No message catalog for languages: {sorted(missing)}")
+
+    templates = {}
+    for lang, messages in CATALOG.items():
+        if set(messages) != set(PARSE_MODES):
+            diff = sorted(set(messages) ^ set(PARSE_MODES))
+            raise ValueError(f"Catalog '{lang}' keys differ from PARSE_MODES: {diff}")
+        templates[lang] = {
+            key: Template(source, PARSE_MODES[key]) for key, source in messages.items()
+        }
+
+    reference = templates[DEFAULT_LANGUAGE]
+    for lang, compiled in templates.items():
+        for key, template in compiled.items():
+            if template.fields != reference[key].fields:
+                raise ValueError(
+                    f"Message '{key}' in '{lang}' has fields {sorted(template.fields)}, "
+                    f"expected {sorted(reference[key].fields)}"
+                )
+    return templates
+
+
+_templates = _compile()
+
+
+def language(code):
+    """Return code if the catalog has it, else the default language"""
+    return code if code in _templates else DEFAULT_LANGUAGE
+
+
+def render(lang, key, **values):
+    """Return (text, parse_mode) for a message, with values escaped for its markup"""
+    template = _templates[language(lang)][key]
+    return template.render(values), template.parse_mode
+
+
+def text(lang, key, **values):
+    """Return just the text of a message, for callback answers and buttons"""
+    return _templates[language(lang)][key].render(values)
+
+
+def deal_status(lang, status):
+    """Translated label of a deal status, or the raw status if unknown"""
+    template = _templates[language(lang)].get(f"deal_status_{status}")
+    return template.text if template else status
+
+
+# Static keyboards
+
+LANGUAGE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton(f"🌐 {name}", callback_data=f"lang_{code}")]
+    for code, name in Config.SUPPORTED_LANGUAGES.items()
+])
+
+
+def _chain_label(chain, info):
+    speed_emoji = "⚡️" if "1s" in info['speed'] else "🚀"
+    return f"{info['icon']} {chain} • {speed_emoji} {info['speed']} • 💰 {info['gas_fee']}"
+
+
+# Button label per network, built once
+_CHAIN_LABELS = tuple(
+    (chain, _chain_label(chain, info)) for chain, info in Config.BLOCKCHAIN_INFO.items()
+)
+
+
+def chain_keyboard(tx_id, buyer_telegram_id):
+    """Payment network keyboard for one deal, pressable only by its buyer"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            label,
+            callback_data=callback_data.encode(
+                callback_data.ACTION_CHAIN, chain, tx_id, buyer_telegram_id
+            )
+        )]
+        for chain, label in _CHAIN_LABELS
+    ])
@@ -0,0 +1,420 @@
+"""Process metrics in Prometheus text exposition format.
+
+Counters and histograms are sharded per thread: each thread updates its own
+cells without taking a lock, and a scrape sums the shards. The only lock is
+taken the first time a thread touches a metric, so recording a value costs
+a dict lookup and a few additions. Gauges that describe some other object
+(pool size, queue depth), and counters some other object already keeps,
+are read from a callback at scrape time instead of being kept up to date.
+
+    from metrics import registry
+    requests_total = registry.counter('requests_total', 'Requests handled', ['kind'])
+    requests_total.labels('start').inc()
+    print(registry.render())
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+from telegram.request import HTTPXRequest
+
+from logger import logger
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Shards:
+    """One mutable cell per thread; only creating a cell takes the lock"""
+
+    __slots__ = ('_factory', '_cells', '_lock')
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def cell(self):
+        ident = threading.get_ident()
+        cell = self._cells.get(ident)
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(ident, self._factory())
+        return cell
+
+    def cells(self):
+        # Cells of threads that have exited are kept, so totals never go back
+        with self._lock:
+            return list(self._cells.values())
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(lambda: [0])
+
+    def inc(self, amount=1):
+        self._shards.cell()[0] += amount
+
+    def value(self):
+        return sum(cell[0] for cell in self._shards.cells())
+
+
+class _HistogramChild:
+    __slots__ = ('_shards', '_buckets')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One count per bucket plus +Inf, then the running sum
+        size = len(buckets) + 1
+        self._shards = _Shards(lambda: [0] * size + [0.0])
+
+    def observe(self, value):
+        cell = self._shards.cell()
+        cell[bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        """Context manager observing the seconds spent inside it"""
+        return _Timer(self)
+
+    def snapshot(self):
+        """Return (cumulative bucket counts including +Inf, sum)"""
+        size = len(self._buckets) + 1
+        counts = [0] * size
+        total = 0.0
+        for cell in self._shards.cells():
+            for index in range(size):
+                counts[index] += cell[index]
+            total += cell[-1]
+        for index in range(1, size):
+            counts[index] += counts[index - 1]
+        return counts, total
+
+
+class _Timer:
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for these label values; keep it to skip the lookup"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+    def _samples(self):
+        for values, child in self._items():
+            yield f'{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value())}'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled.observe(value)
+
+    def time(self):
+        return self._unlabelled.time()
+
+    def _samples(self):
+        bounds = self.buckets + (float('inf'),)
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            for bound, count in zip(bounds, counts):
+                labels = _label_text(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f'{self.name}_bucket{labels} {count}'
+            labels = _label_text(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {counts[-1]}'
+
+
+class GaugeCallback(_Metric):
+    """Gauge read at scrape time from callback() -> {label values: number}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self._callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def _samples(self):
+        try:
+            values = self._callback()
+        except Exception as e:
+            logger.error(f"Error reading gauge {self.name}: {str(e)}")
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            yield f'{self.name}{_label_text(self.labelnames, label_values)} {_format_value(value)}'
+
+
+class CounterCallback(GaugeCallback):
+    """Counter read at scrape time, for totals some other object already keeps"""
+
+    kind = 'counter'
+
+
+class Registry:
+    """Named metrics, rendered together for a scrape"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, callback, labelnames=()):
+        metric = GaugeCallback(name, documentation, callback, labelnames)
+        with self._lock:
+            # A callback gauge describes one live object; the newest wins
+            self._metrics[name] = metric
+        return metric
+
+    def counter_callback(self, name, documentation, callback, labelnames=()):
+        metric = CounterCallback(name, documentation, callback, labelnames)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self):
+        """Return every metric in text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Handlers
+handler_seconds = registry.histogram(
+    'bot_handler_duration_seconds', 'Time spent in each update handler', ['handler']
+)
+handler_errors = registry.counter(
+    'bot_handler_errors_total', 'Exceptions raised out of each update handler', ['handler']
+)
+update_errors = registry.counter(
+    'bot_update_errors_total', 'Updates that reached the error handler'
+)
+
+# Telegram Bot API
+api_seconds = registry.histogram(
+    'telegram_api_request_duration_seconds', 'Bot API request latency', ['method']
+)
+api_responses = registry.counter(
+    'telegram_api_responses_total', 'Bot API responses by HTTP status', ['method', 'status']
+)
+api_failures = registry.counter(
+    'telegram_api_request_failures_total', 'Bot API requests that got no response', ['method']
+)
+
+# Database
+sql_seconds = registry.histogram(
+    'db_statement_duration_seconds', 'SQL statement execution time', ['statement'], SQL_BUCKETS
+)
+sql_errors = registry.counter(
+    'db_statement_errors_total', 'SQL statements that raised', ['statement']
+)
+pool_checkouts = registry.counter(
+    'db_pool_checkouts_total', 'Connections checked out of the pool'
+)
+pool_connects = registry.counter(
+    'db_pool_connects_total', 'New database connections opened by the pool'
+)
+pool_invalidations = registry.counter(
+    'db_pool_invalidations_total', 'Pooled connections invalidated'
+)
+
+
+def instrument_handler(callback):
+    """Wrap a handler coroutine to record its latency and escaping errors"""
+    name = getattr(callback, '__name__', type(callback).__name__)
+    seconds = handler_seconds.labels(name)
+    errors = handler_errors.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records latency and status of every Bot API call"""
+
+    __slots__ = ()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            api_failures.labels(api_method).inc()
+            raise
+        finally:
+            api_seconds.labels(api_method).observe(time.perf_counter() - started)
+        api_responses.labels(api_method, code).inc()
+        return code, payload
+
+
+_STATEMENTS = frozenset(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK'))
+
+
+def _statement_kind(statement):
+    head = statement.lstrip()[:8].split(None, 1)
+    kind = head[0].upper() if head else ''
+    return kind if kind in _STATEMENTS else 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    sql_seconds.labels(_statement_kind(statement)).observe(time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    stack = connection.info.get('metrics_started') if connection is not None else None
+    if stack:
+        stack.pop()
+    sql_errors.labels(_statement_kind(exception_context.statement or '')).inc()
+
+
+def instrument_engine(engine):
+    """Record statement timings and pool activity for a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    pool = engine.pool
+    event.listen(pool, 'checkout', lambda *args: pool_checkouts.inc())
+    event.listen(pool, 'connect', lambda *args: pool_connects.inc())
+    event.listen(pool, 'invalidate', lambda *args: pool_invalidations.inc())
+
+    # QueuePool counts; other pool classes lack some of these methods
+    for name, documentation in (
+        ('size', 'Configured pool size'),
+        ('checkedout', 'Connections currently checked out'),
+        ('checkedin', 'Idle connections in the pool'),
+        ('overflow', 'Connections open beyond pool_size (negative while the pool fills)'),
+    ):
+        reader = getattr(pool, name, None)
+        if reader is not None:
+            registry.gauge_callback(f'db_pool_{name}', documentation, reader)
@@ -0,0 +1,44 @@
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from app import db, get_database_url
+import models  # noqa: F401 - registers the tables on db.metadata
+
+config = context.config
+target_metadata = db.metadata
+
+
+def run_migrations_offline():
+    """Emit the migration SQL without connecting to the database"""
+    context.configure(
+        url=get_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations on the connection handed over by app.upgrade_database,
+    or on a fresh one when invoked from the alembic command line"""
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    engine = create_engine(get_database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""Initial schema, as previously created by db.create_all()
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.String(100), nullable=False, unique=True),
+        sa.Column('username', sa.String(100), nullable=True),
+        sa.Column('language', sa.String(10), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'escrow_transactions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('buyer_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('seller_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('amount', sa.Numeric(10, 2), nullable=False),
+        sa.Column('description', sa.String(500), nullable=False),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('blockchain', sa.String(50), nullable=True),
+        sa.Column('buyer_wallet', sa.String(100), nullable=True),
+        sa.Column('seller_wallet', sa.String(100), nullable=True),
+        sa.Column('fee_amount', sa.Numeric(10, 2), nullable=True),
+        sa.Column('fee_paid', sa.Boolean(), nullable=True),
+        sa.Column('chat_id', sa.String(100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('payment_confirmed_at', sa.DateTime(), nullable=True),
+        sa.Column('account_provided_at', sa.DateTime(), nullable=True),
+        sa.Column('account_verified_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'disputes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('transaction_id', sa.Integer(), sa.ForeignKey('escrow_transactions.id'), nullable=False),
+        sa.Column('created_by_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('reason', sa.String(500), nullable=False),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+        sa.Column('resolution_notes', sa.String(500), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('disputes')
+    op.drop_table('escrow_transactions')
+    op.drop_table('users')
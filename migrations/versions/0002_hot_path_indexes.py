@@ -0,0 +1,46 @@
+"""Indexes for the /status, per-user and seller-by-username queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Group /status: filter by chat, newest first
+    op.create_index(
+        'ix_escrow_transactions_chat_id_created_at',
+        'escrow_transactions', ['chat_id', 'created_at']
+    )
+    # Private /status: deals per party, newest first
+    op.create_index(
+        'ix_escrow_transactions_buyer_id_created_at',
+        'escrow_transactions', ['buyer_id', 'created_at']
+    )
+    op.create_index(
+        'ix_escrow_transactions_seller_id_created_at',
+        'escrow_transactions', ['seller_id', 'created_at']
+    )
+    op.create_index('ix_escrow_transactions_status', 'escrow_transactions', ['status'])
+    op.create_index('ix_disputes_transaction_id', 'disputes', ['transaction_id'])
+    # /new resolves the seller with a case-insensitive username match
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')])
+
+
+def downgrade():
+    op.drop_index('ix_users_username_lower', table_name='users')
+    op.drop_index('ix_disputes_transaction_id', table_name='disputes')
+    op.drop_index('ix_escrow_transactions_status', table_name='escrow_transactions')
+    op.drop_index('ix_escrow_transactions_seller_id_created_at', table_name='escrow_transactions')
+    op.drop_index('ix_escrow_transactions_buyer_id_created_at', table_name='escrow_transactions')
+    op.drop_index('ix_escrow_transactions_chat_id_created_at', table_name='escrow_transactions')
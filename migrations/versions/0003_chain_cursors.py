@@ -0,0 +1,29 @@
+"""Per-chain block cursors for the payment watcher
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'chain_cursors',
+        sa.Column('chain', sa.String(50), primary_key=True),
+        sa.Column('block_number', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('chain_cursors')
@@ -0,0 +1,48 @@
+"""Due and expiry times for the deal scheduler
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Deals already waiting for payment get this long from the upgrade to pay
+LEGACY_GRACE = timedelta(days=1)
+
+
+def upgrade():
+    op.add_column('escrow_transactions', sa.Column('due_at', sa.DateTime(), nullable=True))
+    op.add_column('escrow_transactions', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_escrow_transactions_due_at', 'escrow_transactions', ['due_at'])
+
+    deadline = datetime.utcnow() + LEGACY_GRACE
+    deals = sa.table(
+        'escrow_transactions',
+        sa.column('status', sa.String),
+        sa.column('due_at', sa.DateTime),
+        sa.column('expires_at', sa.DateTime),
+    )
+    op.execute(
+        deals.update()
+        .where(deals.c.status == 'awaiting_payment')
+        .values(due_at=deadline, expires_at=deadline)
+    )
+
+
+def downgrade():
+    op.drop_index('ix_escrow_transactions_due_at', table_name='escrow_transactions')
+    # Batch mode so SQLite can drop columns too
+    with op.batch_alter_table('escrow_transactions') as batch_op:
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('due_at')
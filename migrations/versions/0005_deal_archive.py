@@ -0,0 +1,80 @@
+"""Archive tables for closed deals and their disputes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ids are copied from the live tables, never generated here
+    op.create_table(
+        'escrow_transactions_archive',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('buyer_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('seller_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('amount', sa.Numeric(10, 2), nullable=False),
+        sa.Column('description', sa.String(500), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('blockchain', sa.String(50), nullable=True),
+        sa.Column('buyer_wallet', sa.String(100), nullable=True),
+        sa.Column('seller_wallet', sa.String(100), nullable=True),
+        sa.Column('fee_amount', sa.Numeric(10, 2), nullable=True),
+        sa.Column('fee_paid', sa.Boolean(), nullable=True),
+        sa.Column('chat_id', sa.String(100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('payment_confirmed_at', sa.DateTime(), nullable=True),
+        sa.Column('account_provided_at', sa.DateTime(), nullable=True),
+        sa.Column('account_verified_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'ix_escrow_transactions_archive_chat_id_created_at',
+        'escrow_transactions_archive', ['chat_id', 'created_at']
+    )
+    op.create_index(
+        'ix_escrow_transactions_archive_buyer_id_created_at',
+        'escrow_transactions_archive', ['buyer_id', 'created_at']
+    )
+    op.create_index(
+        'ix_escrow_transactions_archive_seller_id_created_at',
+        'escrow_transactions_archive', ['seller_id', 'created_at']
+    )
+
+    op.create_table(
+        'disputes_archive',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('transaction_id', sa.Integer(),
+                  sa.ForeignKey('escrow_transactions_archive.id'), nullable=False),
+        sa.Column('created_by_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('reason', sa.String(500), nullable=False),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+        sa.Column('resolution_notes', sa.String(500), nullable=True),
+    )
+    op.create_index('ix_disputes_archive_transaction_id', 'disputes_archive', ['transaction_id'])
+
+
+def downgrade():
+    # Archived deals are lost with the tables
+    op.drop_index('ix_disputes_archive_transaction_id', table_name='disputes_archive')
+    op.drop_table('disputes_archive')
+    op.drop_index('ix_escrow_transactions_archive_seller_id_created_at',
+                  table_name='escrow_transactions_archive')
+    op.drop_index('ix_escrow_transactions_archive_buyer_id_created_at',
+                  table_name='escrow_transactions_archive')
+    op.drop_index('ix_escrow_transactions_archive_chat_id_created_at',
+                  table_name='escrow_transactions_archive')
+    op.drop_table('escrow_transactions_archive')
@@ -0,0 +1,35 @@
+"""Per-user reputation counters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled from the deal history by the bot's first rebuild after startup
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('buyer_deals', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('buyer_volume', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('seller_deals', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('seller_volume', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('disputes_open', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('disputes_lost', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_active_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
@@ -1,5 +1,6 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 from app import db
 
 class User(db.Model):
@@ -11,6 +12,11 @@ class User(db.Model):
     language = db.Column(db.String(10), default='en')  # Language preference
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Sellers are looked up by username when a deal is created
+    __table_args__ = (
+        db.Index('ix_users_username_lower', func.lower(username)),
+    )
+
     # Relationships
     buyer_transactions = db.relationship('EscrowTransaction', backref='buyer', foreign_keys='EscrowTransaction.buyer_id')
     seller_transactions = db.relationship('EscrowTransaction', backref='seller', foreign_keys='EscrowTransaction.seller_id')
@@ -35,21 +41,112 @@ class EscrowTransaction(db.Model):
     payment_confirmed_at = db.Column(db.DateTime, nullable=True)
     account_provided_at = db.Column(db.DateTime, nullable=True)
     account_verified_at = db.Column(db.DateTime, nullable=True)
+    # Next time the scheduler must look at the deal (a reminder while
+    # due_at < expires_at, expiry after that); NULL once it is paid or closed
+    due_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    # Indexes for the /status and per-user deal lookups
+    __table_args__ = (
+        db.Index('ix_escrow_transactions_chat_id_created_at', 'chat_id', 'created_at'),
+        db.Index('ix_escrow_transactions_buyer_id_created_at', 'buyer_id', 'created_at'),
+        db.Index('ix_escrow_transactions_seller_id_created_at', 'seller_id', 'created_at'),
+        db.Index('ix_escrow_transactions_status', 'status'),
+        db.Index('ix_escrow_transactions_due_at', 'due_at'),
+    )
 
     # Relationship with disputes
     disputes = db.relationship('Dispute', backref='transaction', lazy=True)
 
+class ArchivedEscrowTransaction(db.Model):
+    __tablename__ = 'escrow_transactions_archive'
+
+    # Closed deals moved out of escrow_transactions by archive.py. Same
+    # columns and ids, minus the scheduler's due times.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    description = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    blockchain = db.Column(db.String(50), nullable=True)
+    buyer_wallet = db.Column(db.String(100), nullable=True)
+    seller_wallet = db.Column(db.String(100), nullable=True)
+    fee_amount = db.Column(db.Numeric(10, 2), nullable=True)
+    fee_paid = db.Column(db.Boolean, nullable=True)
+    chat_id = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    payment_confirmed_at = db.Column(db.DateTime, nullable=True)
+    account_provided_at = db.Column(db.DateTime, nullable=True)
+    account_verified_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=True)
+
+    # Only the /status lookups reach the archive
+    __table_args__ = (
+        db.Index('ix_escrow_transactions_archive_chat_id_created_at', 'chat_id', 'created_at'),
+        db.Index('ix_escrow_transactions_archive_buyer_id_created_at', 'buyer_id', 'created_at'),
+        db.Index('ix_escrow_transactions_archive_seller_id_created_at', 'seller_id', 'created_at'),
+    )
+
+    buyer = db.relationship('User', foreign_keys=[buyer_id])
+    seller = db.relationship('User', foreign_keys=[seller_id])
+    disputes = db.relationship('ArchivedDispute', backref='transaction', lazy=True)
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+
+    # Reputation counters, bumped in the same commit as each completed deal
+    # and rebuilt from the whole history by reputation.py (which is also
+    # what counts disputes, as the bot does not open or settle them).
+    # Volume is the base amount of completed deals, without the fee.
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    buyer_deals = db.Column(db.Integer, nullable=False, default=0)
+    buyer_volume = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    seller_deals = db.Column(db.Integer, nullable=False, default=0)
+    seller_volume = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    # Disputes raised against the user: still open, and upheld
+    disputes_open = db.Column(db.Integer, nullable=False, default=0)
+    disputes_lost = db.Column(db.Integer, nullable=False, default=0)
+    # When the user last completed a deal, on either side
+    last_active_at = db.Column(db.DateTime, nullable=True)
+
+class ChainCursor(db.Model):
+    __tablename__ = 'chain_cursors'
+
+    # Last block the payment watcher has fully scanned on each chain
+    chain = db.Column(db.String(50), primary_key=True)
+    block_number = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Dispute(db.Model):
     __tablename__ = 'disputes'
 
     id = db.Column(db.Integer, primary_key=True)
-    transaction_id = db.Column(db.Integer, db.ForeignKey('escrow_transactions.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('escrow_transactions.id'), nullable=False, index=True)
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     reason = db.Column(db.String(500), nullable=False)
-    status = db.Column(db.String(20), default='open')  # open, resolved
+    status = db.Column(db.String(20), default='open')  # open, resolved, upheld (the other party lost)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolved_at = db.Column(db.DateTime, nullable=True)
     resolution_notes = db.Column(db.String(500), nullable=True)
 
     # Relationship with user who created the dispute
     created_by = db.relationship('User', backref='disputes')
+
+class ArchivedDispute(db.Model):
+    __tablename__ = 'disputes_archive'
+
+    # Disputes of archived deals, moved in the same transaction as the deal
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    transaction_id = db.Column(
+        db.Integer, db.ForeignKey('escrow_transactions_archive.id'), nullable=False, index=True
+    )
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    reason = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    resolution_notes = db.Column(db.String(500), nullable=True)
+
+    created_by = db.relationship('User')
@@ -0,0 +1,264 @@
+"""Rate-limited outbound message queue.
+
+Handlers call send() and return straight away; background workers deliver
+the messages while staying inside Telegram's limits: about one message per
+second per private chat, 20 per minute per group and 30 per second overall.
+A 429 answer pauses that chat for the retry_after Telegram asks for, and
+group notifications that pile up while a group is throttled are merged
+into one message.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+import metrics
+from config import Config
+from logger import logger
+
+# Telegram rejects longer messages, so never coalesce past this
+MAX_MESSAGE_LENGTH = 4096
+SEND_ATTEMPTS = 3
+
+send_latency_seconds = metrics.registry.histogram(
+    'bot_outbound_send_latency_seconds', 'Seconds from queueing a message to Telegram accepting it',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+outbound_messages = metrics.registry.counter(
+    'bot_outbound_messages_total', 'Outbound messages by what happened to them', ['result']
+)
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    __slots__ = ('text', 'kwargs', 'coalesce', 'enqueued_at', 'attempts')
+
+    def __init__(self, text, kwargs, coalesce):
+        self.text = text
+        self.kwargs = kwargs
+        self.coalesce = coalesce
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class _ChatQueue:
+    __slots__ = ('pending', 'bucket', 'blocked_until', 'busy', 'scheduled')
+
+    def __init__(self, bucket):
+        self.pending = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+        self.scheduled = False
+
+
+class OutboundScheduler:
+    """Per-chat queues drained by a few workers under token-bucket limits.
+
+    Messages to one chat are sent one at a time, in order; different chats
+    are sent in parallel. Only used from the bot's event loop.
+    """
+
+    def __init__(self, global_rate, chat_rate, group_rate, workers):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.workers = workers
+
+        self._bot = None
+        self._chats = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._tasks = []
+        # Messages queued and not yet sent or given up on
+        self.depth = 0
+
+    def start(self, bot):
+        """Start the sender workers on the running event loop"""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"outbound-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Outbound scheduler started with {self.workers} workers")
+
+    async def stop(self, timeout=10):
+        """Give queued messages up to timeout seconds to go out, then stop"""
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.depth:
+            logger.warning(f"Dropping {self.depth} unsent outbound messages")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, chat_id, text, coalesce=False, **kwargs):
+        """Queue a message for chat_id; extra kwargs go to bot.send_message.
+
+        With coalesce=True the text may be merged into a not-yet-sent
+        coalescable message for the same chat.
+        """
+        chat_id = int(chat_id)
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = _ChatQueue(self._new_bucket(chat_id))
+
+        if coalesce and queue.pending:
+            last = queue.pending[-1]
+            if (last.coalesce and last.kwargs == kwargs
+                    and len(last.text) + len(text) + 2 <= MAX_MESSAGE_LENGTH):
+                last.text = f"{last.text}\n\n{text}"
+                outbound_messages.labels('coalesced').inc()
+                return
+
+        queue.pending.append(OutboundMessage(text, kwargs, coalesce))
+        self.depth += 1
+        if not queue.busy and not queue.scheduled:
+            self._schedule(chat_id, queue)
+
+    def _new_bucket(self, chat_id):
+        if chat_id < 0:
+            # Groups: burst of a few, then 20 per minute
+            return TokenBucket(self.group_rate / 60, 3)
+        return TokenBucket(self.chat_rate, 1)
+
+    def _schedule(self, chat_id, queue):
+        now = time.monotonic()
+        ready_at = max(now + queue.bucket.delay(now), queue.blocked_until)
+        heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id))
+        queue.scheduled = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            now = time.monotonic()
+            if not self._heap or self._heap[0][0] > now:
+                if not self._heap:
+                    self._forget_idle_chats(now)
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_delay = self.global_bucket.delay(now)
+            if global_delay:
+                await asyncio.sleep(global_delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._heap)
+            queue = self._chats[chat_id]
+            queue.scheduled = False
+            if not queue.pending:
+                continue
+
+            self.global_bucket.consume(now)
+            queue.bucket.consume(now)
+            queue.busy = True
+            try:
+                await self._deliver(chat_id, queue)
+            finally:
+                queue.busy = False
+                if queue.pending:
+                    self._schedule(chat_id, queue)
+
+    async def _deliver(self, chat_id, queue):
+        message = queue.pending.popleft()
+        message.attempts += 1
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=message.text, **message.kwargs)
+        except RetryAfter as e:
+            # Put it back at the front and pause this chat as Telegram asked
+            queue.pending.appendleft(message)
+            queue.blocked_until = time.monotonic() + float(e.retry_after)
+            outbound_messages.labels('retried').inc()
+            logger.warning(f"Rate limited in chat {chat_id}, retrying in {e.retry_after}s")
+            return
+        except (TimedOut, NetworkError) as e:
+            if message.attempts < SEND_ATTEMPTS:
+                queue.pending.appendleft(message)
+                queue.blocked_until = time.monotonic() + message.attempts
+                outbound_messages.labels('retried').inc()
+                return
+            self._finish(message, failed=True)
+            logger.error(f"Giving up on message to {chat_id}: {str(e)}")
+            return
+        except Exception as e:
+            self._finish(message, failed=True)
+            logger.error(f"Error sending message to {chat_id}: {str(e)}")
+            return
+
+        queue.blocked_until = 0.0
+        self._finish(message)
+
+    def _forget_idle_chats(self, now):
+        """Drop chats with nothing queued whose bucket has refilled"""
+        idle = [
+            chat_id for chat_id, queue in self._chats.items()
+            if not (queue.pending or queue.busy or queue.scheduled)
+            and queue.blocked_until <= now and queue.bucket.full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _finish(self, message, failed=False):
+        self.depth -= 1
+        if failed:
+            outbound_messages.labels('failed').inc()
+        else:
+            outbound_messages.labels('sent').inc()
+            send_latency_seconds.observe(time.monotonic() - message.enqueued_at)
+
+
+scheduler = OutboundScheduler(
+    global_rate=Config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=Config.OUTBOUND_CHAT_RATE,
+    group_rate=Config.OUTBOUND_GROUP_RATE,
+    workers=Config.OUTBOUND_WORKERS
+)
+
+metrics.registry.gauge_callback(
+    'bot_outbound_queue_depth', 'Messages waiting in the outbound queue',
+    lambda: scheduler.depth
+)
+
+
+def send(chat_id, text, coalesce=False, **kwargs):
+    """Queue a message on the shared scheduler"""
+    scheduler.send(chat_id, text, coalesce=coalesce, **kwargs)
@@ -0,0 +1,274 @@
+"""On-chain payment watcher.
+
+One scanner task per chain with an RPC URL in Config.PAYMENT_CHAINS. Each
+cycle asks the node for its head block, then fetches the USDT Transfer
+logs addressed to our wallet for every block since the chain's cursor, as
+eth_getLogs calls packed into one JSON-RPC batch request. Transfers are
+matched by exact amount against an in-memory index of the deals awaiting
+payment, which is rebuilt from one query per cycle rather than polled per
+deal, and matched deals are confirmed in bulk together with the new
+cursor. The cost of a cycle is two HTTP requests per chain however many
+deals are open.
+
+Deals with the same chain and total are paid off oldest first. A
+transfer that matches nothing is retried for a few cycles, in case its
+deal picked the network just before it arrived, then logged and dropped.
+"""
+import asyncio
+import itertools
+import time
+from collections import defaultdict, deque
+from decimal import Decimal
+
+import httpx
+
+import messages
+import metrics
+import outbound
+import repository
+from config import Config
+from logger import logger
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+# Cycles an unmatched transfer is kept for another try
+UNMATCHED_RETRIES = 3
+
+rpc_requests = metrics.registry.counter(
+    'payments_rpc_requests_total', 'JSON-RPC HTTP requests sent by the payment watcher', ['chain']
+)
+payments_confirmed = metrics.registry.counter(
+    'payments_confirmed_total', 'Deals confirmed paid by the payment watcher', ['chain']
+)
+
+
+class RpcError(Exception):
+    """The node answered a JSON-RPC call with an error"""
+
+
+class JsonRpcClient:
+    """Minimal JSON-RPC 2.0 client that sends calls in batches"""
+
+    def __init__(self, url, transport=None, timeout=20):
+        self.url = url
+        self._client = httpx.AsyncClient(transport=transport, timeout=timeout)
+        self._ids = itertools.count(1)
+
+    async def batch(self, calls):
+        """Send [(method, params), ...] in one request; return the results in order"""
+        requests = [
+            {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+            for method, params in calls
+        ]
+        response = await self._client.post(self.url, json=requests)
+        response.raise_for_status()
+        payload = response.json()
+        if not isinstance(payload, list):
+            # Some nodes answer a rejected batch with a single error object
+            raise RpcError(payload.get('error') if isinstance(payload, dict) else payload)
+
+        answers = {item.get('id'): item for item in payload}
+        results = []
+        for request in requests:
+            answer = answers.get(request['id'])
+            if answer is None:
+                raise RpcError(f"No answer to {request['method']}")
+            if answer.get('error'):
+                raise RpcError(f"{request['method']}: {answer['error']}")
+            results.append(answer.get('result'))
+        return results
+
+    async def call(self, method, params):
+        return (await self.batch([(method, params)]))[0]
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def to_units(amount, decimals):
+    """Decimal amount in token units, e.g. 10.50 with 6 decimals -> 10500000"""
+    return int(Decimal(amount).scaleb(decimals))
+
+
+class PaymentIndex:
+    """Deals awaiting payment, keyed by (chain, total in token units)"""
+
+    def __init__(self, chains):
+        self.chains = chains
+        self.refreshed_at = 0.0
+        self._deals = {}
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, max_age=0.0):
+        """Rebuild from the database unless it was rebuilt in the last max_age seconds"""
+        async with self._lock:
+            if time.monotonic() - self.refreshed_at < max_age:
+                return
+            deals = defaultdict(deque)
+            for tx_id, chain, total in await repository.awaiting_payment_deals():
+                settings = self.chains.get(chain)
+                if settings is not None:
+                    deals[(chain, to_units(total, settings['decimals']))].append(tx_id)
+            self._deals = deals
+            self.refreshed_at = time.monotonic()
+
+    def match(self, chain, value):
+        """Take the oldest deal on chain owed exactly value, or None"""
+        waiting = self._deals.get((chain, value))
+        return waiting.popleft() if waiting else None
+
+    def __len__(self):
+        return sum(len(waiting) for waiting in self._deals.values())
+
+
+class ChainScanner:
+    """Scans one chain's transfers to our wallet and confirms paid deals"""
+
+    def __init__(self, chain, settings, wallet, index, client):
+        self.chain = chain
+        self.token = settings['token']
+        self.confirmations = settings['confirmations']
+        self.index = index
+        self.client = client
+        self.cursor = None
+        # Transfer logs to our wallet, topic-encoded as a 32-byte address
+        self.wallet_topic = '0x' + wallet.lower().removeprefix('0x').rjust(64, '0')
+        self._unmatched = {}
+
+    async def run(self):
+        while True:
+            try:
+                # Catch up without sleeping while far behind the head
+                while await self.scan():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error scanning {self.chain} for payments: {str(e)}")
+            await asyncio.sleep(Config.PAYMENT_POLL_INTERVAL)
+
+    async def scan(self):
+        """Scan the next blocks; return True if more are already waiting"""
+        head = int(await self._call('eth_blockNumber', []), 16) - self.confirmations
+        if self.cursor is None:
+            self.cursor = await repository.get_chain_cursor(self.chain)
+            if self.cursor is None:
+                # First run on this chain: earlier payments were confirmed by hand
+                logger.info("Starting %s payment scan at block %s", self.chain, head)
+                await repository.record_payment_scan(self.chain, head, [])
+                self.cursor = head
+                return False
+        if head <= self.cursor:
+            return False
+
+        await self.index.refresh(Config.PAYMENT_POLL_INTERVAL / 2)
+        ranges = []
+        start = self.cursor + 1
+        while start <= head and len(ranges) < Config.PAYMENT_BATCH_SIZE:
+            end = min(start + Config.PAYMENT_BLOCK_RANGE - 1, head)
+            ranges.append((start, end))
+            start = end + 1
+        results = await self._batch([
+            ('eth_getLogs', [{
+                'fromBlock': hex(first),
+                'toBlock': hex(last),
+                'address': self.token,
+                'topics': [TRANSFER_TOPIC, None, self.wallet_topic],
+            }])
+            for first, last in ranges
+        ])
+
+        for logs in results:
+            for log in logs or ():
+                if not log.get('removed'):
+                    key = (log['transactionHash'], log['logIndex'])
+                    self._unmatched.setdefault(key, [log, UNMATCHED_RETRIES])
+
+        tx_ids = self._match()
+        scanned_to = ranges[-1][1]
+        confirmed = await repository.record_payment_scan(self.chain, scanned_to, tx_ids)
+        self.cursor = scanned_to
+        if confirmed:
+            payments_confirmed.labels(self.chain).inc(len(confirmed))
+            logger.info("Confirmed payment of deals %s on %s", [tx.id for tx in confirmed], self.chain)
+            _announce(confirmed)
+        return scanned_to < head
+
+    def _match(self):
+        tx_ids = []
+        for key, entry in list(self._unmatched.items()):
+            log, retries = entry
+            tx_id = self.index.match(self.chain, int(log['data'], 16))
+            if tx_id is not None:
+                tx_ids.append(tx_id)
+                del self._unmatched[key]
+            elif retries <= 1:
+                logger.warning(
+                    "Unmatched %s transfer of %s units in %s", self.chain, int(log['data'], 16), key[0]
+                )
+                del self._unmatched[key]
+            else:
+                entry[1] = retries - 1
+        return tx_ids
+
+    async def _call(self, method, params):
+        rpc_requests.labels(self.chain).inc()
+        return await self.client.call(method, params)
+
+    async def _batch(self, calls):
+        rpc_requests.labels(self.chain).inc()
+        return await self.client.batch(calls)
+
+
+def _announce(transactions):
+    # Late import: handlers imports half the bot
+    from handlers import invalidate_status_pages
+
+    for tx in transactions:
+        invalidate_status_pages(tx.chat_id, tx.buyer.telegram_id, tx.seller.telegram_id)
+        if tx.chat_id:
+            text, parse_mode = messages.render(
+                tx.buyer.language, 'payment_confirmed_group',
+                tx_id=tx.id, total=tx.amount + tx.fee_amount, chain=tx.blockchain
+            )
+            outbound.send(tx.chat_id, text, coalesce=True, parse_mode=parse_mode)
+
+
+class PaymentWatcher:
+    """Runs a ChainScanner for every chain with an RPC URL"""
+
+    def __init__(self, chains, wallets, transports=None):
+        """transports optionally maps a chain to the httpx transport to use"""
+        transports = transports or {}
+        self.chains = {chain: settings for chain, settings in chains.items() if settings.get('rpc_url')}
+        self.index = PaymentIndex(self.chains)
+        self.scanners = [
+            ChainScanner(
+                chain, settings, wallets[chain], self.index,
+                JsonRpcClient(settings['rpc_url'], transport=transports.get(chain))
+            )
+            for chain, settings in self.chains.items()
+        ]
+        self._tasks = []
+
+    def start(self):
+        if not self.scanners:
+            logger.info("No RPC URLs configured; payments are confirmed with /ok only")
+            return
+        self._tasks = [
+            asyncio.create_task(scanner.run(), name=f'payments-{scanner.chain}')
+            for scanner in self.scanners
+        ]
+        logger.info("Payment watcher started for %s", ', '.join(self.chains))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for scanner in self.scanners:
+            await scanner.client.close()
+
+
+watcher = PaymentWatcher(Config.PAYMENT_CHAINS, Config.NETWORK_WALLETS)
@@ -0,0 +1,877 @@
+"""Awaitable data access for the bot handlers.
+
+The handlers run on the python-telegram-bot event loop, so none of them may
+touch ``db.session`` directly. Every function here runs its query on a
+bounded thread pool, inside a fresh app context (and therefore a fresh
+scoped session that is removed when the call returns).
+"""
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import cache, partial
+
+from sqlalchemy import (
+    bindparam, case, cast, delete, func, insert, literal, literal_column, null, or_, select, tuple_,
+    union_all, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased, joinedload
+
+from app import app, configure_app, db
+from cache import LRUCache
+from config import Config
+from models import (
+    ArchivedDispute, ArchivedEscrowTransaction, ChainCursor, Dispute, EscrowTransaction, User,
+    UserStats
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.DB_EXECUTOR_WORKERS,
+    thread_name_prefix="db"
+)
+
+
+def _call_in_session(fn, *args, **kwargs):
+    """Run fn inside its own app context so it gets a dedicated session"""
+    configure_app()
+    with app.app_context():
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Run a blocking session function on the DB executor and await it"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, partial(_call_in_session, fn, *args, **kwargs)
+    )
+
+
+def shutdown():
+    """Wait for in-flight queries and stop the DB executor"""
+    _executor.shutdown(wait=True)
+
+
+def _ping():
+    db.session.execute(select(1))
+
+
+async def ping():
+    """Round-trip a trivial query through the DB executor and the pool"""
+    await run_in_session(_ping)
+
+
+def pool_status():
+    """Return (checked out, capacity) of the engine's connection pool"""
+    configure_app()
+    with app.app_context():
+        pool = db.engine.pool
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    return pool.checkedout(), options['pool_size'] + options['max_overflow']
+
+
+# Users
+
+# What the handlers need to know about a user. Cached by telegram id so
+# returning senders are resolved without a round trip, and by lowercased
+# username so /new can resolve sellers seen in the bot's groups.
+UserIdentity = namedtuple('UserIdentity', ['id', 'telegram_id', 'username', 'language'])
+
+identity_cache = LRUCache(Config.IDENTITY_CACHE_SIZE, ttl=Config.IDENTITY_CACHE_TTL, name='identity')
+username_cache = LRUCache(Config.IDENTITY_CACHE_SIZE, ttl=Config.IDENTITY_CACHE_TTL, name='username')
+
+
+def _cache_identity(identity, previous=None):
+    identity_cache.set(identity.telegram_id, identity)
+    if previous is not None and previous.username and previous.username != identity.username:
+        username_cache.pop(previous.username.lower())
+    if identity.username:
+        username_cache.set(identity.username.lower(), identity)
+
+
+def _upsert_user(telegram_id, username, language=None):
+    # One INSERT ... ON CONFLICT DO UPDATE ... RETURNING: creates the user on
+    # first contact, refreshes the username otherwise, and cannot race
+    # another first contact into the unique constraint on telegram_id
+    values = {'telegram_id': telegram_id, 'username': username}
+    if language is not None:
+        values['language'] = language
+    stmt = _upsert(User).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={column: stmt.excluded[column] for column in values if column != 'telegram_id'}
+    ).returning(User.id, User.telegram_id, User.username, User.language)
+    identity = UserIdentity(*db.session.execute(stmt).one())
+    db.session.commit()
+    return identity
+
+
+class UserWriteBuffer:
+    """Username and language changes of known users, written in batches
+
+    The identity cache is updated straight away; user_writes.flusher writes
+    what is queued here every USER_WRITE_INTERVAL seconds, one transaction
+    for the whole batch.
+    """
+
+    def __init__(self):
+        # telegram id -> {'id': user id, column: new value}
+        self.pending = {}
+        # lowercased username -> telegram id of the user now holding it
+        self.releases = {}
+        self._in_flight = {}
+
+    def queue(self, identity, previous):
+        """Queue the columns identity changes from previous"""
+        changes = {
+            column: getattr(identity, column)
+            for column in ('username', 'language')
+            if getattr(identity, column) != getattr(previous, column)
+        }
+        if changes:
+            self.pending.setdefault(identity.telegram_id, {'id': identity.id}).update(changes)
+        if 'username' in changes:
+            self.release(identity)
+
+    def release(self, identity):
+        """Queue taking identity's username away from whoever held it before"""
+        if identity.username:
+            self.releases[identity.username.lower()] = identity.telegram_id
+
+    def claim(self, telegram_id, language=None):
+        """Before an upsert of telegram_id, which writes its username and
+        the language returned here: language, else one queued and not yet
+        written. Drops the queued changes the upsert supersedes.
+        """
+        queued = self.pending.pop(telegram_id, {})
+        if language is None:
+            language = queued.get('language', self._in_flight.get(telegram_id, {}).get('language'))
+        return language
+
+    def take(self):
+        """Return (writes, releases) queued so far and start a new batch"""
+        writes, releases = self.pending, self.releases
+        self.pending, self.releases = {}, {}
+        self._in_flight = writes
+        return writes, releases
+
+    def done(self, writes, releases, written):
+        """Finish the batch from take(); requeue it unless it was written"""
+        self._in_flight = {}
+        if written:
+            return
+        for telegram_id, changes in writes.items():
+            # Changes queued since take() are newer
+            self.pending[telegram_id] = {**changes, **self.pending.get(telegram_id, {})}
+        self.releases = {**releases, **self.releases}
+
+
+user_writes = UserWriteBuffer()
+
+
+def _write_users(writes, releases):
+    if releases:
+        # Telegram usernames are unique, so whoever held one of these
+        # before has since renamed; forget it on their row
+        User.query.filter(
+            func.lower(User.username).in_(list(releases)),
+            User.telegram_id.not_in(list(releases.values()))
+        ).update({User.username: None}, synchronize_session=False)
+    if writes:
+        # Bulk UPDATE by primary key, one executemany per set of columns
+        db.session.execute(update(User), list(writes.values()))
+    db.session.commit()
+
+
+@cache
+def _user_by_username():
+    # Built once; executions reuse its compiled form from the engine's cache
+    return (
+        select(User.id, User.telegram_id, User.username, User.language)
+        # Matches the lower(username) expression index
+        .where(func.lower(User.username) == bindparam('username'))
+        .limit(1)
+    )
+
+
+def _get_user_by_username(username):
+    row = db.session.execute(_user_by_username(), {'username': username.lower()}).first()
+    return UserIdentity(*row) if row else None
+
+
+async def get_user_identity(telegram_id, username):
+    """Return a user's UserIdentity, creating the user on first contact.
+
+    A cache hit costs no statement; a rename seen on a hit is queued on
+    user_writes. A miss is a single upsert.
+    """
+    telegram_id = str(telegram_id)
+    cached = identity_cache.get(telegram_id)
+    if cached is not None:
+        if cached.username == username:
+            return cached
+        identity = cached._replace(username=username)
+        user_writes.queue(identity, cached)
+        _cache_identity(identity, previous=cached)
+        return identity
+
+    # A language chosen since the entry expired may not be written yet
+    language = user_writes.claim(telegram_id)
+    identity = await run_in_session(_upsert_user, telegram_id, username, language)
+    user_writes.release(identity)
+    _cache_identity(identity)
+    return identity
+
+
+def cached_language(telegram_id):
+    """Return the language in the identity cache, or None; never queries"""
+    cached = identity_cache.get(str(telegram_id))
+    return cached.language if cached is not None else None
+
+
+async def set_user_language(telegram_id, username, lang_code):
+    """Store the preferred language, creating the user if needed"""
+    telegram_id = str(telegram_id)
+    cached = identity_cache.get(telegram_id)
+    if cached is not None:
+        identity = cached._replace(username=username, language=lang_code)
+        user_writes.queue(identity, cached)
+        # Write through so the next update already renders in the new language
+        _cache_identity(identity, previous=cached)
+        return identity
+
+    language = user_writes.claim(telegram_id, lang_code)
+    identity = await run_in_session(_upsert_user, telegram_id, username, language)
+    user_writes.release(identity)
+    _cache_identity(identity)
+    return identity
+
+
+async def flush_user_writes():
+    """Write the queued username and language changes; return how many"""
+    writes, releases = user_writes.take()
+    written = False
+    try:
+        if writes or releases:
+            await run_in_session(_write_users, writes, releases)
+        written = True
+    finally:
+        user_writes.done(writes, releases, written)
+    return len(writes) + len(releases)
+
+
+async def get_user_by_username(username):
+    """Resolve a UserIdentity by Telegram username, ignoring case"""
+    identity = username_cache.get(username.lower())
+    if identity is not None:
+        return identity
+
+    identity = await run_in_session(_get_user_by_username, username)
+    if identity is None:
+        return None
+    _cache_identity(identity)
+    return identity
+
+
+# Reputation
+
+# A user's user_stats row, cached by user id for the deal summary and
+# /profile. Writes below drop the entries they change.
+Reputation = namedtuple('Reputation', [
+    'buyer_deals', 'buyer_volume', 'seller_deals', 'seller_volume',
+    'disputes_open', 'disputes_lost', 'last_active_at'
+])
+NO_REPUTATION = Reputation(0, Decimal(0), 0, Decimal(0), 0, 0, None)
+
+stats_cache = LRUCache(Config.USER_STATS_CACHE_SIZE, ttl=Config.USER_STATS_CACHE_TTL, name='user_stats')
+
+
+def _upsert(model):
+    # INSERT ... ON CONFLICT reads the same on both databases we run on
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _count_completed_deal(transaction):
+    # Add the deal to both parties' counters in one statement, inside the
+    # caller's transaction
+    rows = {}
+    for user_id, role in ((transaction.buyer_id, 'buyer'), (transaction.seller_id, 'seller')):
+        row = rows.setdefault(user_id, {
+            'user_id': user_id, 'buyer_deals': 0, 'buyer_volume': 0,
+            'seller_deals': 0, 'seller_volume': 0, 'last_active_at': transaction.completed_at
+        })
+        row[f'{role}_deals'] += 1
+        row[f'{role}_volume'] += transaction.amount
+
+    stmt = _upsert(UserStats).values(list(rows.values()))
+    changes = {
+        name: getattr(UserStats, name) + stmt.excluded[name]
+        for name in ('buyer_deals', 'buyer_volume', 'seller_deals', 'seller_volume')
+    }
+    changes['last_active_at'] = stmt.excluded.last_active_at
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=changes))
+
+
+def _get_user_stats(user_id):
+    row = db.session.get(UserStats, user_id)
+    if row is None:
+        return NO_REPUTATION
+    return Reputation(
+        row.buyer_deals, row.buyer_volume, row.seller_deals, row.seller_volume,
+        row.disputes_open, row.disputes_lost, row.last_active_at
+    )
+
+
+def _rebuild_user_stats(first_id, last_id):
+    # Count users first_id..last_id again from the live and archived deals
+    # and disputes, and replace their rows in one commit
+    zero = literal_column('0')
+    no_time = cast(null(), db.DateTime)
+    parts = []
+    one = literal_column('1')
+    for deal, dispute in ((EscrowTransaction, Dispute), (ArchivedEscrowTransaction, ArchivedDispute)):
+        completed = deal.status == 'completed'
+        parts.append(
+            select(
+                deal.buyer_id.label('user_id'),
+                one.label('buyer_deals'),
+                deal.amount.label('buyer_volume'),
+                zero.label('seller_deals'),
+                zero.label('seller_volume'),
+                zero.label('disputes_open'),
+                zero.label('disputes_lost'),
+                deal.completed_at.label('last_active_at')
+            ).where(deal.buyer_id.between(first_id, last_id), completed)
+        )
+        parts.append(
+            select(deal.seller_id, zero, zero, one, deal.amount, zero, zero, deal.completed_at)
+            .where(deal.seller_id.between(first_id, last_id), completed)
+        )
+        # A dispute is against the party that did not raise it
+        against = case((dispute.created_by_id == deal.buyer_id, deal.seller_id), else_=deal.buyer_id)
+        parts.append(
+            select(
+                against, zero, zero, zero, zero,
+                case((dispute.status == 'open', 1), else_=0),
+                case((dispute.status == 'upheld', 1), else_=0),
+                no_time
+            )
+            .join_from(dispute, deal, dispute.transaction_id == deal.id)
+            .where(against.between(first_id, last_id))
+        )
+
+    history = union_all(*parts).subquery()
+    h = history.c
+    db.session.execute(delete(UserStats).where(UserStats.user_id.between(first_id, last_id)))
+    db.session.execute(
+        insert(UserStats).from_select(
+            [c.name for c in UserStats.__table__.c],
+            select(
+                h.user_id, func.sum(h.buyer_deals), func.sum(h.buyer_volume),
+                func.sum(h.seller_deals), func.sum(h.seller_volume),
+                func.sum(h.disputes_open), func.sum(h.disputes_lost), func.max(h.last_active_at)
+            ).group_by(h.user_id)
+        )
+    )
+    db.session.commit()
+
+
+def _max_user_id():
+    return db.session.scalar(select(func.max(User.id)))
+
+
+def _has_user_stats():
+    return db.session.scalar(select(UserStats.user_id).limit(1)) is not None
+
+
+async def get_user_stats(user_id):
+    """Return a user's Reputation, from the cache when possible"""
+    stats = stats_cache.get(user_id)
+    if stats is None:
+        stats = await run_in_session(_get_user_stats, user_id)
+        stats_cache.set(user_id, stats)
+    return stats
+
+
+async def rebuild_user_stats(first_id, last_id):
+    """Recount the user_stats rows of users first_id..last_id from scratch"""
+    await run_in_session(_rebuild_user_stats, first_id, last_id)
+    for user_id in range(first_id, last_id + 1):
+        stats_cache.pop(user_id)
+
+
+async def max_user_id():
+    """Return the highest user id, or None when there are no users"""
+    return await run_in_session(_max_user_id)
+
+
+async def has_user_stats():
+    """Whether user_stats has any row yet"""
+    return await run_in_session(_has_user_stats)
+
+
+# Transactions
+
+def _with_parties(model=EscrowTransaction):
+    return (
+        joinedload(model.buyer),
+        joinedload(model.seller)
+    )
+
+
+# What reads of a deal need: its own columns the handlers show, and both
+# parties. Plain tuples, so a read loads no ORM objects.
+Party = namedtuple('Party', ['telegram_id', 'username', 'language'])
+DealSummary = namedtuple('DealSummary', [
+    'id', 'status', 'amount', 'fee_amount', 'blockchain', 'chat_id', 'created_at', 'buyer', 'seller'
+])
+
+
+def _deal_summaries(model):
+    buyer, seller = aliased(User), aliased(User)
+    return (
+        select(
+            model.id, model.status, model.amount, model.fee_amount, model.blockchain, model.chat_id,
+            model.created_at, buyer.telegram_id, buyer.username, buyer.language,
+            seller.telegram_id, seller.username, seller.language
+        )
+        .join(buyer, buyer.id == model.buyer_id)
+        .join(seller, seller.id == model.seller_id)
+    )
+
+
+def _deal_summary(row):
+    return DealSummary(*row[:7], Party(*row[7:10]), Party(*row[10:13]))
+
+
+@cache
+def _deal_by_id(model):
+    return _deal_summaries(model).where(model.id == bindparam('tx_id'))
+
+
+def _get_transaction(tx_id):
+    # Live deals first; closed ones may have moved to the archive
+    for model in (EscrowTransaction, ArchivedEscrowTransaction):
+        row = db.session.execute(_deal_by_id(model), {'tx_id': tx_id}).first()
+        if row:
+            return _deal_summary(row)
+    return None
+
+
+def _get_archived_transaction(tx_id):
+    return db.session.get(
+        ArchivedEscrowTransaction, tx_id, options=_with_parties(ArchivedEscrowTransaction)
+    )
+
+
+def _payment_deadlines(now):
+    # (due_at, expires_at) for a new deal: first the reminder, if any
+    expires_at = now + timedelta(seconds=Config.PAYMENT_TIMEOUT)
+    remind_after = Config.PAYMENT_REMINDER_AFTER
+    if 0 < remind_after < Config.PAYMENT_TIMEOUT:
+        return now + timedelta(seconds=remind_after), expires_at
+    return expires_at, expires_at
+
+
+def _create_transaction(buyer_id, seller_id, amount, description, chat_id, fee_amount):
+    now = datetime.utcnow()
+    due_at, expires_at = _payment_deadlines(now)
+    transaction = EscrowTransaction(
+        buyer_id=buyer_id,
+        seller_id=seller_id,
+        amount=amount,
+        description=description,
+        chat_id=chat_id,
+        fee_amount=fee_amount,
+        fee_paid=False,
+        created_at=now,
+        due_at=due_at,
+        expires_at=expires_at
+    )
+    db.session.add(transaction)
+    db.session.commit()
+    return transaction
+
+
+def _lock_transaction(tx_id):
+    # Row lock until commit, so racing writers (and other bot processes)
+    # see each other's status change instead of overwriting it
+    return db.session.get(
+        EscrowTransaction, tx_id,
+        options=_with_parties(),
+        with_for_update={'of': EscrowTransaction}
+    )
+
+
+def _set_transaction_blockchain(tx_id, chain):
+    transaction = _lock_transaction(tx_id)
+    if not transaction or transaction.status != 'awaiting_payment':
+        # Nothing changed; unlike a rollback, committing releases the lock
+        # without expiring the deal the caller reads afterwards
+        db.session.commit()
+        return transaction or _get_archived_transaction(tx_id), False
+    transaction.blockchain = chain
+    db.session.commit()
+    return transaction, True
+
+
+def _complete_transaction(tx_id):
+    transaction = _lock_transaction(tx_id)
+    if not transaction or transaction.status not in ('awaiting_payment', 'payment_confirmed'):
+        # Completed, expired and archived deals are closed for good
+        db.session.commit()
+        return transaction or _get_archived_transaction(tx_id), False
+    transaction.status = 'completed'
+    transaction.completed_at = datetime.utcnow()
+    transaction.fee_paid = True
+    transaction.due_at = None
+    _count_completed_deal(transaction)
+    db.session.commit()
+    return transaction, True
+
+
+def _owned_by(model, scope):
+    # The group's deals, or the user's in either role
+    if scope == 'chat':
+        return model.chat_id == bindparam('chat_id')
+    user_id = select(User.id).where(User.telegram_id == bindparam('telegram_id')).scalar_subquery()
+    return or_(model.buyer_id == user_id, model.seller_id == user_id)
+
+
+@cache
+def _status_rows_by(model, scope, direction, after_cursor):
+    # Keyset pagination over (created_at, id), newest first. Filtering on
+    # either the group or the user's two roles keeps it one statement.
+    # One statement per shape of page, built once; only parameters vary.
+    stmt = _deal_summaries(model).where(_owned_by(model, scope))
+    if model is EscrowTransaction:
+        # Uncorrelated, so evaluated once: whether the archive query can
+        # find anything at all for this owner
+        stmt = stmt.add_columns(
+            select(ArchivedEscrowTransaction.id)
+            .where(_owned_by(ArchivedEscrowTransaction, scope))
+            .exists().label('archived')
+        )
+
+    key = tuple_(model.created_at, model.id)
+    cursor = tuple_(
+        bindparam('cursor_at', type_=model.created_at.type), bindparam('cursor_id', type_=model.id.type)
+    )
+    if direction == 'newer':
+        stmt = stmt.where(key > cursor).order_by(model.created_at.asc(), model.id.asc())
+    else:
+        if after_cursor:
+            stmt = stmt.where(key < cursor)
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    return stmt.limit(bindparam('limit'))
+
+
+def _status_rows(model, chat_id, telegram_id, cursor, direction, limit):
+    scope = 'chat' if chat_id is not None else 'user'
+    stmt = _status_rows_by(model, scope, direction, cursor is not None)
+    params = {'chat_id': chat_id} if scope == 'chat' else {'telegram_id': telegram_id}
+    if cursor is not None:
+        params['cursor_at'], params['cursor_id'] = cursor
+    params['limit'] = limit
+    return db.session.execute(stmt, params).all()
+
+
+def _archive_horizon():
+    # Every archived deal was created before this
+    return datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+
+
+def _status_page(chat_id, telegram_id, cursor, direction, limit):
+    # One extra row tells us whether there is another page
+    rows = _status_rows(EscrowTransaction, chat_id, telegram_id, cursor, direction, limit + 1)
+    deals = [_deal_summary(row) for row in rows]
+
+    # The archive only holds deals created before the horizon, so it is
+    # read only when the live rows cannot settle the page on their own,
+    # and never for an owner the live rows say has nothing archived
+    horizon = _archive_horizon()
+    if direction == 'newer':
+        use_archive = cursor[0] < horizon
+    else:
+        use_archive = len(deals) <= limit or deals[-1].created_at < horizon
+    if use_archive and (not rows or rows[0].archived):
+        deals += [
+            _deal_summary(row) for row in _status_rows(
+                ArchivedEscrowTransaction, chat_id, telegram_id, cursor, direction, limit + 1
+            )
+        ]
+        deals.sort(key=lambda tx: (tx.created_at, tx.id), reverse=direction != 'newer')
+        deals = deals[:limit + 1]
+
+    has_more = len(deals) > limit
+    deals = deals[:limit]
+    if direction == 'newer':
+        deals.reverse()
+    return deals, has_more
+
+
+async def get_transaction(tx_id):
+    """Return a live or archived deal as a DealSummary, or None"""
+    return await run_in_session(_get_transaction, tx_id)
+
+
+async def create_transaction(buyer_id, seller_id, amount, description, chat_id, fee_amount):
+    """Insert a new deal and return it"""
+    return await run_in_session(
+        _create_transaction, buyer_id, seller_id, amount, description, chat_id, fee_amount
+    )
+
+
+async def set_transaction_blockchain(tx_id, chain):
+    """Record the payment network the buyer picked.
+
+    Returns (transaction, updated); updated is False when the deal no longer
+    awaits payment, e.g. because it was completed in the meantime.
+    """
+    return await run_in_session(_set_transaction_blockchain, tx_id, chain)
+
+
+async def complete_transaction(tx_id):
+    """Mark a deal completed and its fee paid.
+
+    Returns (transaction, updated); updated is False when the deal was
+    already closed, completed or expired, so callers notify only once.
+    """
+    transaction, updated = await run_in_session(_complete_transaction, tx_id)
+    if updated:
+        stats_cache.pop(transaction.buyer_id)
+        stats_cache.pop(transaction.seller_id)
+    return transaction, updated
+
+
+async def status_page(chat_id=None, telegram_id=None, cursor=None, direction='older', limit=5):
+    """Return (deals, has_more) for one /status page of a group or a user.
+
+    cursor is the (created_at, id) of the deal the page starts after, in
+    the given direction; deals always come back newest first.
+    """
+    return await run_in_session(
+        _status_page,
+        str(chat_id) if chat_id is not None else None,
+        str(telegram_id) if telegram_id is not None else None,
+        cursor, direction, limit
+    )
+
+
+# Payment watcher
+
+def _awaiting_payment_deals():
+    rows = db.session.execute(
+        select(
+            EscrowTransaction.id, EscrowTransaction.blockchain,
+            EscrowTransaction.amount, EscrowTransaction.fee_amount
+        )
+        .where(
+            EscrowTransaction.status == 'awaiting_payment',
+            EscrowTransaction.blockchain.isnot(None)
+        )
+        .order_by(EscrowTransaction.id)
+    )
+    return [(tx_id, chain, amount + (fee or 0)) for tx_id, chain, amount, fee in rows]
+
+
+def _get_chain_cursor(chain):
+    return db.session.scalar(select(ChainCursor.block_number).where(ChainCursor.chain == chain))
+
+
+def _record_payment_scan(chain, block_number, tx_ids):
+    # Confirmations and the cursor commit together, so a restart neither
+    # rescans confirmed blocks nor skips unconfirmed ones
+    confirmed = []
+    if tx_ids:
+        confirmed_ids = db.session.scalars(
+            update(EscrowTransaction)
+            .where(
+                EscrowTransaction.id.in_(tx_ids),
+                EscrowTransaction.status == 'awaiting_payment',
+                EscrowTransaction.blockchain == chain
+            )
+            .values(status='payment_confirmed', payment_confirmed_at=datetime.utcnow(), due_at=None)
+            .returning(EscrowTransaction.id)
+        ).all()
+        if confirmed_ids:
+            confirmed = db.session.scalars(
+                select(EscrowTransaction)
+                .options(*_with_parties())
+                .where(EscrowTransaction.id.in_(confirmed_ids))
+                .order_by(EscrowTransaction.id)
+            ).all()
+    db.session.merge(ChainCursor(chain=chain, block_number=block_number))
+    db.session.commit()
+    return confirmed
+
+
+async def awaiting_payment_deals():
+    """Return (id, chain, total) of every deal waiting for an on-chain payment"""
+    return await run_in_session(_awaiting_payment_deals)
+
+
+async def get_chain_cursor(chain):
+    """Return the last block scanned on chain, or None"""
+    return await run_in_session(_get_chain_cursor, chain)
+
+
+async def record_payment_scan(chain, block_number, tx_ids):
+    """Mark paid deals confirmed and move the chain's cursor, in one commit.
+
+    Only deals still awaiting payment on that chain change; those are
+    returned with buyer and seller loaded.
+    """
+    return await run_in_session(_record_payment_scan, chain, block_number, tx_ids)
+
+
+# Deal scheduler
+
+def _process_due_deals(now, limit):
+    # Oldest due first, through the due_at index; other processes skip
+    # the rows this one holds
+    rows = db.session.execute(
+        select(EscrowTransaction.id, EscrowTransaction.due_at, EscrowTransaction.expires_at)
+        .where(EscrowTransaction.due_at <= now)
+        .order_by(EscrowTransaction.due_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.session.rollback()
+        return [], [], 0
+
+    # A reminder that is only due after the deadline has passed (the bot was
+    # down) is skipped in favour of expiring the deal
+    remind_ids, expire_ids = [], []
+    for tx_id, due_at, expires_at in rows:
+        if expires_at and due_at < expires_at and now < expires_at:
+            remind_ids.append(tx_id)
+        else:
+            expire_ids.append(tx_id)
+    waiting = EscrowTransaction.status == 'awaiting_payment'
+
+    reminded_ids = db.session.scalars(
+        update(EscrowTransaction)
+        .where(EscrowTransaction.id.in_(remind_ids), waiting)
+        .values(due_at=EscrowTransaction.expires_at)
+        .returning(EscrowTransaction.id)
+    ).all() if remind_ids else []
+    expired_ids = db.session.scalars(
+        update(EscrowTransaction)
+        .where(EscrowTransaction.id.in_(expire_ids), waiting)
+        .values(status='expired', due_at=None)
+        .returning(EscrowTransaction.id)
+    ).all() if expire_ids else []
+    # Anything else left the awaiting state without clearing its due time
+    db.session.execute(
+        update(EscrowTransaction)
+        .where(EscrowTransaction.id.in_([row[0] for row in rows]), ~waiting)
+        .values(due_at=None)
+    )
+
+    changed = {}
+    if reminded_ids or expired_ids:
+        changed = {
+            tx.id: tx for tx in db.session.scalars(
+                select(EscrowTransaction)
+                .options(*_with_parties())
+                .where(EscrowTransaction.id.in_(reminded_ids + expired_ids))
+            )
+        }
+    db.session.commit()
+    return [changed[i] for i in reminded_ids], [changed[i] for i in expired_ids], len(rows)
+
+
+def _next_due_at():
+    return db.session.scalar(select(func.min(EscrowTransaction.due_at)))
+
+
+async def process_due_deals(now, limit):
+    """Handle up to limit deals due at now in one commit.
+
+    Returns (reminded, expired, handled): reminded deals now wait for
+    their expiry time, expired ones have status 'expired'; both come with
+    buyer and seller loaded. handled counts every due row taken, so a
+    full batch means more may be waiting.
+    """
+    return await run_in_session(_process_due_deals, now, limit)
+
+
+async def next_due_at():
+    """Return the earliest due time of any deal, or None"""
+    return await run_in_session(_next_due_at)
+
+
+# Archive
+
+# Deals in these states never change again
+CLOSED_STATUSES = ('completed', 'expired')
+
+
+def _archive_closed_deals(limit):
+    # Closed deals past the horizon without an open dispute; rows another
+    # process is moving are skipped. No ORDER BY: sorting would read every
+    # closed deal to return the first few, the index scan stops at limit.
+    open_dispute = select(Dispute.id).where(
+        Dispute.transaction_id == EscrowTransaction.id,
+        Dispute.status == 'open'
+    ).exists()
+    ids = db.session.scalars(
+        select(EscrowTransaction.id)
+        .where(
+            EscrowTransaction.status.in_(CLOSED_STATUSES),
+            EscrowTransaction.created_at < _archive_horizon(),
+            ~open_dispute
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.session.rollback()
+        return 0
+
+    # Copy the deals, then their disputes, then delete both from the live
+    # tables; one commit, so each deal is visible in exactly one place
+    live = EscrowTransaction.__table__.c
+    columns = [c.name for c in ArchivedEscrowTransaction.__table__.c if c.name != 'archived_at']
+    db.session.execute(
+        insert(ArchivedEscrowTransaction).from_select(
+            columns + ['archived_at'],
+            select(*(live[name] for name in columns), literal(datetime.utcnow(), db.DateTime))
+            .where(live.id.in_(ids))
+        )
+    )
+    dispute_columns = [c.name for c in ArchivedDispute.__table__.c]
+    db.session.execute(
+        insert(ArchivedDispute).from_select(
+            dispute_columns,
+            select(*(Dispute.__table__.c[name] for name in dispute_columns))
+            .where(Dispute.transaction_id.in_(ids))
+        )
+    )
+    db.session.execute(
+        delete(Dispute).where(Dispute.transaction_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(EscrowTransaction).where(EscrowTransaction.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(ids)
+
+
+async def archive_closed_deals(limit):
+    """Move up to limit closed deals and their disputes to the archive.
+
+    Returns how many deals moved; fewer than limit means none are left.
+    """
+    return await run_in_session(_archive_closed_deals, limit)
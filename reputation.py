@@ -0,0 +1,69 @@
+"""Rebuilds the user_stats reputation counters from the deal history.
+
+The counters are kept current incrementally by the repository, in the
+same commit as each completed deal. This job recounts them from scratch
+anyway, from the live and archived deals and disputes, to repair any
+drift: USER_STATS_REBUILD_BATCH users per transaction, each batch one
+DELETE and one INSERT ... SELECT with the counting done in the database.
+It runs once at startup while user_stats is still empty (right after
+migration 0006) and then every USER_STATS_REBUILD_INTERVAL seconds.
+"""
+import asyncio
+import time
+
+import repository
+from config import Config
+from logger import logger
+
+# Let other queries in between batches of a long run
+BATCH_PAUSE = 0.1
+
+
+class StatsRebuilder:
+    """Runs the user_stats rebuild every interval seconds"""
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+
+    def start(self):
+        if self.interval <= 0:
+            logger.info("Reputation rebuild is disabled")
+            return
+        self._task = asyncio.create_task(self._run(), name='reputation')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        try:
+            if not await repository.has_user_stats():
+                await self.run_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error rebuilding reputation counters: {str(e)}")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error rebuilding reputation counters: {str(e)}")
+
+    async def run_once(self):
+        """Recount every user's counters, a batch of users per commit"""
+        started = time.monotonic()
+        last_id = await repository.max_user_id() or 0
+        for first_id in range(1, last_id + 1, self.batch_size):
+            await repository.rebuild_user_stats(first_id, min(first_id + self.batch_size - 1, last_id))
+            await asyncio.sleep(BATCH_PAUSE)
+        logger.info("Rebuilt reputation counters of %s users in %.1fs", last_id, time.monotonic() - started)
+
+
+rebuilder = StatsRebuilder(Config.USER_STATS_REBUILD_INTERVAL, Config.USER_STATS_REBUILD_BATCH)
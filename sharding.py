@@ -0,0 +1,254 @@
+"""Multi-process mode: one ingress process, WORKERS bot processes.
+
+The ingress receives updates the usual way (long polling, or the webhook
+when WEBHOOK_URL is set) but runs no handlers. It routes each update by
+its chat id through a consistent-hash ring to a worker and writes it, as
+one JSON line, to that worker's end of a Unix socket pair. Every update
+of a chat therefore reaches the same worker, in order, and that worker's
+KeyedUpdateProcessor keeps its per-chat and per-deal locks. Updates for
+one deal from different chats (a button in the group, /ok in private)
+may land on different workers; the deal's conditional UPDATEs in the
+repository keep those correct, as they do across restarts.
+
+Workers are spawned processes running a normal TelegramBot without an
+updater. Worker 0 also runs the jobs that must not run twice. The
+connection pool, DB executor and global outbound rate are totals split
+between the workers, so N workers use the same database budget as one
+process. Worker i serves /health on HEALTH_PORT + i and logs to
+bot.<i>.log. If a worker exits, the ingress stops so the process manager
+can restart the whole set.
+
+Caches (sender identities, reputation, /status pages) stay per process.
+A worker drops the entries its own changes touch, but not other workers'
+entries: payments and expiries are handled by worker 0, and an /ok or a
+button in a group by that group's worker, not by the workers owning the
+parties' private chats. Other workers see such a change when their
+entries expire: IDENTITY_CACHE_TTL, USER_STATS_CACHE_TTL and
+STATUS_CACHE_TTL.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+from contextlib import contextmanager
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+
+import metrics
+from config import Config
+from logger import logger
+
+# Points per worker on the ring; enough to spread chats evenly
+RING_REPLICAS = 64
+# Longest update line a worker accepts
+MAX_LINE = 4 * 1024 * 1024
+# Bytes buffered for a worker before the ingress waits for it to catch up
+WRITE_HIGH_WATER = 1024 * 1024
+
+
+class HashRing:
+    """Consistent hashing of routing keys onto worker indexes"""
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        points = sorted(
+            (self._hash(f'{node}:{replica}'), node)
+            for node in nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        # Stable across processes and restarts, unlike hash()
+        return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+    def node(self, key):
+        index = bisect.bisect(self._hashes, self._hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+def routing_key(update):
+    """The chat an update belongs to, or its sender when it has no chat"""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+def _per_worker(path, index):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{index}{ext}'
+
+
+def worker_environment(index, count):
+    """Settings a worker overrides: its share of the totals, its own port and files"""
+    environment = {
+        'AUTO_MIGRATE': 'false',
+        'DB_POOL_SIZE': str(max(Config.DB_POOL_SIZE // count, 1)),
+        'DB_MAX_OVERFLOW': str(Config.DB_MAX_OVERFLOW // count),
+        'DB_EXECUTOR_WORKERS': str(max(Config.DB_EXECUTOR_WORKERS // count, 1)),
+        'OUTBOUND_GLOBAL_RATE': str(Config.OUTBOUND_GLOBAL_RATE / count),
+        'HEALTH_PORT': str(Config.HEALTH_PORT + index),
+        'LOG_FILE': _per_worker(Config.LOG_FILE, index),
+    }
+    if Config.CAPTURE_FILE:
+        environment['CAPTURE_FILE'] = _per_worker(Config.CAPTURE_FILE, index)
+    return environment
+
+
+@contextmanager
+def _environment(overrides):
+    # A spawned process inherits os.environ as it is when it starts
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def worker_main(index, sock, bot_factory=None):
+    """Entry point of a worker process"""
+    # Ctrl+C and the process manager's SIGTERM reach the whole group; the
+    # worker stops when the ingress closes its socket instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        asyncio.run(_serve_worker(index, sock, bot_factory))
+    except Exception as e:
+        logger.error(f"Worker {index} failed: {str(e)}")
+        raise
+
+
+async def _serve_worker(index, sock, bot_factory):
+    # Imported here so the ingress never loads the handlers
+    from app import init_database
+    from bot import TelegramBot
+    from keep_alive import keep_alive
+
+    await init_database()
+    keep_alive()
+    bot = bot_factory() if bot_factory is not None else TelegramBot()
+    await bot.start(receive_updates=False, run_jobs=index == 0)
+    logger.info(f"Worker {index} started")
+    try:
+        reader, _ = await asyncio.open_connection(sock=sock, limit=MAX_LINE)
+        queue = bot.application.update_queue
+        while line := await reader.readline():
+            queue.put_nowait(Update.de_json(json.loads(line), bot.application.bot))
+        logger.info(f"Worker {index}: ingress closed, stopping")
+    finally:
+        await bot.stop()
+
+
+class Ingress:
+    """Receives updates and routes them to worker processes by chat"""
+
+    def __init__(self, workers, target=worker_main, args=(), request=None, get_updates_request=None):
+        self.workers = workers
+        self.target = target
+        self.args = args
+        self.request = request
+        self.get_updates_request = get_updates_request
+        self.ring = HashRing(range(workers))
+        self.processes = []
+        self.updater = None
+        self._writers = []
+        self._tasks = []
+        self._closed = None
+
+    async def start(self, receive_updates=True):
+        """Spawn the workers, then start taking updates"""
+        from bot import start_receiving
+
+        loop = asyncio.get_running_loop()
+        self._closed = loop.create_future()
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.workers):
+            ours, theirs = socket.socketpair()
+            process = context.Process(
+                target=self.target, args=(index, theirs, *self.args), name=f'worker-{index}', daemon=False
+            )
+            with _environment(worker_environment(index, self.workers)):
+                process.start()
+            theirs.close()
+            _, writer = await asyncio.open_connection(sock=ours)
+            self.processes.append(process)
+            self._writers.append(writer)
+            # The sentinel becomes readable when the process ends
+            loop.add_reader(process.sentinel, self._worker_exited, index, process)
+        logger.info(f"Started {self.workers} workers")
+
+        if receive_updates:
+            bot = Bot(
+                Config.TOKEN,
+                request=self.request if self.request is not None
+                else metrics.InstrumentedRequest(connection_pool_size=8),
+                get_updates_request=self.get_updates_request if self.get_updates_request is not None
+                else metrics.InstrumentedRequest(connection_pool_size=1)
+            )
+            self.updater = Updater(bot, asyncio.Queue())
+            await self.updater.initialize()
+            await start_receiving(self.updater)
+            self._tasks.append(asyncio.create_task(self._route(self.updater.update_queue), name='ingress'))
+
+    def _worker_exited(self, index, process):
+        asyncio.get_running_loop().remove_reader(process.sentinel)
+        if not self._closed.done():
+            process.join()
+            logger.error(f"Worker {index} exited with code {process.exitcode}; stopping")
+            self._closed.set_result(index)
+
+    async def _route(self, queue):
+        while True:
+            self.dispatch(await queue.get())
+            for writer in self._writers:
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    # Stop taking updates until the slow worker catches up
+                    await writer.drain()
+
+    def dispatch(self, update):
+        """Hand one update to the worker that owns its chat"""
+        worker = self.ring.node(routing_key(update))
+        line = json.dumps(update.to_dict(), ensure_ascii=False, separators=(',', ':'))
+        self._writers[worker].write(line.encode() + b'\n')
+
+    async def wait_closed(self):
+        """Return when a worker has exited"""
+        await asyncio.shield(self._closed)
+
+    async def stop(self, timeout=30):
+        """Stop taking updates, let the workers drain and exit"""
+        if not self._closed.done():
+            self._closed.set_result(None)
+        if self.updater is not None and self.updater.running:
+            await self.updater.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for writer in self._writers:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+        for process in self.processes:
+            asyncio.get_running_loop().remove_reader(process.sentinel)
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not stop in {timeout}s; killing it")
+                process.kill()
+        if self.updater is not None:
+            await self.updater.shutdown()
+        logger.info("Ingress stopped")
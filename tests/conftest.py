@@ -0,0 +1,77 @@
+"""Shared setup: a throwaway SQLite database and the benchmarks' fake Bot API.
+
+The environment is set before any of the bot's modules is imported, as
+Config reads it at import time.
+"""
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import BOT_TOKEN, FakeBotAPI  # noqa: E402
+
+_tmp = tempfile.mkdtemp(prefix='escrow_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'tests.db')}"
+os.environ['BOT_TOKEN'] = BOT_TOKEN
+os.environ['LOG_LEVEL'] = 'WARNING'
+os.environ['LOG_FILE'] = os.path.join(_tmp, 'bot.log')
+os.environ.pop('CAPTURE_FILE', None)
+
+
+@pytest.fixture
+def database():
+    """An empty, fully migrated database and empty caches"""
+    import handlers
+    import repository
+    from app import app, configure_app, db, upgrade_database
+
+    configure_app()
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+    upgrade_database()
+    for cache in (repository.identity_cache, repository.username_cache, repository.stats_cache,
+                  handlers._status_pages, handlers._status_generations):
+        cache.clear()
+    return db
+
+
+@pytest.fixture
+def running_bot(monkeypatch):
+    """Return an async context manager running the application on a FakeBotAPI.
+
+    Updates are fed with application.process_update; the outbound queue
+    is drained on exit, so every reply is in api.calls afterwards.
+    """
+    import outbound
+    from bot import TelegramBot
+    from outbound import TokenBucket
+
+    # This runs the bot, not Telegram's quotas
+    scheduler = outbound.scheduler
+    monkeypatch.setattr(scheduler, 'global_bucket', TokenBucket(100_000, 100_000))
+    monkeypatch.setattr(scheduler, 'chat_rate', 6_000_000)
+    monkeypatch.setattr(scheduler, 'group_rate', 6_000_000)
+
+    @asynccontextmanager
+    async def run(api=None):
+        api = api or FakeBotAPI()
+        application = TelegramBot(request=api.request(), get_updates_request=api.request()).application
+        await application.initialize()
+        await application.start()
+        scheduler.start(application.bot)
+        try:
+            yield application, api
+        finally:
+            await application.stop()
+            await scheduler.stop()
+            await application.shutdown()
+
+    return run
@@ -0,0 +1,36 @@
+import asyncio
+
+from telegram import Update
+
+import repository
+from bot import TelegramBot
+from fake_bot_api import FakeBotAPI, message_update
+
+USER_ID_BASE = 70_000
+
+
+def test_stop_sends_replies_of_handlers_still_running(database, monkeypatch):
+    # Later tests still need the DB executor
+    monkeypatch.setattr(repository, 'shutdown', lambda: None)
+    get_user_identity = repository.get_user_identity
+
+    async def slow_identity(telegram_id, username):
+        # Keeps the handlers running, with nothing queued, when stop() begins
+        await asyncio.sleep(0.3)
+        return await get_user_identity(telegram_id, username)
+
+    monkeypatch.setattr(repository, 'get_user_identity', slow_identity)
+
+    async def scenario():
+        api = FakeBotAPI(latency=0.01)
+        bot = TelegramBot(request=api.request(), get_updates_request=api.request())
+        await bot.start(run_jobs=False)
+        application = bot.application
+        for i in range(5):
+            raw = message_update(i + 1, USER_ID_BASE + i, USER_ID_BASE + i, f'stopper{i}', '/help')
+            application.update_queue.put_nowait(Update.de_json(raw, application.bot))
+        await asyncio.sleep(0.05)
+        await bot.stop()
+        return api.count('sendMessage')
+
+    assert asyncio.run(scenario()) == 5
@@ -0,0 +1,25 @@
+import asyncio
+
+import metrics
+import repository
+
+
+def _lookups(cache):
+    counts = {}
+    for line in metrics.registry.render().splitlines():
+        for result in ('hit', 'miss'):
+            if line.startswith(f'bot_cache_lookups_total{{cache="{cache}",result="{result}"}} '):
+                counts[result] = float(line.rsplit(' ', 1)[1])
+    return counts
+
+
+def test_identity_cache_hits_and_misses_are_exported(database):
+    before = _lookups('identity')
+
+    async def scenario():
+        for _ in range(3):
+            await repository.get_user_identity(97_001, 'cached')
+
+    asyncio.run(scenario())
+    after = _lookups('identity')
+    assert {result: after[result] - before.get(result, 0) for result in after} == {'hit': 2, 'miss': 1}
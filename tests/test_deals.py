@@ -0,0 +1,74 @@
+import asyncio
+
+from sqlalchemy import func, select, update
+from telegram import Update
+
+import messages
+import repository
+from app import app, db
+from fake_bot_api import message_update
+from models import EscrowTransaction, UserStats
+
+BUYER, SELLER = 80_001, 80_002
+
+
+async def _seed_deal(status):
+    buyer = await repository.get_user_identity(BUYER, 'buyer')
+    seller = await repository.get_user_identity(SELLER, 'seller')
+    tx = await repository.create_transaction(buyer.id, seller.id, 100, 'a deal', None, 1)
+    with app.app_context():
+        db.session.execute(update(EscrowTransaction).where(EscrowTransaction.id == tx.id).values(status=status))
+        db.session.commit()
+    return tx.id
+
+
+def _replies(api):
+    return [params['text'] for method, params in api.calls if method == 'sendMessage']
+
+
+def test_ok_refuses_an_expired_deal(database, running_bot):
+    async def scenario():
+        tx_id = await _seed_deal('expired')
+        async with running_bot() as (application, api):
+            raw = message_update(1, BUYER, BUYER, 'buyer', f'/ok {tx_id}')
+            await application.process_update(Update.de_json(raw, application.bot))
+        return tx_id, api
+
+    tx_id, api = asyncio.run(scenario())
+    assert _replies(api) == [messages.render('en', 'ok_expired')[0]]
+    with app.app_context():
+        assert db.session.get(EscrowTransaction, tx_id).status == 'expired'
+        assert db.session.scalar(select(func.count()).select_from(UserStats)) == 0
+
+
+def test_ok_completes_a_paid_deal_once(database, running_bot):
+    async def scenario():
+        tx_id = await _seed_deal('payment_confirmed')
+        async with running_bot() as (application, api):
+            for update_id in (1, 2):
+                raw = message_update(update_id, BUYER, BUYER, 'buyer', f'/ok {tx_id}')
+                await application.process_update(Update.de_json(raw, application.bot))
+        return api
+
+    api = asyncio.run(scenario())
+    assert _replies(api) == [messages.render('en', key)[0] for key in ('ok_done', 'ok_already_complete')]
+    with app.app_context():
+        assert db.session.scalar(select(func.sum(UserStats.buyer_deals))) == 1
+
+
+def test_ok_reports_a_deal_gone_before_completion(database, running_bot, monkeypatch):
+    async def archived(tx_id):
+        # The archive job moved the deal between the read and the update
+        return None, False
+
+    monkeypatch.setattr(repository, 'complete_transaction', archived)
+
+    async def scenario():
+        tx_id = await _seed_deal('payment_confirmed')
+        async with running_bot() as (application, api):
+            raw = message_update(1, BUYER, BUYER, 'buyer', f'/ok {tx_id}')
+            await application.process_update(Update.de_json(raw, application.bot))
+        return api
+
+    api = asyncio.run(scenario())
+    assert _replies(api) == [messages.render('en', 'ok_not_found')[0]]
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import event
+from telegram import Update
+
+import messages
+import repository
+from app import app, db
+from fake_bot_api import message_update
+
+SLOW_USER, OTHER_USER = 90_001, 90_002
+
+
+def test_blocked_query_does_not_stall_other_updates(database, running_bot, monkeypatch):
+    release = threading.Event()
+    entered = threading.Event()
+    get_user_by_username = repository._get_user_by_username
+
+    def blocking_lookup(username):
+        # Stands in for a slow query: holds an executor thread until released
+        entered.set()
+        release.wait(5)
+        return get_user_by_username(username)
+
+    monkeypatch.setattr(repository, '_get_user_by_username', blocking_lookup)
+
+    async def scenario():
+        async with running_bot() as (application, api):
+            # Timed from here: a query run on the event loop would stall it
+            # for the whole five seconds before /help got a turn
+            started = time.monotonic()
+            slow = asyncio.create_task(application.process_update(Update.de_json(
+                message_update(1, SLOW_USER, SLOW_USER, 'slow', '/profile @nobody'), application.bot
+            )))
+            try:
+                await asyncio.sleep(0.05)
+                await application.process_update(Update.de_json(
+                    message_update(2, OTHER_USER, OTHER_USER, 'other', '/help'), application.bot
+                ))
+                elapsed = time.monotonic() - started
+                assert entered.is_set() and not slow.done()
+            finally:
+                release.set()
+                await slow
+        return elapsed, api
+
+    elapsed, api = asyncio.run(scenario())
+    assert elapsed < 0.5
+    replies = {params['chat_id']: params['text'] for method, params in api.calls if method == 'sendMessage'}
+    assert replies[OTHER_USER] == messages.render('en', 'help')[0]
+    assert replies[SLOW_USER] == messages.render('en', 'profile_unknown', username='nobody')[0]
+
+
+def test_help_runs_no_statements(database, running_bot):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def scenario():
+        async with running_bot() as (application, api):
+            raw = message_update(1, OTHER_USER, OTHER_USER, 'other', '/help')
+            raw['message']['from']['language_code'] = 'ru'
+            statements.clear()
+            await application.process_update(Update.de_json(raw, application.bot))
+            queried = list(statements)
+        return queried, api
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        queried, api = asyncio.run(scenario())
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    # Not even the upsert: an unknown user gets Telegram's language
+    assert queried == []
+    assert [params['text'] for method, params in api.calls if method == 'sendMessage'] == [
+        messages.render('ru', 'help')[0]
+    ]
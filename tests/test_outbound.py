@@ -0,0 +1,60 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+import metrics
+from outbound import OutboundScheduler
+
+
+class FlakyBot:
+    """Asks for one retry on the first message, then accepts everything"""
+
+    def __init__(self):
+        self.sent = []
+        self._limited = False
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if not self._limited:
+            self._limited = True
+            raise RetryAfter(0.05)
+        self.sent.append((chat_id, text))
+
+
+def _sample(line_start):
+    for line in metrics.registry.render().splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def _samples():
+    return {
+        name: _sample(name) for name in (
+            'bot_outbound_send_latency_seconds_count',
+            *(f'bot_outbound_messages_total{{result="{result}"}}' for result in ('sent', 'retried', 'coalesced')),
+        )
+    }
+
+
+def test_sends_are_exported_as_metrics():
+    before = _samples()
+
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=1000, group_rate=60_000, workers=2)
+        bot = FlakyBot()
+        scheduler.start(bot)
+        scheduler.send(1, 'one')
+        scheduler.send(-2, 'two', coalesce=True)
+        scheduler.send(-2, 'three', coalesce=True)
+        await scheduler.stop()
+        return bot.sent
+
+    sent = asyncio.run(scenario())
+    after = _samples()
+    assert sorted(sent) == [(-2, 'two\n\nthree'), (1, 'one')]
+    assert {name: after[name] - before[name] for name in after} == {
+        'bot_outbound_send_latency_seconds_count': 2,
+        'bot_outbound_messages_total{result="sent"}': 2,
+        'bot_outbound_messages_total{result="retried"}': 1,
+        'bot_outbound_messages_total{result="coalesced"}': 1,
+    }
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import handlers
+import repository
+from cache import LRUCache
+from repository import DealSummary, Party
+
+SCOPE = ('user', '98001')
+
+
+def _deals(count):
+    me, other = Party('98001', 'me', 'en'), Party('98002', 'other', 'en')
+    now = datetime.utcnow()
+    return [
+        DealSummary(i, 'awaiting_payment', 10, 0.5, None, None, now - timedelta(minutes=i), me, other)
+        for i in range(1, count + 1)
+    ]
+
+
+def _fake_status_page(monkeypatch):
+    queries = []
+
+    async def status_page(chat_id=None, telegram_id=None, cursor=None, direction='older', limit=5):
+        queries.append(cursor)
+        return _deals(limit), True
+
+    monkeypatch.setattr(repository, 'status_page', status_page)
+    return queries
+
+
+def test_forged_cursors_stay_within_the_cache_size(monkeypatch):
+    monkeypatch.setattr(handlers, '_status_pages', LRUCache(8))
+    _fake_status_page(monkeypatch)
+
+    async def scenario():
+        for i in range(100):
+            cursor = handlers._decode_cursor(str(i * 1_000_000), str(i))
+            await handlers._get_status_page(SCOPE, 'en', 'o', cursor)
+
+    asyncio.run(scenario())
+    assert len(handlers._status_pages) == 8
+
+
+def test_a_deal_change_drops_every_page_of_its_scopes(monkeypatch):
+    monkeypatch.setattr(handlers, '_status_pages', LRUCache(8))
+    monkeypatch.setattr(handlers, '_status_generations', LRUCache(8))
+    queries = _fake_status_page(monkeypatch)
+    cursor = handlers._decode_cursor('1000000', '7')
+
+    async def scenario():
+        for _ in range(2):
+            await handlers._get_status_page(SCOPE, 'en')
+            await handlers._get_status_page(SCOPE, 'en', 'o', cursor)
+        handlers.invalidate_status_pages(None, SCOPE[1])
+        await handlers._get_status_page(SCOPE, 'en')
+        await handlers._get_status_page(SCOPE, 'en', 'o', cursor)
+
+    asyncio.run(scenario())
+    # Both pages cached until the change, then both queried again
+    assert queries == [None, cursor, None, cursor]
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, select
+from telegram import Update
+
+from app import app, db
+from config import Config
+from fake_bot_api import message_update
+from models import ArchivedEscrowTransaction, EscrowTransaction, User
+
+FEW, MANY, SELLER = 95_001, 95_002, 96_000
+
+
+def _seed(deals):
+    # A different seller for every deal, so loading them one at a time would
+    # show
+    start = datetime.utcnow()
+    with app.app_context():
+        buyers = {telegram_id: User(telegram_id=str(telegram_id), username=f'user{telegram_id}')
+                  for telegram_id in deals}
+        sellers = [User(telegram_id=str(SELLER + i), username=f'seller{i}') for i in range(max(deals.values()))]
+        db.session.add_all([*buyers.values(), *sellers])
+        db.session.flush()
+        db.session.execute(insert(EscrowTransaction), [
+            {
+                'buyer_id': buyers[buyer].id, 'seller_id': sellers[i].id, 'amount': 10 + i,
+                'description': 'deal', 'fee_amount': 0.5, 'status': 'awaiting_payment',
+                'created_at': start - timedelta(minutes=i),
+            }
+            for buyer, count in deals.items()
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def _archive_deal(buyer):
+    # A completed deal the archive job has already moved
+    with app.app_context():
+        buyer_id, seller_id = (
+            db.session.scalar(select(User.id).where(User.telegram_id == str(telegram_id)))
+            for telegram_id in (buyer, SELLER)
+        )
+        db.session.execute(insert(ArchivedEscrowTransaction), [{
+            'id': 10_000, 'buyer_id': buyer_id, 'seller_id': seller_id, 'amount': 5,
+            'description': 'old deal', 'fee_amount': 0.5, 'status': 'completed',
+            'created_at': datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS + 1),
+        }])
+        db.session.commit()
+
+
+def _status_statements(running_bot, senders):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def scenario():
+        counts = []
+        async with running_bot() as (application, api):
+            for update_id, user_id in enumerate(senders, 1):
+                statements.clear()
+                await application.process_update(Update.de_json(
+                    message_update(update_id, user_id, user_id, f'user{user_id}', '/status'), application.bot
+                ))
+                counts.append(len(statements))
+        return counts, api
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        counts, api = asyncio.run(scenario())
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return counts, [params['text'] for method, params in api.calls if method == 'sendMessage']
+
+
+def test_private_status_runs_the_same_statements_for_1_and_500_deals(database, running_bot):
+    _seed({FEW: 1, MANY: 500})
+    counts, replies = _status_statements(running_bot, [FEW, MANY])
+
+    # The sender's identity, then the live page, whatever the number of
+    # deals; neither user has anything archived to look up
+    assert counts == [2, 2]
+    assert [text.count('📝') for text in replies] == [1, Config.STATUS_PAGE_SIZE]
+
+
+def test_private_status_reads_the_archive_only_when_it_holds_deals(database, running_bot):
+    _seed({FEW: 1})
+    _archive_deal(FEW)
+    counts, replies = _status_statements(running_bot, [FEW])
+
+    assert counts == [3]
+    assert [text.count('📝') for text in replies] == [2]
@@ -0,0 +1,64 @@
+import asyncio
+
+from telegram import Update
+
+from fake_bot_api import message_update
+from update_processor import KeyedUpdateProcessor
+
+BUSY_CHAT = -100
+OTHER_CHAT = -200
+
+
+def _update(update_id, chat_id, text='hello'):
+    return Update.de_json(message_update(update_id, chat_id, 1, 'tester', text), None)
+
+
+def test_busy_chat_does_not_delay_other_chats():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        processor = KeyedUpdateProcessor(4)
+
+        async def work(seconds):
+            await asyncio.sleep(seconds)
+
+        # 20 updates of one chat, 50 ms each: a second of work in a row
+        busy = [
+            asyncio.create_task(processor.process_update(_update(i, BUSY_CHAT), work(0.05)))
+            for i in range(1, 21)
+        ]
+        await asyncio.sleep(0.01)
+        started = loop.time()
+        await processor.process_update(_update(100, OTHER_CHAT), work(0))
+        waited = loop.time() - started
+        await asyncio.gather(*busy)
+        return waited
+
+    assert asyncio.run(scenario()) < 0.1
+
+
+def test_same_chat_runs_in_order_and_slots_are_bounded():
+    async def scenario():
+        processor = KeyedUpdateProcessor(3)
+        order = []
+        running = 0
+        peak = 0
+
+        async def work(chat_id, update_id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            order.append((chat_id, update_id))
+            running -= 1
+
+        updates = [(chat_id, update_id) for update_id in range(5) for chat_id in (-1, -2, -3, -4, -5)]
+        await asyncio.gather(*(
+            processor.process_update(_update(update_id + 1, chat_id), work(chat_id, update_id))
+            for chat_id, update_id in updates
+        ))
+        return order, peak
+
+    order, peak = asyncio.run(scenario())
+    assert peak == 3
+    for chat_id in (-1, -2, -3, -4, -5):
+        assert [update_id for chat, update_id in order if chat == chat_id] == list(range(5))
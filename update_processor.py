@@ -0,0 +1,109 @@
+"""Concurrent update processing that keeps related updates in order.
+
+Updates are processed in parallel up to Config.MAX_CONCURRENT_UPDATES, but
+two updates from the same chat, or touching the same deal, never run at
+the same time: each update takes an asyncio lock per key, always chat
+first and then deal, so the lock order is consistent and cannot deadlock.
+Only then does it take one of the MAX_CONCURRENT_UPDATES slots, so updates
+queued behind a busy chat wait without holding a slot, and a burst in one
+group cannot stall every other chat.
+"""
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import callback_data
+
+
+def update_keys(update):
+    """Return the lock keys for an update: its chat, then its deal if any"""
+    keys = []
+    if not isinstance(update, Update):
+        return keys
+
+    chat = update.effective_chat
+    if chat is not None:
+        keys.append(('chat', chat.id))
+
+    deal_id = None
+    if update.callback_query and update.callback_query.data:
+        data = update.callback_query.data
+        button = callback_data.decode(data)
+        if button is not None:
+            deal_id = button.tx_id
+        else:
+            # Unsigned chain_{CHAIN}_{deal id} buttons
+            parts = data.split('_')
+            if parts[0] == 'chain' and len(parts) == 3 and parts[2].isdigit():
+                deal_id = int(parts[2])
+    elif update.message and update.message.text:
+        # /ok {deal id}
+        parts = update.message.text.split()
+        if len(parts) > 1 and parts[0].split('@')[0] == '/ok' and parts[1].isdigit():
+            deal_id = int(parts[1])
+
+    if deal_id is not None:
+        keys.append(('deal', deal_id))
+    return keys
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Runs unrelated updates concurrently and serializes updates per key"""
+
+    __slots__ = ('_locks', '_waiters', '_slots')
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self._waiters = {}
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def process_update(self, update, coroutine):
+        # Replaces the base class's, which takes a slot before
+        # do_process_update and so would hold it while waiting for a key
+        acquired = []
+        try:
+            for key in update_keys(update):
+                await self._acquire(key)
+                acquired.append(key)
+            async with self._slots:
+                await self.do_process_update(update, coroutine)
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def _acquire(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._forget(key)
+            raise
+
+    def _release(self, key):
+        self._locks[key].release()
+        self._forget(key)
+
+    def _forget(self, key):
+        self._waiters[key] -= 1
+        if not self._waiters[key]:
+            # Nobody holds or waits for it: don't keep a lock per chat forever
+            del self._waiters[key]
+            del self._locks[key]
+
+    @property
+    def active_keys(self):
+        return len(self._locks)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,59 @@
+"""Writes the username and language changes queued by the repository.
+
+A returning user's rename or language choice only changes the identity
+cache when it happens (see repository.UserWriteBuffer); this job writes
+everything queued every USER_WRITE_INTERVAL seconds, as one transaction
+with one UPDATE per set of changed columns, and once more on shutdown.
+Until then, other workers and the database see the old values.
+"""
+import asyncio
+
+import metrics
+import repository
+from config import Config
+from logger import logger
+
+users_written = metrics.registry.counter(
+    'user_writes_flushed_total', 'Queued username and language changes written in batches'
+)
+
+
+class UserWriteFlusher:
+    """Flushes repository.user_writes every interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name='user-writes')
+
+    async def stop(self):
+        """Stop the job and write what is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.run_once()
+        except Exception as e:
+            logger.error(f"Error writing queued user changes: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error writing queued user changes: {str(e)}")
+
+    async def run_once(self):
+        """Write the queued changes; return how many"""
+        written = await repository.flush_user_writes()
+        users_written.inc(written)
+        return written
+
+
+flusher = UserWriteFlusher(Config.USER_WRITE_INTERVAL)